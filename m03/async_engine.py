@@ -0,0 +1,143 @@
+# Asyncio engine for the Module 03 sales synchronization.
+# synchronize_data() runs extract, transform and load one after another, so
+# the MySQL read, the Python transform and the PostgreSQL write never
+# overlap. Here the three steps run as concurrent asyncio stages joined by
+# bounded queues: while batch N is loaded, batch N+1 is transformed and
+# batch N+2 is being read. The blocking MySQL and psycopg2 drivers are kept
+# and every driver call, including borrowing and returning pooled
+# connections and opening and closing cursors, runs on a single-thread
+# executor owned by its stage, so each connection is only ever used from one
+# thread and the event loop never blocks on a driver.
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from automation import (mysql_pool, postgres_pool, stream_latest_records, get_last_rowid, transform_batch,
+                        FactBatchLoader, DEFAULT_CHUNK_SIZE, DEFAULT_LOAD_METHOD)
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Batches buffered between two stages; a full queue pauses the stage before it
+DEFAULT_QUEUE_SIZE = 2
+
+# Marks the end of the stream on a queue
+END_OF_STREAM = None
+
+@asynccontextmanager
+async def pooled_connection(executor, pool):
+    """Borrow a pooled connection, acquiring and releasing it on the stage's executor thread"""
+    loop = asyncio.get_running_loop()
+    conn = await loop.run_in_executor(executor, pool.acquire)
+    try:
+        yield conn
+    finally:
+        # release() rolls back, so it must run on the thread that used the connection
+        await loop.run_in_executor(executor, pool.release, conn)
+
+async def extract_stage(executor, output, last_rowid, chunk_size):
+    """Read source chunks above last_rowid and put them on the output queue"""
+    loop = asyncio.get_running_loop()
+    chunks = stream_latest_records(last_rowid, chunk_size)
+    try:
+        while True:
+            chunk = await loop.run_in_executor(executor, next, chunks, END_OF_STREAM)
+            if chunk is END_OF_STREAM:
+                break
+            await output.put(chunk)
+    finally:
+        # Release the MySQL connection on the thread that used it
+        await loop.run_in_executor(executor, chunks.close)
+    await output.put(END_OF_STREAM)
+
+async def transform_stage(executor, source, output, columnar):
+    """Resolve dimension keys for each source chunk on a connection of its own"""
+    loop = asyncio.get_running_loop()
+    # The connection is only needed when a new date triggers a DimDate refresh
+    async with pooled_connection(executor, postgres_pool) as postgres_conn:
+        cursor = await loop.run_in_executor(executor, postgres_conn.cursor)
+        resolver = None
+        while True:
+            chunk = await source.get()
+            if chunk is END_OF_STREAM:
+                break
+            started = time.perf_counter()
+            transformed, batch_max_rowid, resolver = await loop.run_in_executor(
+                executor, transform_batch, cursor, chunk, columnar, resolver)
+            await output.put((transformed, batch_max_rowid, len(chunk), started))
+        await loop.run_in_executor(executor, cursor.close)
+    await output.put(END_OF_STREAM)
+
+async def load_stage(executor, source, run_id, method):
+    """Load and commit each transformed batch; returns the number of rows loaded"""
+    loop = asyncio.get_running_loop()
+    async with pooled_connection(executor, postgres_pool) as postgres_conn:
+        loader = await loop.run_in_executor(executor, lambda: FactBatchLoader(postgres_conn, run_id, method=method))
+        while True:
+            item = await source.get()
+            if item is END_OF_STREAM:
+                break
+            await loop.run_in_executor(executor, loader.load, *item)
+        await loop.run_in_executor(executor, loader.close)
+    return loader.loaded
+
+async def run_stages(*stages):
+    """Run the stages concurrently; if one fails, cancel the rest and re-raise"""
+    tasks = [asyncio.ensure_future(stage) for stage in stages]
+    done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    for task in done:
+        if task.exception() is not None:
+            raise task.exception()
+    return [task.result() for task in tasks]
+
+async def synchronize_async(last_rowid, chunk_size=DEFAULT_CHUNK_SIZE, queue_size=DEFAULT_QUEUE_SIZE,
+                            columnar=False, method=DEFAULT_LOAD_METHOD, run_id=None):
+    """Pipelined extract/transform/load of the source rows above last_rowid
+
+    Returns the number of rows loaded.
+    """
+    run_id = run_id or datetime.now().strftime('async_%Y%m%dT%H%M%S')
+    extracted = asyncio.Queue(maxsize=queue_size)
+    transformed = asyncio.Queue(maxsize=queue_size)
+    executors = [ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'etl_{name}')
+                 for name in ('extract', 'transform', 'load')]
+    try:
+        _, _, loaded = await run_stages(
+            extract_stage(executors[0], extracted, last_rowid, chunk_size),
+            transform_stage(executors[1], extracted, transformed, columnar),
+            load_stage(executors[2], transformed, run_id, method),
+        )
+    finally:
+        for executor in executors:
+            executor.shutdown(wait=True)
+    return loaded
+
+def synchronize_data_async(chunk_size=DEFAULT_CHUNK_SIZE, queue_size=DEFAULT_QUEUE_SIZE, columnar=False,
+                           method=DEFAULT_LOAD_METHOD):
+    """Asyncio counterpart of automation.synchronize_data"""
+    try:
+        logger.info("Starting asyncio ETL synchronization process")
+        start = time.perf_counter()
+        loaded = asyncio.run(synchronize_async(get_last_rowid(), chunk_size, queue_size, columnar, method))
+        elapsed = time.perf_counter() - start
+        logger.info(f"ETL synchronization completed: {loaded} records in {elapsed:.2f}s "
+                    f"({loaded / elapsed if elapsed else 0.0:,.0f} rows/sec)")
+        return loaded
+    except Exception as e:
+        logger.error(f"Asyncio ETL synchronization failed: {e}")
+        raise
+    finally:
+        for pool in (mysql_pool, postgres_pool):
+            logger.info(f"{pool.name} pool: {pool.stats['opened']} opened, {pool.stats['reused']} reused")
+
+# Main execution
+if __name__ == "__main__":
+    synchronize_data_async()
@@ -3,8 +3,25 @@ import mysql.connector
 
 # Import libraries required for connecting to PostgreSql
 import psycopg2
+import psycopg2.extras
 from datetime import datetime
+import csv
+import io
+import itertools
 import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from connection_pool import ConnectionPool, ping_mysql, ping_postgres
+from etl_state import get_watermark, start_run, advance_watermark
+from warehouse_summary import ensure_fact_summary, refresh_fact_summary, adjust_fact_summary
+from sales_rollups import ensure_sales_rollups, refresh_sales_rollups, adjust_sales_rollups
+from dimension_cache import DimensionCache
+from commit_policy import CommitPolicy
+from columnar_transform import (ColumnarKeyResolver, records_to_columns, count_missing_keys, missing_keys,
+                                copy_columns, columns_to_rows, split_columns_by_month)
+from partitions import is_partitioned, ensure_month_partitions, route_to_partitions
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -27,65 +44,104 @@ postgres_config = {
     'port': '5432'
 }
 
-def get_database_connections():
-    """Establish connections to both MySQL and PostgreSQL databases"""
-    try:
-        # Connect to MySQL (source)
-        mysql_conn = mysql.connector.connect(**mysql_config)
-        mysql_cursor = mysql_conn.cursor()
-        logger.info("Connected to MySQL source database")
-        
-        # Connect to PostgreSQL (data warehouse)
-        postgres_conn = psycopg2.connect(**postgres_config)
-        postgres_cursor = postgres_conn.cursor()
-        logger.info("Connected to PostgreSQL data warehouse")
-        
-        return mysql_conn, mysql_cursor, postgres_conn, postgres_cursor
-    except Exception as e:
-        logger.error(f"Database connection error: {e}")
-        raise
+# Fact table target and column order used by every load path
+FACT_TABLE = 'FactSales'
+FACT_COLUMNS = ('rowid', 'product_id', 'customer_id', 'quantity', 'price',
+                'timestamp', 'date_key', 'category_key', 'country_key')
+
+# Bulk load settings: 'copy' streams through COPY FROM STDIN, 'values' uses
+# multi-row INSERTs via execute_values, 'row' is the original per-row loop
+LOAD_METHODS = ('copy', 'values', 'row')
+DEFAULT_LOAD_METHOD = 'copy'
+DEFAULT_BATCH_SIZE = 5000
+
+# Idempotent load modes: 'nothing' skips rows whose key is already loaded,
+# 'update' overwrites them with the incoming values. COPY batches go
+# through a session-local temp table and are merged from there.
+ON_CONFLICT_MODES = ('nothing', 'update')
+UPSERT_TABLE = 'factsales_upsert'
+
+# Bulk mode: unlogged, constraint-free staging copy of FactSales and the
+# dimension references validated before the merge
+STAGING_TABLE = 'factsales_staging'
+DIMENSION_REFERENCES = (
+    ('date_key', 'DimDate', 'dateid'),
+    ('category_key', 'DimCategory', 'categoryid'),
+    ('country_key', 'DimCountry', 'countryid'),
+)
+
+# Rows fetched per round trip when streaming the source delta
+DEFAULT_CHUNK_SIZE = 10000
+
+# Source query shared by every extraction mode
+LATEST_RECORDS_QUERY = """
+SELECT rowid, product_id, customer_id, quantity, price, timestamp
+FROM sales_data 
+WHERE rowid > %s
+ORDER BY rowid
+"""
+
+# Keyset range query used by parallel extraction, bounds are (low, high]
+RANGE_RECORDS_QUERY = """
+SELECT rowid, product_id, customer_id, quantity, price, timestamp
+FROM sales_data 
+WHERE rowid > %s AND rowid <= %s
+ORDER BY rowid
+"""
+
+# Parallel extraction settings: worker threads and rowids per keyset range
+DEFAULT_EXTRACT_WORKERS = 4
+DEFAULT_RANGE_SIZE = 50000
+
+# Connections each shared pool may hold. The sizes are fixed here rather than
+# raised at run time, and connections open lazily, so the limit only costs
+# what a run actually uses; parallel extraction uses at most MYSQL_POOL_SIZE workers
+MYSQL_POOL_SIZE = 8
+POSTGRES_POOL_SIZE = 4
+
+# Shared connection pools, opened lazily on first use and reused across ETL
+# calls and across DAG task runs executed by the same worker process
+mysql_pool = ConnectionPool('MySQL', lambda: mysql.connector.connect(**mysql_config), ping_mysql,
+                            max_size=MYSQL_POOL_SIZE)
+postgres_pool = ConnectionPool('PostgreSQL', lambda: psycopg2.connect(**postgres_config), ping_postgres,
+                               max_size=POSTGRES_POOL_SIZE)
+
+# Dimension surrogate keys, loaded from the warehouse on first use and
+# refreshed incrementally when a batch references an unknown date
+dimension_cache = DimensionCache()
 
 def get_last_rowid():
-    """Get the last processed rowid from the FactSales table"""
+    """Get the last committed rowid from the etl_watermark checkpoint table
+    
+    A missing watermark row is bootstrapped by get_watermark (0 for an empty
+    FactSales). Any other failure is raised: falling back to 0 would make
+    the next run extract the whole source table again.
+    """
     try:
-        mysql_conn, mysql_cursor, postgres_conn, postgres_cursor = get_database_connections()
-        
-        # Query the FactSales table to get the maximum rowid
-        postgres_cursor.execute("SELECT COALESCE(MAX(rowid), 0) FROM FactSales")
-        last_rowid = postgres_cursor.fetchone()[0]
-        
-        # Close connections
-        mysql_cursor.close()
-        mysql_conn.close()
-        postgres_cursor.close()
-        postgres_conn.close()
+        with postgres_pool.connection() as postgres_conn:
+            postgres_cursor = postgres_conn.cursor()
+            
+            # Primary key lookup instead of scanning FactSales for MAX(rowid)
+            last_rowid = get_watermark(postgres_cursor)
+            postgres_conn.commit()
+            postgres_cursor.close()
         
         logger.info(f"Last processed rowid: {last_rowid}")
         return last_rowid
     except Exception as e:
         logger.error(f"Error getting last rowid: {e}")
-        return 0
+        raise
 
 def get_latest_records(last_rowid):
     """Get new records from MySQL source that haven't been processed"""
     try:
-        mysql_conn, mysql_cursor, postgres_conn, postgres_cursor = get_database_connections()
-        
-        # Query for new records from MySQL
-        query = """
-        SELECT rowid, product_id, customer_id, quantity, price, timestamp
-        FROM sales_data 
-        WHERE rowid > %s
-        ORDER BY rowid
-        """
-        mysql_cursor.execute(query, (last_rowid,))
-        records = mysql_cursor.fetchall()
-        
-        # Close connections
-        mysql_cursor.close()
-        mysql_conn.close()
-        postgres_cursor.close()
-        postgres_conn.close()
+        with mysql_pool.connection() as mysql_conn:
+            mysql_cursor = mysql_conn.cursor()
+            
+            # Query for new records from MySQL
+            mysql_cursor.execute(LATEST_RECORDS_QUERY, (last_rowid,))
+            records = mysql_cursor.fetchall()
+            mysql_cursor.close()
         
         logger.info(f"Retrieved {len(records)} new records from source")
         return records
@@ -93,25 +149,109 @@ def get_latest_records(last_rowid):
         logger.error(f"Error getting latest records: {e}")
         return []
 
+def stream_latest_records(last_rowid, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield new MySQL records in chunks of chunk_size without buffering the delta
+    
+    The query runs on an unbuffered cursor, so rows are pulled from the server
+    as each chunk is requested and only one chunk is held in memory at a time.
+    """
+    total = 0
+    with mysql_pool.connection() as mysql_conn:
+        mysql_cursor = mysql_conn.cursor(buffered=False)
+        try:
+            mysql_cursor.execute(LATEST_RECORDS_QUERY, (last_rowid,))
+            while True:
+                chunk = mysql_cursor.fetchmany(chunk_size)
+                if not chunk:
+                    break
+                total += len(chunk)
+                yield chunk
+        finally:
+            # An abandoned unbuffered result leaves the connection unusable;
+            # the pool drops it when its rollback fails on release
+            try:
+                mysql_cursor.close()
+            except Exception:
+                pass
+    
+    logger.info(f"Streamed {total} new records from source")
+
+def get_source_max_rowid():
+    """Get the highest rowid currently in the MySQL source table"""
+    with mysql_pool.connection() as mysql_conn:
+        mysql_cursor = mysql_conn.cursor()
+        mysql_cursor.execute("SELECT COALESCE(MAX(rowid), 0) FROM sales_data")
+        max_rowid = mysql_cursor.fetchone()[0]
+        mysql_cursor.close()
+    return max_rowid
+
+def split_rowid_ranges(last_rowid, max_rowid, range_size=DEFAULT_RANGE_SIZE):
+    """Split (last_rowid, max_rowid] into consecutive (low, high] keyset ranges"""
+    ranges = []
+    low = last_rowid
+    while low < max_rowid:
+        high = min(low + range_size, max_rowid)
+        ranges.append((low, high))
+        low = high
+    return ranges
+
+def fetch_rowid_range(bounds):
+    """Fetch all source records in one (low, high] rowid range"""
+    low, high = bounds
+    with mysql_pool.connection() as mysql_conn:
+        mysql_cursor = mysql_conn.cursor()
+        mysql_cursor.execute(RANGE_RECORDS_QUERY, (low, high))
+        records = mysql_cursor.fetchall()
+        mysql_cursor.close()
+    return records
+
+def parallel_latest_records(last_rowid, workers=DEFAULT_EXTRACT_WORKERS, range_size=DEFAULT_RANGE_SIZE):
+    """Yield new MySQL records range by range, fetching ranges concurrently
+    
+    The delta is split into keyset ranges of range_size rowids that are pulled
+    on a thread pool with one pooled connection per worker, so workers is
+    capped at the pool size (MYSQL_POOL_SIZE). Ranges are yielded in rowid
+    order and at most two ranges per worker are fetched or waiting, so memory
+    stays bounded by about 2 * workers * range_size rows.
+    """
+    if workers > mysql_pool.max_size:
+        logger.warning(f"{workers} extract workers requested but the MySQL pool holds {mysql_pool.max_size} "
+                       f"connections (MYSQL_POOL_SIZE); using {mysql_pool.max_size} workers")
+        workers = mysql_pool.max_size
+    
+    max_rowid = get_source_max_rowid()
+    ranges = split_rowid_ranges(last_rowid, max_rowid, range_size)
+    logger.info(f"Extracting rowids ({last_rowid}, {max_rowid}] as {len(ranges)} ranges on {workers} workers")
+    
+    total = 0
+    pending = deque()
+    remaining = iter(ranges)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for bounds in itertools.islice(remaining, workers * 2):
+            pending.append(executor.submit(fetch_rowid_range, bounds))
+        while pending:
+            records = pending.popleft().result()
+            for bounds in itertools.islice(remaining, 1):
+                pending.append(executor.submit(fetch_rowid_range, bounds))
+            if records:
+                total += len(records)
+                yield records
+    
+    logger.info(f"Extracted {total} new records from source in parallel")
+
 def lookup_dimension_keys(postgres_cursor, records):
     """Lookup dimension keys for the fact table"""
+    if not dimension_cache.loaded:
+        dimension_cache.load_from_warehouse(postgres_cursor)
+    
+    # Resolve every key for the batch from the in-memory dimension cache
+    keys = dimension_cache.resolve_batch(records, postgres_cursor)
+    
     processed_records = []
     
-    for record in records:
+    for record, (date_key, category_key, country_key) in zip(records, keys):
         rowid, product_id, customer_id, quantity, price, timestamp = record
         
-        # For this example, we'll use simplified dimension lookups
-        # In a real scenario, you'd lookup actual dimension keys
-        
-        # Date dimension lookup (simplified - using current date)
-        date_key = timestamp.strftime('%Y%m%d') if timestamp else datetime.now().strftime('%Y%m%d')
-        
-        # Category dimension (simplified - using product_id modulo for demo)
-        category_key = (product_id % 5) + 1  # Assuming 5 categories
-        
-        # Country dimension (simplified - using customer_id modulo for demo)
-        country_key = (customer_id % 10) + 1  # Assuming 10 countries
-        
         processed_record = {
             'rowid': rowid,
             'product_id': product_id,
@@ -127,60 +267,528 @@ def lookup_dimension_keys(postgres_cursor, records):
     
     return processed_records
 
-def insert_records(records):
-    """Insert new records into the FactSales table with proper dimension references"""
+def transform_columnar(postgres_cursor, records, resolver=None):
+    """Columnar counterpart of lookup_dimension_keys
+    
+    Returns the batch as NumPy column arrays with date_key, category_key and
+    country_key added, plus the key resolver so it can be reused for the next
+    batch until the dimension cache changes.
+    """
+    if not dimension_cache.loaded:
+        dimension_cache.load_from_warehouse(postgres_cursor)
+    if resolver is None or resolver.version != dimension_cache.version:
+        resolver = ColumnarKeyResolver(dimension_cache)
+    
+    columns = resolver.resolve(records_to_columns(records))
+    
+    # Unknown keys may have been added to the dimensions since the cache was
+    # loaded; as in resolve_batch, keys a refresh did not find do not trigger another
+    if count_missing_keys(columns) and postgres_cursor is not None:
+        missing = missing_keys(columns)
+        unknown = dimension_cache.unknown_keys(resolver.snapshot, missing['date'],
+                                               missing['category'], missing['country'])
+        if any(unknown.values()):
+            dimension_cache.refresh(postgres_cursor)
+            if dimension_cache.version != resolver.version:
+                resolver = ColumnarKeyResolver(dimension_cache)
+                columns = resolver.resolve(columns)
+            dimension_cache.mark_missing(unknown, resolver.snapshot)
+    
+    missing = count_missing_keys(columns)
+    if missing:
+        logger.warning(f"{missing} records have keys not present in DimDate, DimCategory or DimCountry")
+    return columns, resolver
+
+def fact_row(record):
+    """Convert a processed record dict into a tuple in FACT_COLUMNS order"""
+    return tuple(record[column] for column in FACT_COLUMNS)
+
+def iter_batches(rows, batch_size):
+    """Yield lists of at most batch_size rows from any iterable"""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def rows_to_csv(rows):
+    """Serialize fact row tuples into a CSV buffer for COPY"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    for row in rows:
+        # Unquoted empty fields are read back as NULL in CSV mode
+        writer.writerow(['' if value is None else value for value in row])
+    buffer.seek(0)
+    return buffer
+
+def copy_rows(postgres_cursor, rows, table=FACT_TABLE):
+    """Stream one batch of fact rows into the table with COPY FROM STDIN"""
+    copy_sql = f"COPY {table} ({', '.join(FACT_COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+    postgres_cursor.copy_expert(copy_sql, rows_to_csv(rows))
+
+def insert_values_rows(postgres_cursor, rows, table=FACT_TABLE, page_size=DEFAULT_BATCH_SIZE):
+    """Insert one batch of fact rows with multi-row INSERT statements"""
+    insert_query = f"INSERT INTO {table} ({', '.join(FACT_COLUMNS)}) VALUES %s"
+    psycopg2.extras.execute_values(postgres_cursor, insert_query, rows, page_size=page_size)
+
+def insert_single_rows(postgres_cursor, rows, table=FACT_TABLE):
+    """Insert fact rows one statement at a time (original load path)"""
+    placeholders = ', '.join(['%s'] * len(FACT_COLUMNS))
+    insert_query = f"INSERT INTO {table} ({', '.join(FACT_COLUMNS)}) VALUES ({placeholders})"
+    for row in rows:
+        postgres_cursor.execute(insert_query, row)
+
+def conflict_columns(partitioned=False):
+    """Primary key of FactSales; on a partitioned table it includes the partition key"""
+    return ('rowid', 'timestamp') if partitioned else ('rowid',)
+
+def on_conflict_clause(on_conflict, key_columns=('rowid',)):
+    """ON CONFLICT clause for an INSERT INTO ... AS target in the given idempotent mode
+    
+    'update' only rewrites rows whose values changed, so replaying a batch
+    that is already loaded creates no dead tuples.
+    """
+    if on_conflict not in ON_CONFLICT_MODES:
+        raise ValueError(f"Unknown conflict mode '{on_conflict}', expected one of {ON_CONFLICT_MODES}")
+    keys = ', '.join(key_columns)
+    if on_conflict == 'nothing':
+        return f"ON CONFLICT ({keys}) DO NOTHING"
+    columns = [column for column in FACT_COLUMNS if column not in key_columns]
+    return (f"ON CONFLICT ({keys}) DO UPDATE SET "
+            f"{', '.join(f'{column} = EXCLUDED.{column}' for column in columns)} "
+            f"WHERE ({', '.join(f'target.{column}' for column in columns)}) IS DISTINCT FROM "
+            f"({', '.join(f'EXCLUDED.{column}' for column in columns)})")
+
+def upsert_fact_rows(postgres_cursor, rows, on_conflict, method=DEFAULT_LOAD_METHOD,
+                     batch_size=DEFAULT_BATCH_SIZE, table=FACT_TABLE, key_columns=('rowid',)):
+    """Load fact row tuples idempotently and return the number of rows inserted or changed
+    
+    Rows whose key already exists are skipped ('nothing') or overwritten
+    ('update') instead of failing the batch with a unique violation.
+    """
+    if method not in LOAD_METHODS:
+        raise ValueError(f"Unknown load method '{method}', expected one of {LOAD_METHODS}")
+    
+    columns = ', '.join(FACT_COLUMNS)
+    conflict = on_conflict_clause(on_conflict, key_columns)
+    written = 0
+    if method == 'copy':
+        postgres_cursor.execute(f"CREATE TEMP TABLE IF NOT EXISTS {UPSERT_TABLE} "
+                                f"(LIKE {FACT_TABLE} INCLUDING DEFAULTS) ON COMMIT DELETE ROWS")
+        for batch in iter_batches(rows, batch_size):
+            load_fact_rows(postgres_cursor, batch, method='copy', batch_size=batch_size, table=UPSERT_TABLE)
+            postgres_cursor.execute(f"INSERT INTO {table} AS target ({columns}) "
+                                    f"SELECT {columns} FROM {UPSERT_TABLE} {conflict}")
+            written += postgres_cursor.rowcount
+            postgres_cursor.execute(f"TRUNCATE {UPSERT_TABLE}")
+    elif method == 'values':
+        insert_query = f"INSERT INTO {table} AS target ({columns}) VALUES %s {conflict}"
+        for batch in iter_batches(rows, batch_size):
+            # One page per batch, so rowcount covers the whole batch
+            psycopg2.extras.execute_values(postgres_cursor, insert_query, batch, page_size=len(batch))
+            written += postgres_cursor.rowcount
+    else:
+        placeholders = ', '.join(['%s'] * len(FACT_COLUMNS))
+        insert_query = f"INSERT INTO {table} AS target ({columns}) VALUES ({placeholders}) {conflict}"
+        for row in rows:
+            postgres_cursor.execute(insert_query, row)
+            written += postgres_cursor.rowcount
+    return written
+
+def load_fact_rows(postgres_cursor, rows, method=DEFAULT_LOAD_METHOD,
+                   batch_size=DEFAULT_BATCH_SIZE, table=FACT_TABLE, on_conflict=None, key_columns=('rowid',)):
+    """Load fact row tuples into the table in batches and return the row count
+
+    COPY is tried first when method is 'copy'; if the server or a pooler in
+    front of it rejects COPY, the batch is retried with execute_values and
+    the rest of the load stays on that path. With on_conflict set the load
+    is idempotent (see upsert_fact_rows) and returns the rows written.
+    """
+    if on_conflict is not None:
+        return upsert_fact_rows(postgres_cursor, rows, on_conflict, method, batch_size, table, key_columns)
+    if method not in LOAD_METHODS:
+        raise ValueError(f"Unknown load method '{method}', expected one of {LOAD_METHODS}")
+
+    loaded = 0
+    copy_verified = False
+    for batch in iter_batches(rows, batch_size):
+        if method == 'copy' and not copy_verified:
+            # Guard the first COPY with a savepoint so a rejection can fall back
+            try:
+                postgres_cursor.execute("SAVEPOINT copy_batch")
+                copy_rows(postgres_cursor, batch, table)
+                postgres_cursor.execute("RELEASE SAVEPOINT copy_batch")
+                copy_verified = True
+            except psycopg2.NotSupportedError as e:
+                logger.warning(f"COPY unavailable ({e}), falling back to execute_values")
+                postgres_cursor.execute("ROLLBACK TO SAVEPOINT copy_batch")
+                method = 'values'
+                insert_values_rows(postgres_cursor, batch, table, batch_size)
+        elif method == 'copy':
+            copy_rows(postgres_cursor, batch, table)
+        elif method == 'values':
+            insert_values_rows(postgres_cursor, batch, table, batch_size)
+        else:
+            insert_single_rows(postgres_cursor, batch, table)
+        loaded += len(batch)
+
+    return loaded
+
+def load_fact_columns(postgres_cursor, columns, method=DEFAULT_LOAD_METHOD,
+                      batch_size=DEFAULT_BATCH_SIZE, table=FACT_TABLE, on_conflict=None, key_columns=('rowid',)):
+    """Load a columnar batch into the table and return the row count"""
+    if on_conflict is not None:
+        return upsert_fact_rows(postgres_cursor, columns_to_rows(columns, FACT_COLUMNS), on_conflict,
+                                method, batch_size, table, key_columns)
+    if method == 'copy':
+        try:
+            postgres_cursor.execute("SAVEPOINT copy_batch")
+            copy_columns(postgres_cursor, columns, FACT_COLUMNS, table)
+            postgres_cursor.execute("RELEASE SAVEPOINT copy_batch")
+            return len(columns['rowid'])
+        except psycopg2.NotSupportedError as e:
+            logger.warning(f"COPY unavailable ({e}), falling back to execute_values")
+            postgres_cursor.execute("ROLLBACK TO SAVEPOINT copy_batch")
+            method = 'values'
+    
+    return load_fact_rows(postgres_cursor, columns_to_rows(columns, FACT_COLUMNS),
+                          method=method, batch_size=batch_size, table=table)
+
+def split_rows_by_month(rows):
+    """Group fact row tuples by the (year, month) of their timestamp"""
+    groups = {}
+    for row in rows:
+        timestamp = row[5]
+        if timestamp is None:
+            raise ValueError("Rows with a NULL timestamp cannot be routed to a monthly partition")
+        groups.setdefault((timestamp.year, timestamp.month), []).append(row)
+    return groups
+
+def load_partitioned_rows(postgres_cursor, rows, known_months, method=DEFAULT_LOAD_METHOD,
+                          batch_size=DEFAULT_BATCH_SIZE, table=FACT_TABLE, on_conflict=None):
+    """Load fact row tuples straight into the monthly partitions of a partitioned table
+    
+    Missing partitions are created first; writing to each partition directly
+    skips tuple routing through the parent. Returns the row count.
+    """
+    loaded = 0
+    for partition, rows in route_to_partitions(postgres_cursor, split_rows_by_month(rows), known_months, table):
+        loaded += load_fact_rows(postgres_cursor, rows, method=method, batch_size=batch_size, table=partition,
+                                 on_conflict=on_conflict, key_columns=conflict_columns(partitioned=True))
+    return loaded
+
+def load_partitioned_columns(postgres_cursor, columns, known_months, method=DEFAULT_LOAD_METHOD,
+                             batch_size=DEFAULT_BATCH_SIZE, table=FACT_TABLE, on_conflict=None):
+    """Columnar counterpart of load_partitioned_rows"""
+    loaded = 0
+    for partition, part in route_to_partitions(postgres_cursor, split_columns_by_month(columns), known_months, table):
+        loaded += load_fact_columns(postgres_cursor, part, method=method, batch_size=batch_size, table=partition,
+                                    on_conflict=on_conflict, key_columns=conflict_columns(partitioned=True))
+    return loaded
+
+def transform_batch(postgres_cursor, batch, columnar=False, resolver=None):
+    """Resolve dimension keys for one batch of source records
+    
+    Returns (transformed, batch_max_rowid, resolver): transformed is a dict
+    of NumPy columns with columnar=True, otherwise a list of fact row tuples.
+    """
+    if columnar:
+        columns, resolver = transform_columnar(postgres_cursor, batch, resolver)
+        return columns, int(columns['rowid'].max()), resolver
+    fact_rows = [fact_row(record) for record in lookup_dimension_keys(postgres_cursor, batch)]
+    return fact_rows, max(row[0] for row in fact_rows), resolver
+
+class FactBatchLoader:
+    """Loads transformed batches into FactSales, committing each with its checkpoint
+    
+    Creating a loader resets the run counters of the etl_watermark row and
+    bootstraps the summary tables. Every load() commits the batch together
+    with its watermark advance and the fact_summary and rollup refreshes.
+    With on_conflict set, batches are upserted and the summaries are
+    adjusted for any rows the batch skipped or overwrote.
+    """
+    
+    def __init__(self, postgres_conn, run_id, method=DEFAULT_LOAD_METHOD, batch_size=DEFAULT_BATCH_SIZE,
+                 on_conflict=None):
+        self.conn = postgres_conn
+        self.cursor = postgres_conn.cursor()
+        self.method = method
+        self.batch_size = batch_size
+        self.on_conflict = on_conflict
+        self.loaded = 0
+        
+        # Make sure the checkpoint row exists, then reset its run counters
+        get_watermark(self.cursor)
+        start_run(self.cursor, run_id)
+        ensure_fact_summary(self.cursor)
+        ensure_sales_rollups(self.cursor)
+        self.partitioned = is_partitioned(self.cursor, FACT_TABLE)
+        self.known_months = set()
+        self.conn.commit()
+    
+    def load(self, transformed, batch_max_rowid, row_count, started):
+        """Load and commit one transformed batch; started is its perf_counter start time"""
+        if self.on_conflict is not None:
+            # Rows that are already loaded may be overwritten: take their
+            # current values out of the summaries and add the result back
+            rowids = transformed['rowid'].tolist() if isinstance(transformed, dict) else [row[0] for row in transformed]
+            adjust_fact_summary(self.cursor, rowids, -1)
+            adjust_sales_rollups(self.cursor, rowids, -1)
+        
+        options = {'method': self.method, 'batch_size': self.batch_size, 'on_conflict': self.on_conflict}
+        if isinstance(transformed, dict):
+            if self.partitioned:
+                load_partitioned_columns(self.cursor, transformed, self.known_months, **options)
+            else:
+                load_fact_columns(self.cursor, transformed, **options)
+        elif self.partitioned:
+            load_partitioned_rows(self.cursor, transformed, self.known_months, **options)
+        else:
+            load_fact_rows(self.cursor, transformed, **options)
+        
+        if self.on_conflict is not None:
+            adjust_fact_summary(self.cursor, rowids, 1)
+            adjust_sales_rollups(self.cursor, rowids, 1)
+        
+        # Advance the checkpoint, the FactSales summary and the reporting
+        # rollups in the same transaction as the batch
+        advance_watermark(self.cursor, batch_max_rowid, row_count, time.perf_counter() - started)
+        refresh_fact_summary(self.cursor, batch_max_rowid)
+        refresh_sales_rollups(self.cursor, batch_max_rowid)
+        self.conn.commit()
+        self.loaded += row_count
+    
+    def close(self):
+        self.cursor.close()
+
+def insert_records(records, method=DEFAULT_LOAD_METHOD, batch_size=DEFAULT_BATCH_SIZE, run_id=None,
+                   columnar=False, on_conflict=None, commit_policy=None):
+    """Insert new records into the FactSales table with proper dimension references
+    
+    records may be a list or any iterable of source rows in rowid order, such
+    as the flattened output of stream_latest_records(). Each batch is
+    committed together with its etl_watermark update, so a failed run keeps
+    every batch committed before the failure and resumes after it. The
+    fact_summary statistics used by validation and the reporting rollups
+    (sales_rollups.py) are refreshed in the same transaction.
+    With columnar=True each batch is transformed as NumPy columns and loaded
+    without building a dict per record. If FactSales is partitioned (see
+    postgresqlconnect.FACTSALES_PARTITIONED), each batch is split by month
+    and loaded directly into its partitions.
+    With on_conflict='nothing' or 'update' rows that are already in FactSales
+    are skipped or overwritten instead of failing their batch, so a retry
+    or an overlapping rerun only writes what is missing.
+    commit_policy (a commit_policy.CommitPolicy) decides where batches end:
+    every N rows, M bytes or T seconds, or adaptively for a target commit
+    latency; the default commits every batch_size rows. Rows/sec and the
+    p99 commit latency are logged at the end.
+    """
     if not records:
         logger.info("No records to insert")
         return
     
+    run_id = run_id or datetime.now().strftime('sync_%Y%m%dT%H%M%S')
+    loader = None
+    
     try:
-        mysql_conn, mysql_cursor, postgres_conn, postgres_cursor = get_database_connections()
-        
-        # Process records to get dimension keys
-        processed_records = lookup_dimension_keys(postgres_cursor, records)
-        
-        # Insert into FactSales table
-        insert_query = """
-        INSERT INTO FactSales (rowid, product_id, customer_id, quantity, price, timestamp, date_key, category_key, country_key)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """
-        
-        for record in processed_records:
-            postgres_cursor.execute(insert_query, (
-                record['rowid'],
-                record['product_id'],
-                record['customer_id'],
-                record['quantity'],
-                record['price'],
-                record['timestamp'],
-                record['date_key'],
-                record['category_key'],
-                record['country_key']
-            ))
-        
-        postgres_conn.commit()
-        logger.info(f"Successfully inserted {len(processed_records)} records into FactSales")
-        
-        # Close connections
-        mysql_cursor.close()
-        mysql_conn.close()
-        postgres_cursor.close()
-        postgres_conn.close()
+        with postgres_pool.connection() as postgres_conn:
+            loader = FactBatchLoader(postgres_conn, run_id, method=method, batch_size=batch_size,
+                                     on_conflict=on_conflict)
+            
+            # Resolve dimension keys one batch at a time so a streamed source
+            # never has to be materialized in full
+            resolver = None
+            policy = commit_policy or CommitPolicy(rows=batch_size)
+            for batch in policy.batches(records):
+                batch_start = time.perf_counter()
+                transformed, batch_max_rowid, resolver = transform_batch(loader.cursor, batch, columnar, resolver)
+                # Commit latency covers the load and commit only, as in the
+                # commit policy benchmark; the watermark keeps the full batch time
+                load_start = time.perf_counter()
+                loader.load(transformed, batch_max_rowid, len(batch), batch_start)
+                policy.record(len(batch), time.perf_counter() - load_start)
+            
+            loader.close()
+        
+        logger.info(f"Successfully inserted {loader.loaded} records into FactSales using '{method}' load (run {run_id})")
+        policy.log_summary()
         
     except Exception as e:
-        logger.error(f"Error inserting records: {e}")
-        if 'postgres_conn' in locals():
-            postgres_conn.rollback()
+        # The pool rolls back the uncommitted batch when the connection is returned
+        logger.error(f"Error inserting records after {loader.loaded if loader else 0} committed rows: {e}")
         raise
 
-def synchronize_data():
-    """Main ETL synchronization function"""
+def create_staging_table(postgres_cursor, table=FACT_TABLE, staging_table=STAGING_TABLE):
+    """Create or empty the unlogged staging copy of the fact table
+    
+    The staging table has the fact columns but no keys or foreign keys, so
+    COPY into it does no per-row constraint work and writes no WAL. TRUNCATE
+    holds its lock until commit, so concurrent bulk loads take turns.
+    """
+    postgres_cursor.execute(f"CREATE UNLOGGED TABLE IF NOT EXISTS {staging_table} (LIKE {table} INCLUDING DEFAULTS)")
+    postgres_cursor.execute(f"TRUNCATE {staging_table}")
+
+def validate_staged_keys(postgres_cursor, staging_table=STAGING_TABLE, reject=False):
+    """Find staged dimension keys without a dimension row and load them as NULL
+    
+    All three references are checked by one anti-join query over the
+    staging table; only columns with invalid keys are updated afterwards.
+    With reject=True a ValueError is raised instead when any key is invalid.
+    Returns {key column: number of invalid keys}.
+    """
+    counts = ', '.join(f"COUNT(*) FILTER (WHERE s.{column} IS NOT NULL AND d{i}.{key} IS NULL)"
+                       for i, (column, _, key) in enumerate(DIMENSION_REFERENCES))
+    joins = ' '.join(f"LEFT JOIN {dimension} d{i} ON d{i}.{key} = s.{column}"
+                     for i, (column, dimension, key) in enumerate(DIMENSION_REFERENCES))
+    postgres_cursor.execute(f"SELECT {counts} FROM {staging_table} s {joins}")
+    invalid = dict(zip((column for column, _, _ in DIMENSION_REFERENCES), postgres_cursor.fetchone()))
+    if reject and any(invalid.values()):
+        raise ValueError(f"Staged rows reference missing dimension rows: "
+                         f"{', '.join(f'{count} {column}' for column, count in invalid.items() if count)}")
+    
+    for column, dimension, key in DIMENSION_REFERENCES:
+        if invalid[column]:
+            logger.warning(f"{invalid[column]} staged rows reference a missing {dimension} row; loading {column} as NULL")
+            postgres_cursor.execute(f"""
+                UPDATE {staging_table} s SET {column} = NULL
+                WHERE s.{column} IS NOT NULL
+                  AND NOT EXISTS (SELECT 1 FROM {dimension} d WHERE d.{key} = s.{column})
+            """)
+    return invalid
+
+def merge_staged_rows(postgres_cursor, table=FACT_TABLE, staging_table=STAGING_TABLE):
+    """Insert the staged rows into the fact table with a single INSERT ... SELECT
+    
+    Rows already present (same key) are skipped. On a partitioned fact
+    table the monthly partitions the staged rows need are created first.
+    The fact table's foreign keys are DEFERRABLE (see postgresqlconnect.py),
+    so they are deferred here and checked at commit instead of during the
+    INSERT; validate_staged_keys has already made them pass.
+    Returns the number of rows inserted.
+    """
+    if is_partitioned(postgres_cursor, table):
+        postgres_cursor.execute(f"""
+            SELECT DISTINCT EXTRACT(YEAR FROM timestamp)::integer, EXTRACT(MONTH FROM timestamp)::integer
+            FROM {staging_table}
+        """)
+        ensure_month_partitions(postgres_cursor, set(postgres_cursor.fetchall()), table)
+    
+    postgres_cursor.execute("SET CONSTRAINTS ALL DEFERRED")
+    columns = ', '.join(FACT_COLUMNS)
+    postgres_cursor.execute(f"""
+        INSERT INTO {table} ({columns})
+        SELECT {columns} FROM {staging_table}
+        ORDER BY rowid
+        ON CONFLICT DO NOTHING
+    """)
+    return postgres_cursor.rowcount
+
+def bulk_insert_records(records, batch_size=DEFAULT_BATCH_SIZE, run_id=None, columnar=False,
+                        reject_invalid_keys=False):
+    """Deferred-constraint bulk load for large catch-up deltas
+    
+    Every batch is COPYed into the unlogged staging table, dimension
+    references are validated once for the whole load, and the rows are
+    merged into FactSales with one INSERT ... SELECT ... ON CONFLICT DO
+    NOTHING. The merge, the etl_watermark update and the summary refreshes
+    commit together, so a failed load leaves FactSales untouched and is
+    retried in full by the next run. Invalid dimension keys are loaded as
+    NULL and counted, or fail the load with reject_invalid_keys=True.
+    """
+    run_id = run_id or datetime.now().strftime('sync_%Y%m%dT%H%M%S')
+    load_start = time.perf_counter()
+    staged = 0
+    max_rowid = None
+    
+    try:
+        with postgres_pool.connection() as postgres_conn:
+            postgres_cursor = postgres_conn.cursor()
+            
+            get_watermark(postgres_cursor)
+            start_run(postgres_cursor, run_id)
+            ensure_fact_summary(postgres_cursor)
+            ensure_sales_rollups(postgres_cursor)
+            postgres_conn.commit()
+            
+            create_staging_table(postgres_cursor)
+            resolver = None
+            for batch in iter_batches(records, batch_size):
+                if columnar:
+                    columns, resolver = transform_columnar(postgres_cursor, batch, resolver)
+                    staged += load_fact_columns(postgres_cursor, columns, batch_size=batch_size, table=STAGING_TABLE)
+                    batch_max_rowid = int(columns['rowid'].max())
+                else:
+                    fact_rows = [fact_row(record) for record in lookup_dimension_keys(postgres_cursor, batch)]
+                    staged += load_fact_rows(postgres_cursor, fact_rows, batch_size=batch_size, table=STAGING_TABLE)
+                    batch_max_rowid = max(row[0] for row in fact_rows)
+                max_rowid = batch_max_rowid if max_rowid is None else max(max_rowid, batch_max_rowid)
+            
+            if not staged:
+                logger.info("No records to insert")
+                postgres_conn.rollback()
+                return 0
+            
+            invalid = validate_staged_keys(postgres_cursor, reject=reject_invalid_keys)
+            inserted = merge_staged_rows(postgres_cursor)
+            postgres_cursor.execute(f"TRUNCATE {STAGING_TABLE}")
+            
+            advance_watermark(postgres_cursor, max_rowid, staged, time.perf_counter() - load_start)
+            refresh_fact_summary(postgres_cursor, max_rowid)
+            refresh_sales_rollups(postgres_cursor, max_rowid)
+            postgres_conn.commit()
+            postgres_cursor.close()
+        
+        logger.info(f"Bulk loaded {inserted} of {staged} staged records into FactSales "
+                    f"({staged - inserted} already present, {sum(invalid.values())} invalid dimension keys "
+                    f"loaded as NULL, run {run_id})")
+        return inserted
+        
+    except Exception as e:
+        # The pool rolls back the whole load when the connection is returned
+        logger.error(f"Bulk load failed after staging {staged} records: {e}")
+        raise
+
+def synchronize_data(streaming=False, chunk_size=DEFAULT_CHUNK_SIZE, workers=1,
+                     range_size=DEFAULT_RANGE_SIZE, columnar=False, bulk=False, on_conflict=None,
+                     commit_policy=None):
+    """Main ETL synchronization function
+    
+    With streaming=True the delta is extracted, transformed and loaded chunk
+    by chunk, so peak memory is bounded by chunk_size rather than the delta.
+    With workers > 1 the delta is pulled as keyset ranges of range_size rowids
+    on that many concurrent connections and loaded in rowid order.
+    With columnar=True batches are transformed as NumPy columns.
+    With bulk=True the delta is loaded through the staging table and merged
+    in one transaction (bulk_insert_records) instead of batch by batch.
+    With on_conflict='nothing' or 'update' batches are loaded idempotently
+    (see insert_records); the bulk merge always skips existing rows.
+    commit_policy sets where insert_records commits (see commit_policy.py).
+    """
     try:
         logger.info("Starting ETL synchronization process")
         
         # Step 1: Get the last processed rowid
         last_rowid = get_last_rowid()
         
+        if streaming or workers > 1:
+            # Steps 2-3: Feed source chunks straight into the data warehouse
+            if workers > 1:
+                # Pull keyset ranges concurrently, yielded in rowid order
+                chunks = parallel_latest_records(last_rowid, workers, range_size)
+            else:
+                chunks = stream_latest_records(last_rowid, chunk_size)
+            records = itertools.chain.from_iterable(chunks)
+            if bulk:
+                bulk_insert_records(records, columnar=columnar)
+            else:
+                insert_records(records, columnar=columnar, on_conflict=on_conflict,
+                               commit_policy=commit_policy)
+            logger.info("ETL synchronization completed successfully")
+            return
+        
         # Step 2: Get new records from source
         new_records = get_latest_records(last_rowid)
         
@@ -189,13 +797,20 @@ def synchronize_data():
             return
         
         # Step 3: Insert records into data warehouse
-        insert_records(new_records)
+        if bulk:
+            bulk_insert_records(new_records, columnar=columnar)
+        else:
+            insert_records(new_records, columnar=columnar, on_conflict=on_conflict,
+                           commit_policy=commit_policy)
         
         logger.info("ETL synchronization completed successfully")
         
     except Exception as e:
         logger.error(f"ETL synchronization failed: {e}")
         raise
+    finally:
+        for pool in (mysql_pool, postgres_pool):
+            logger.info(f"{pool.name} pool: {pool.stats['opened']} opened, {pool.stats['reused']} reused")
 
 # Main execution
 if __name__ == "__main__":
@@ -0,0 +1,651 @@
+#!/usr/bin/env python3
+"""
+Benchmark script for the Module 03 sales synchronization paths
+- load:    loads synthetic FactSales rows built from sales.csv into a scratch
+           table and reports rows/sec for each load method
+- extract: drains the MySQL sales_data table with parallel keyset-range
+           extraction and reports rows/sec for each worker count
+- transform: compares the per-record dict transform with the NumPy columnar
+           transform on sales.csv / oltpdata.csv rows scaled up in memory
+- bulk:    compares the per-row, FK-checked INSERT loop with the staged bulk
+           mode (COPY into an unlogged table, anti-join validation, one
+           INSERT ... SELECT merge) on an FK-checked scratch table
+- engines: resets the warehouse to --from-rowid and times a full
+           synchronization with the sequential, streaming, asyncio and
+           threaded pipeline engines (rows/sec end to end). Deletes FactSales rows above
+           --from-rowid: run it against local MySQL/PostgreSQL instances only
+- partitions: loads the same synthetic rows, spread over several months,
+           into a plain and a monthly range-partitioned scratch table and
+           times a date-bounded report on both (partition pruning)
+- report:  times the Module 02 grouping sets / rollup / cube reports as full
+           FactSales scans and from the ETL-maintained rollup tables
+- recovery: injects a failure partway through a load into a scratch table,
+           retries the whole range and reports what survived the failure
+           and what the retry cost, for a single-transaction load and for
+           batch commits with plain, ON CONFLICT DO NOTHING and DO UPDATE
+           inserts
+- commits: loads synthetic rows into a scratch table under each commit
+           policy (every N rows, M bytes, T seconds or adaptive to a target
+           latency) and reports rows/sec and p50/p99 commit latency
+"""
+
+import sys
+import os
+import csv
+import time
+import argparse
+import logging
+import json
+import psycopg2
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from postgresqlconnect import create_connection
+import automation
+from automation import (FACT_TABLE, LOAD_METHODS, ON_CONFLICT_MODES, DIMENSION_REFERENCES, load_fact_rows, load_partitioned_rows,
+                        parallel_latest_records, iter_batches, insert_single_rows, create_staging_table,
+                        validate_staged_keys, merge_staged_rows)
+from columnar_transform import ColumnarKeyResolver, records_to_columns, columns_to_csv
+from sales_rollups import ensure_sales_rollups, rebuild_sales_rollups, rollup_report
+from warehouse_summary import ensure_fact_summary, reconcile_fact_summary
+from etl_state import get_watermark, rewind_watermark
+from commit_policy import CommitPolicy
+from async_engine import synchronize_data_async
+from sales_pipeline import synchronize_data_pipelined
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+SALES_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sales.csv')
+OLTP_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'm01', 'oltpdata.csv')
+BENCH_TABLE = 'factsales_bench'
+PARTITIONED_BENCH_TABLE = 'factsales_bench_part'
+FK_BENCH_TABLE = 'factsales_bench_fk'
+STAGING_BENCH_TABLE = 'factsales_bench_staging'
+
+def load_sample_sales(path=SALES_CSV):
+    """Read sales.csv into (product_id, customer_id, quantity, price, timestamp) tuples"""
+    samples = []
+    with open(path, newline='') as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            samples.append((
+                int(row['product_id']),
+                int(row['customer_id']),
+                int(row['quantity']),
+                Decimal(row['price']),
+                datetime.strptime(row['timestamp'].strip(), '%Y-%m-%d %H:%M:%S'),
+            ))
+    return samples
+
+def load_sample_oltp(path=OLTP_CSV):
+    """Read the headerless m01 oltpdata.csv (product_id, customer_id, price, quantity, timestamp)"""
+    samples = []
+    with open(path, newline='') as f:
+        for product_id, customer_id, price, quantity, timestamp in csv.reader(f):
+            samples.append((
+                int(product_id),
+                int(customer_id),
+                int(quantity),
+                Decimal(price),
+                datetime.strptime(timestamp.strip(), '%Y-%m-%d %H:%M:%S'),
+            ))
+    return samples
+
+def synthetic_source_records(row_count, samples):
+    """Build row_count source tuples shaped like sales_data rows"""
+    return [(rowid,) + samples[rowid % len(samples)] for rowid in range(1, row_count + 1)]
+
+def synthetic_fact_rows(row_count, samples):
+    """Yield row_count fact tuples by cycling over the sample sales rows"""
+    for rowid in range(1, row_count + 1):
+        product_id, customer_id, quantity, price, timestamp = samples[rowid % len(samples)]
+        yield (rowid, product_id, customer_id, quantity, price, timestamp,
+               int(timestamp.strftime('%Y%m%d')), (product_id % 5) + 1, (customer_id % 10) + 1)
+
+def create_bench_table(cursor):
+    """Create an FK-free scratch copy of FactSales for the benchmark"""
+    cursor.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+    cursor.execute(f"CREATE TABLE {BENCH_TABLE} (LIKE {FACT_TABLE} INCLUDING DEFAULTS)")
+    cursor.execute(f"ALTER TABLE {BENCH_TABLE} ADD PRIMARY KEY (rowid)")
+
+def create_partitioned_bench_table(cursor):
+    """Create an FK-free scratch copy of FactSales range partitioned by month on timestamp"""
+    cursor.execute(f"DROP TABLE IF EXISTS {PARTITIONED_BENCH_TABLE}")
+    cursor.execute(f"CREATE TABLE {PARTITIONED_BENCH_TABLE} (LIKE {FACT_TABLE} INCLUDING DEFAULTS) "
+                   f"PARTITION BY RANGE (timestamp)")
+    cursor.execute(f"ALTER TABLE {PARTITIONED_BENCH_TABLE} ADD PRIMARY KEY (rowid, timestamp)")
+
+def create_fk_bench_table(cursor):
+    """Create a scratch copy of FactSales with the same primary and foreign keys"""
+    cursor.execute(f"DROP TABLE IF EXISTS {FK_BENCH_TABLE}")
+    cursor.execute(f"CREATE TABLE {FK_BENCH_TABLE} (LIKE {FACT_TABLE} INCLUDING DEFAULTS)")
+    cursor.execute(f"ALTER TABLE {FK_BENCH_TABLE} ADD PRIMARY KEY (rowid)")
+    for column, dimension, key in DIMENSION_REFERENCES:
+        cursor.execute(f"ALTER TABLE {FK_BENCH_TABLE} ADD FOREIGN KEY ({column}) REFERENCES {dimension}({key}) "
+                       f"DEFERRABLE INITIALLY IMMEDIATE")
+
+def spread_fact_rows(row_count, samples, months):
+    """synthetic_fact_rows with timestamps spread evenly over about `months` months in rowid order"""
+    days = months * 30
+    for row in synthetic_fact_rows(row_count, samples):
+        timestamp = row[5] + timedelta(days=(row[0] - 1) * days // row_count)
+        yield row[:5] + (timestamp, int(timestamp.strftime('%Y%m%d'))) + row[7:]
+
+def benchmark_load_methods(row_count, batch_size, methods):
+    """Time each load method against the scratch table and return rows/sec"""
+    samples = load_sample_sales()
+    conn = create_connection()
+    cursor = conn.cursor()
+    results = {}
+
+    try:
+        create_bench_table(cursor)
+        conn.commit()
+
+        for method in methods:
+            cursor.execute(f"TRUNCATE {BENCH_TABLE}")
+            conn.commit()
+
+            start = time.perf_counter()
+            loaded = load_fact_rows(cursor, synthetic_fact_rows(row_count, samples),
+                                    method=method, batch_size=batch_size, table=BENCH_TABLE)
+            conn.commit()
+            elapsed = time.perf_counter() - start
+
+            results[method] = loaded / elapsed
+            logger.info(f"{method:>6}: {loaded} rows in {elapsed:.2f}s ({results[method]:,.0f} rows/sec)")
+
+        cursor.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+    return results
+
+def benchmark_bulk_load(row_count, batch_size):
+    """Time the per-row FK-checked inserts and the staged bulk merge, and return rows/sec"""
+    samples = load_sample_sales()
+    conn = create_connection()
+    cursor = conn.cursor()
+    results = {}
+
+    try:
+        # Resolve real dimension keys up front so both paths load identical rows
+        source = synthetic_source_records(row_count, samples)
+        rows = [automation.fact_row(record) for batch in iter_batches(source, batch_size)
+                for record in automation.lookup_dimension_keys(cursor, batch)]
+        create_fk_bench_table(cursor)
+        conn.commit()
+
+        start = time.perf_counter()
+        insert_single_rows(cursor, rows, table=FK_BENCH_TABLE)
+        conn.commit()
+        elapsed = time.perf_counter() - start
+        results['row'] = row_count / elapsed
+        logger.info(f"  row: {row_count} rows in {elapsed:.2f}s ({results['row']:,.0f} rows/sec)")
+
+        cursor.execute(f"TRUNCATE {FK_BENCH_TABLE}")
+        conn.commit()
+
+        start = time.perf_counter()
+        create_staging_table(cursor, FK_BENCH_TABLE, STAGING_BENCH_TABLE)
+        load_fact_rows(cursor, rows, batch_size=batch_size, table=STAGING_BENCH_TABLE)
+        validate_staged_keys(cursor, STAGING_BENCH_TABLE)
+        inserted = merge_staged_rows(cursor, FK_BENCH_TABLE, STAGING_BENCH_TABLE)
+        conn.commit()
+        elapsed = time.perf_counter() - start
+        results['bulk'] = inserted / elapsed
+        logger.info(f" bulk: {inserted} rows in {elapsed:.2f}s ({results['bulk']:,.0f} rows/sec, "
+                    f"{results['bulk'] / results['row']:.1f}x the per-row loop)")
+
+        cursor.execute(f"DROP TABLE IF EXISTS {FK_BENCH_TABLE}")
+        cursor.execute(f"DROP TABLE IF EXISTS {STAGING_BENCH_TABLE}")
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+    return results
+
+# Load modes compared by the recovery benchmark: one transaction for the
+# whole load, or a commit per batch with plain or idempotent inserts
+RECOVERY_MODES = ('single', 'error') + ON_CONFLICT_MODES
+
+class InjectedFault(Exception):
+    """Simulated crash raised by the recovery benchmark partway through a load"""
+
+def load_with_fault(conn, cursor, rows, batch_size, mode, method, fail_after=None):
+    """Load rows into the scratch table the way mode does, failing before batch fail_after commits"""
+    on_conflict = mode if mode in ON_CONFLICT_MODES else None
+    for number, batch in enumerate(iter_batches(rows, batch_size)):
+        load_fact_rows(cursor, batch, method=method, batch_size=batch_size, table=BENCH_TABLE,
+                       on_conflict=on_conflict)
+        if number == fail_after:
+            raise InjectedFault(f"injected failure in batch {number}")
+        if mode != 'single':
+            conn.commit()
+    conn.commit()
+
+def count_bench_rows(cursor):
+    cursor.execute(f"SELECT COUNT(*) FROM {BENCH_TABLE}")
+    return cursor.fetchone()[0]
+
+def benchmark_recovery(row_count, batch_size, fail_at, method, modes):
+    """Fail each load mode after fail_at of its batches, retry the whole range and report the cost"""
+    samples = load_sample_sales()
+    rows = list(synthetic_fact_rows(row_count, samples))
+    batches = -(-row_count // batch_size)
+    fail_after = min(int(batches * fail_at), batches - 1)
+    conn = create_connection()
+    cursor = conn.cursor()
+    results = {}
+
+    try:
+        create_bench_table(cursor)
+        conn.commit()
+
+        for mode in modes:
+            cursor.execute(f"TRUNCATE {BENCH_TABLE}")
+            conn.commit()
+
+            start = time.perf_counter()
+            try:
+                load_with_fault(conn, cursor, rows, batch_size, mode, method, fail_after)
+            except InjectedFault:
+                conn.rollback()
+            failed_seconds = time.perf_counter() - start
+            survived = count_bench_rows(cursor)
+
+            # The retry replays the full range, as a rerun from a stale checkpoint would
+            start = time.perf_counter()
+            try:
+                load_with_fault(conn, cursor, rows, batch_size, mode, method)
+                error = None
+            except psycopg2.IntegrityError as e:
+                conn.rollback()
+                error = str(e).splitlines()[0]
+            retry_seconds = time.perf_counter() - start
+            final = count_bench_rows(cursor)
+
+            results[mode] = {
+                'survived_rows': survived,
+                'failed_seconds': round(failed_seconds, 3),
+                'retry_seconds': round(retry_seconds, 3),
+                'final_rows': final,
+                'complete': final == row_count,
+                'error': error,
+            }
+            outcome = (f"retry failed: {error}" if error else
+                       f"retry took {retry_seconds:.2f}s, {final}/{row_count} rows loaded")
+            logger.info(f"{mode:>7}: {survived} of {row_count} rows survived the failure "
+                        f"after {failed_seconds:.2f}s; {outcome}")
+
+        cursor.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+    return results
+
+# Commit policies compared by the commits benchmark
+DEFAULT_COMMIT_POLICIES = ('rows:1000', 'rows:10000', 'rows:100000', 'bytes:4000000', 'seconds:1',
+                           'adaptive:0.25')
+
+def benchmark_commit_policies(row_count, specs, method):
+    """Load row_count rows into the scratch table under each commit policy and return their summaries"""
+    samples = load_sample_sales()
+    rows = list(synthetic_fact_rows(row_count, samples))
+    conn = create_connection()
+    cursor = conn.cursor()
+    results = {}
+
+    try:
+        create_bench_table(cursor)
+        conn.commit()
+
+        for spec in specs:
+            cursor.execute(f"TRUNCATE {BENCH_TABLE}")
+            conn.commit()
+
+            policy = CommitPolicy.from_spec(spec)
+            start = time.perf_counter()
+            for batch in policy.batches(rows):
+                batch_start = time.perf_counter()
+                load_fact_rows(cursor, batch, method=method, batch_size=len(batch), table=BENCH_TABLE)
+                conn.commit()
+                policy.record(len(batch), time.perf_counter() - batch_start)
+            results[spec] = policy.log_summary(time.perf_counter() - start)
+
+        cursor.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+    return results
+
+# End-to-end synchronization engines compared by the engines benchmark
+SYNC_ENGINES = ('sequential', 'streaming', 'async', 'threaded')
+
+def reset_warehouse(last_rowid):
+    """Remove FactSales rows above last_rowid and rewind the checkpoint and summaries to match"""
+    conn = create_connection()
+    cursor = conn.cursor()
+    try:
+        get_watermark(cursor)
+        cursor.execute(f"DELETE FROM {FACT_TABLE} WHERE rowid > %s", (last_rowid,))
+        rewind_watermark(cursor, last_rowid)
+        ensure_fact_summary(cursor)
+        reconcile_fact_summary(cursor)
+        rebuild_sales_rollups(cursor)
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+def count_fact_rows_above(last_rowid):
+    conn = create_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"SELECT COUNT(*) FROM {FACT_TABLE} WHERE rowid > %s", (last_rowid,))
+        return cursor.fetchone()[0]
+    finally:
+        cursor.close()
+        conn.close()
+
+def run_sync_engine(engine, chunk_size, queue_size, columnar):
+    if engine == 'sequential':
+        automation.synchronize_data(columnar=columnar)
+    elif engine == 'streaming':
+        automation.synchronize_data(streaming=True, chunk_size=chunk_size, columnar=columnar)
+    elif engine == 'async':
+        synchronize_data_async(chunk_size=chunk_size, queue_size=queue_size, columnar=columnar)
+    elif engine == 'threaded':
+        synchronize_data_pipelined(queue_size=queue_size, range_size=chunk_size, columnar=columnar)
+    else:
+        raise ValueError(f"Unknown engine {engine!r}; expected one of {SYNC_ENGINES}")
+
+def benchmark_engines(engines, from_rowid, chunk_size, queue_size, columnar):
+    """Time a full synchronization of the source rows above from_rowid with each engine"""
+    results = {}
+
+    for engine in engines:
+        reset_warehouse(from_rowid)
+        start = time.perf_counter()
+        run_sync_engine(engine, chunk_size, queue_size, columnar)
+        elapsed = time.perf_counter() - start
+        loaded = count_fact_rows_above(from_rowid)
+
+        results[engine] = loaded / elapsed if elapsed else 0.0
+        logger.info(f"{engine:>10}: {loaded} rows in {elapsed:.2f}s ({results[engine]:,.0f} rows/sec)")
+
+    return results
+
+def benchmark_parallel_extract(worker_counts, range_size, last_rowid=0):
+    """Time parallel keyset extraction of the source delta for each worker count"""
+    results = {}
+
+    for workers in worker_counts:
+        start = time.perf_counter()
+        extracted = sum(len(chunk) for chunk in parallel_latest_records(last_rowid, workers, range_size))
+        elapsed = time.perf_counter() - start
+
+        results[workers] = extracted / elapsed if elapsed else 0.0
+        logger.info(f"{workers:>3} workers: {extracted} rows in {elapsed:.2f}s ({results[workers]:,.0f} rows/sec)")
+
+    return results
+
+def benchmark_transform(row_count, batch_size, samples_by_name):
+    """Time the dict-based and columnar transforms (including CSV serialization)"""
+    automation.dimension_cache.load_from_csv()
+    results = {}
+
+    for name, samples in samples_by_name.items():
+        records = synthetic_source_records(row_count, samples)
+        batches = [records[i:i + batch_size] for i in range(0, row_count, batch_size)]
+
+        start = time.perf_counter()
+        for batch in batches:
+            processed = automation.lookup_dimension_keys(None, batch)
+            automation.rows_to_csv(automation.fact_row(record) for record in processed)
+        dict_elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        resolver = ColumnarKeyResolver(automation.dimension_cache)
+        for batch in batches:
+            columns = resolver.resolve(records_to_columns(batch))
+            columns_to_csv(columns, automation.FACT_COLUMNS)
+        columnar_elapsed = time.perf_counter() - start
+
+        results[name] = (row_count / dict_elapsed, row_count / columnar_elapsed)
+        logger.info(f"{name}: dict {results[name][0]:,.0f} rows/sec, columnar {results[name][1]:,.0f} rows/sec "
+                    f"({dict_elapsed / columnar_elapsed:.1f}x)")
+
+    return results
+
+# Date-bounded report used by the partition pruning benchmark
+DATE_RANGE_REPORT_SQL = """
+    SELECT category_key, country_key, COUNT(*), SUM(price * quantity)
+    FROM {table}
+    WHERE timestamp >= %s AND timestamp < %s
+    GROUP BY category_key, country_key
+"""
+
+def scanned_relations(cursor, sql, params):
+    """Number of tables or partitions the planner scans for a query"""
+    cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+    plan = cursor.fetchone()[0]
+    return (json.dumps(plan) if not isinstance(plan, str) else plan).count('"Relation Name"')
+
+def benchmark_partitions(row_count, batch_size, months, range_days, repeats):
+    """Compare loading and a date-bounded report on a plain and a partitioned scratch table"""
+    samples = load_sample_sales()
+    conn = create_connection()
+    cursor = conn.cursor()
+    results = {}
+
+    try:
+        create_bench_table(cursor)
+        create_partitioned_bench_table(cursor)
+        conn.commit()
+
+        start = time.perf_counter()
+        load_fact_rows(cursor, spread_fact_rows(row_count, samples, months), batch_size=batch_size, table=BENCH_TABLE)
+        conn.commit()
+        plain_load = time.perf_counter() - start
+
+        start = time.perf_counter()
+        known_months = set()
+        for batch in iter_batches(spread_fact_rows(row_count, samples, months), batch_size):
+            load_partitioned_rows(cursor, batch, known_months, batch_size=batch_size, table=PARTITIONED_BENCH_TABLE)
+        conn.commit()
+        partitioned_load = time.perf_counter() - start
+        logger.info(f"Load: plain {row_count / plain_load:,.0f} rows/sec, partitioned "
+                    f"{row_count / partitioned_load:,.0f} rows/sec into {len(known_months)} partitions")
+
+        cursor.execute(f"ANALYZE {BENCH_TABLE}")
+        cursor.execute(f"ANALYZE {PARTITIONED_BENCH_TABLE}")
+        conn.commit()
+
+        # Report on a window in the middle of the loaded range
+        cursor.execute(f"SELECT MIN(timestamp), MAX(timestamp) FROM {BENCH_TABLE}")
+        first, last = cursor.fetchone()
+        range_start = first + (last - first) / 2
+        params = (range_start, range_start + timedelta(days=range_days))
+
+        for table in (BENCH_TABLE, PARTITIONED_BENCH_TABLE):
+            sql = DATE_RANGE_REPORT_SQL.format(table=table)
+            times = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                cursor.execute(sql, params)
+                cursor.fetchall()
+                times.append(time.perf_counter() - start)
+            results[table] = min(times)
+            logger.info(f"{table}: {range_days}-day report in {min(times) * 1000:.1f} ms, "
+                        f"{scanned_relations(cursor, sql, params)} relations scanned")
+        logger.info(f"Partition pruning: {results[BENCH_TABLE] / results[PARTITIONED_BENCH_TABLE]:.1f}x faster")
+
+        cursor.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+        cursor.execute(f"DROP TABLE IF EXISTS {PARTITIONED_BENCH_TABLE}")
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+    return results
+
+# Module 02 reporting lab queries: (columns, grouping, measure)
+LAB_REPORTS = (
+    (('country', 'category'), 'grouping sets', 'total_sales'),
+    (('year', 'country'), 'rollup', 'total_sales'),
+    (('year', 'country'), 'cube', 'average_sales'),
+)
+
+FACT_REPORT_COLUMNS = {
+    'year': "EXTRACT(YEAR FROM f.timestamp)::integer",
+    'country': "COALESCE(cty.country, 'Unknown')",
+    'category': "COALESCE(cat.category, 'Unknown')",
+}
+
+FACT_REPORT_MEASURES = {
+    'total_sales': "SUM(f.price * f.quantity)",
+    'average_sales': "ROUND(AVG(f.price * f.quantity), 2)",
+}
+
+def fact_report_sql(columns, grouping, measure):
+    """The same report as rollup_report, computed by scanning FactSales"""
+    expressions = ', '.join(FACT_REPORT_COLUMNS[column] for column in columns)
+    group_by = f"GROUPING SETS ({expressions})" if grouping == 'grouping sets' else f"{grouping.upper()} ({expressions})"
+    return (f"SELECT {expressions}, {FACT_REPORT_MEASURES[measure]} FROM {FACT_TABLE} f "
+            f"LEFT JOIN DimCategory cat ON cat.categoryid = f.category_key "
+            f"LEFT JOIN DimCountry cty ON cty.countryid = f.country_key "
+            f"GROUP BY {group_by}")
+
+def benchmark_reports(repeats):
+    """Time each lab report as a FactSales scan and from the rollup tables (best of repeats)"""
+    conn = create_connection()
+    cursor = conn.cursor()
+    results = {}
+
+    try:
+        ensure_sales_rollups(cursor)
+        conn.commit()
+        cursor.execute(f"SELECT COUNT(*) FROM {FACT_TABLE}")
+        fact_rows = cursor.fetchone()[0]
+
+        for columns, grouping, measure in LAB_REPORTS:
+            scan_times, rollup_times = [], []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                cursor.execute(fact_report_sql(columns, grouping, measure))
+                cursor.fetchall()
+                scan_times.append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                rollup_report(cursor, columns, grouping, (measure,))
+                rollup_times.append(time.perf_counter() - start)
+
+            name = f"{grouping}({', '.join(columns)}) {measure}"
+            results[name] = (min(scan_times), min(rollup_times))
+            logger.info(f"{name}: FactSales scan {min(scan_times) * 1000:.1f} ms, rollup tables "
+                        f"{min(rollup_times) * 1000:.1f} ms ({fact_rows} fact rows)")
+        conn.rollback()
+    finally:
+        cursor.close()
+        conn.close()
+
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark sales synchronization paths')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    load_parser = subparsers.add_parser('load', help='compare FactSales load methods')
+    load_parser.add_argument('--rows', type=int, default=100000, help='number of synthetic rows to load')
+    load_parser.add_argument('--batch-size', type=int, default=5000, help='rows per COPY/INSERT batch')
+    load_parser.add_argument('--methods', nargs='+', default=list(LOAD_METHODS), choices=LOAD_METHODS)
+
+    extract_parser = subparsers.add_parser('extract', help='scale parallel range extraction')
+    extract_parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    extract_parser.add_argument('--range-size', type=int, default=50000, help='rowids per keyset range')
+    extract_parser.add_argument('--last-rowid', type=int, default=0, help='extract rowids above this value')
+
+    transform_parser = subparsers.add_parser('transform', help='compare dict and columnar transforms')
+    transform_parser.add_argument('--rows', type=int, default=2000000, help='number of synthetic rows to transform')
+    transform_parser.add_argument('--batch-size', type=int, default=5000, help='rows per transform batch')
+
+    engines_parser = subparsers.add_parser('engines', help='compare end-to-end synchronization engines')
+    engines_parser.add_argument('--engines', nargs='+', default=list(SYNC_ENGINES), choices=SYNC_ENGINES)
+    engines_parser.add_argument('--from-rowid', type=int, default=0, help='reset the warehouse to this rowid before each run')
+    engines_parser.add_argument('--chunk-size', type=int, default=10000, help='source rows per batch')
+    engines_parser.add_argument('--queue-size', type=int, default=2, help='batches buffered between stages')
+    engines_parser.add_argument('--columnar', action='store_true', help='use the NumPy columnar transform')
+
+    bulk_parser = subparsers.add_parser('bulk', help='compare per-row FK-checked inserts with the staged bulk mode')
+    bulk_parser.add_argument('--rows', type=int, default=100000, help='number of synthetic rows to load')
+    bulk_parser.add_argument('--batch-size', type=int, default=5000, help='rows per staging COPY batch')
+
+    partitions_parser = subparsers.add_parser('partitions', help='compare plain and partitioned FactSales reports')
+    partitions_parser.add_argument('--rows', type=int, default=1000000, help='number of synthetic rows to load')
+    partitions_parser.add_argument('--batch-size', type=int, default=5000, help='rows per COPY batch')
+    partitions_parser.add_argument('--months', type=int, default=24, help='months the synthetic sales span')
+    partitions_parser.add_argument('--range-days', type=int, default=7, help='days covered by the report')
+    partitions_parser.add_argument('--repeats', type=int, default=5, help='runs per query (best time is reported)')
+
+    report_parser = subparsers.add_parser('report', help='compare lab reports on FactSales and the rollup tables')
+    report_parser.add_argument('--repeats', type=int, default=5, help='runs per query (best time is reported)')
+
+    recovery_parser = subparsers.add_parser('recovery', help='inject a failure mid-load and time the retry')
+    recovery_parser.add_argument('--rows', type=int, default=100000, help='number of synthetic rows to load')
+    recovery_parser.add_argument('--batch-size', type=int, default=5000, help='rows per committed batch')
+    recovery_parser.add_argument('--fail-at', type=float, default=0.5, help='fraction of batches loaded before the failure')
+    recovery_parser.add_argument('--method', default='copy', choices=LOAD_METHODS)
+    recovery_parser.add_argument('--modes', nargs='+', default=list(RECOVERY_MODES), choices=RECOVERY_MODES)
+
+    commits_parser = subparsers.add_parser('commits', help='compare commit policies by rows/sec and p99 commit latency')
+    commits_parser.add_argument('--rows', type=int, default=1000000, help='number of synthetic rows to load')
+    commits_parser.add_argument('--policies', nargs='+', default=list(DEFAULT_COMMIT_POLICIES),
+                                help='rows:N, bytes:M, seconds:T or adaptive:<target seconds>')
+    commits_parser.add_argument('--method', default='copy', choices=LOAD_METHODS)
+
+    args = parser.parse_args()
+
+    if args.command == 'load':
+        results = benchmark_load_methods(args.rows, args.batch_size, args.methods)
+        if 'row' in results:
+            for method, rate in results.items():
+                logger.info(f"{method:>6}: {rate / results['row']:.1f}x the per-row loop")
+    elif args.command == 'engines':
+        results = benchmark_engines(args.engines, args.from_rowid, args.chunk_size, args.queue_size, args.columnar)
+        baseline = results[args.engines[0]] or 1.0
+        for engine, rate in results.items():
+            logger.info(f"{engine:>10}: {rate / baseline:.2f}x {args.engines[0]}")
+    elif args.command == 'bulk':
+        benchmark_bulk_load(args.rows, args.batch_size)
+    elif args.command == 'partitions':
+        benchmark_partitions(args.rows, args.batch_size, args.months, args.range_days, args.repeats)
+    elif args.command == 'report':
+        benchmark_reports(args.repeats)
+    elif args.command == 'commits':
+        benchmark_commit_policies(args.rows, args.policies, args.method)
+    elif args.command == 'recovery':
+        benchmark_recovery(args.rows, args.batch_size, args.fail_at, args.method, args.modes)
+    elif args.command == 'transform':
+        benchmark_transform(args.rows, args.batch_size,
+                            {'sales.csv': load_sample_sales(), 'oltpdata.csv': load_sample_oltp()})
+    else:
+        results = benchmark_parallel_extract(args.workers, args.range_size, args.last_rowid)
+        baseline = results[args.workers[0]] or 1.0
+        for workers, rate in results.items():
+            logger.info(f"{workers:>3} workers: {rate / baseline:.2f}x the {args.workers[0]}-worker rate")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""
+Benchmark script for the Module 03 web log processing stages
+Generates a synthetic access log in the format of accesslog.txt and reports
+lines/sec, MB/sec and peak traced memory for each implementation
+- extract:  original readlines() implementation vs the streaming generator
+- parallel: extract and transform scaling from 1 to N worker processes on
+            accesslog.txt replicated --replicate times
+- fused:    staged extract/transform/load through intermediate files vs the
+            single-pass fused pipeline, with bytes read and written
+- timestamps: strptime/strftime vs the fixed-offset CLF parser, with and
+            without the LRU memo
+- scan:     line-by-line str extraction vs the memory-mapped bytes scanner,
+            for extract and fused processing
+- compression: extract from plain, .gz, .bz2, .xz and .zst input, and
+            parallel decompression of a multi-member .gz, with the estimated
+            run time at several disk read bandwidths (--disk-mbps)
+- columnar: date-range query over weblog_processed.txt (CSV) vs the
+            date-partitioned Parquet and Arrow IPC datasets
+- incremental: full re-extract vs checkpointed incremental extract as the
+            log grows by --appends daily appends of --size-mb each
+"""
+
+import sys
+import os
+import re
+import time
+import random
+import shutil
+import argparse
+import logging
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from compression import open_log, write_gzip_members, zstandard
+from weblog_columnar import write_web_log_dataset, read_web_log_range
+from weblog import (extract_web_log, transform_web_log, load_web_log, process_web_log_fused,
+                    extract_web_log_incremental, format_timestamp, TIMESTAMP_PATTERN)
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+SAMPLE_LOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'accesslog.txt')
+
+def generate_log(path, size_mb, sample_log=SAMPLE_LOG, seed=42):
+    """Write a synthetic access log of roughly size_mb megabytes
+
+    Request lines are taken from the sample log; IP addresses are drawn from
+    a pool and timestamps advance about one second every few lines, so runs
+    of identical timestamps look like a real busy server.
+    """
+    rng = random.Random(seed)
+    with open(sample_log) as f:
+        requests = [line.split(' ', 3)[3] if line.count(' ') >= 3 else line for line in f]
+        requests = [TIMESTAMP_PATTERN.sub('', request, count=1).lstrip() for request in requests]
+    ips = [f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+           for _ in range(5000)]
+
+    target = size_mb * 1024 * 1024
+    written = 0
+    lines = 0
+    moment = datetime(2015, 5, 17, 10, 5, 0)
+    with open(path, 'w') as f:
+        while written < target:
+            batch = []
+            for _ in range(10000):
+                if rng.random() < 0.25:
+                    moment += timedelta(seconds=1)
+                stamp = moment.strftime('%d/%b/%Y:%H:%M:%S +0000')
+                batch.append(f"{rng.choice(ips)} - - [{stamp}] {rng.choice(requests)}")
+            chunk = ''.join(batch)
+            f.write(chunk)
+            written += len(chunk)
+            lines += len(batch)
+    logger.info(f"Generated {lines} lines ({written / 1024 / 1024:.0f} MB) in {path}")
+    return lines
+
+def replicate_log(path, factor, sample_log=SAMPLE_LOG):
+    """Write sample_log concatenated `factor` times to path"""
+    with open(sample_log, 'rb') as f:
+        data = f.read()
+    if not data.endswith(b'\n'):
+        data += b'\n'
+    with open(path, 'wb') as f:
+        for _ in range(factor):
+            f.write(data)
+    logger.info(f"Replicated {sample_log} {factor}x ({len(data) * factor / 1024 / 1024:.0f} MB) in {path}")
+
+def legacy_extract(input_file, output_file):
+    """The original extract_web_log_data body: readlines() into a list"""
+    with open(input_file, 'r') as f:
+        lines = f.readlines()
+    extracted_data = []
+    for line in lines:
+        ip_match = re.match(r'^(\d+\.\d+\.\d+\.\d+)', line.strip())
+        timestamp_match = re.search(r'\[([^\]]+)\]', line)
+        if ip_match and timestamp_match:
+            extracted_data.append(f"{ip_match.group(1)},{timestamp_match.group(1)}")
+    with open(output_file, 'w') as f:
+        for data in extracted_data:
+            f.write(data + '\n')
+    return len(extracted_data)
+
+def measure(name, func, input_file, *args, trace_memory=True):
+    """Run func(input_file, *args) and log throughput and peak memory"""
+    size_mb = os.path.getsize(input_file) / 1024 / 1024
+
+    start = time.perf_counter()
+    lines = func(input_file, *args)
+    elapsed = time.perf_counter() - start
+
+    peak_mb = None
+    if trace_memory:
+        # Separate pass: tracemalloc slows execution down considerably
+        tracemalloc.start()
+        func(input_file, *args)
+        peak_mb = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+        tracemalloc.stop()
+
+    memory = f", peak {peak_mb:.1f} MB" if peak_mb is not None else ""
+    logger.info(f"{name:>12}: {lines / elapsed:,.0f} lines/sec, {size_mb / elapsed:.1f} MB/sec{memory}")
+    return lines / elapsed, size_mb / elapsed, peak_mb
+
+def benchmark_extract(input_file, workdir, trace_memory):
+    output_file = os.path.join(workdir, 'extracted_data.txt')
+    measure('readlines', legacy_extract, input_file, output_file, trace_memory=trace_memory)
+    measure('streaming', extract_web_log, input_file, output_file, trace_memory=trace_memory)
+
+def benchmark_parallel(input_file, workdir, worker_counts):
+    extracted_file = os.path.join(workdir, 'extracted_data.txt')
+    transformed_file = os.path.join(workdir, 'transformed_data.txt')
+    baseline = {}
+    for workers in worker_counts:
+        for stage, func, stage_input, stage_output in (
+                ('extract', extract_web_log, input_file, extracted_file),
+                ('transform', transform_web_log, extracted_file, transformed_file)):
+            rate, _, _ = measure(f"{stage} x{workers}", func, stage_input, stage_output, workers,
+                                 trace_memory=False)
+            baseline.setdefault(stage, rate)
+            logger.info(f"{'':>12}  {rate / baseline[stage]:.2f}x the {worker_counts[0]}-worker rate")
+
+def benchmark_fused(input_file, workdir):
+    extracted_file = os.path.join(workdir, 'extracted_data.txt')
+    transformed_file = os.path.join(workdir, 'transformed_data.txt')
+    processed_file = os.path.join(workdir, 'weblog_processed.txt')
+    input_mb = os.path.getsize(input_file) / 1024 / 1024
+
+    start = time.perf_counter()
+    extract_web_log(input_file, extracted_file)
+    transform_web_log(extracted_file, transformed_file)
+    load_web_log(transformed_file, processed_file)
+    staged_elapsed = time.perf_counter() - start
+    extracted_mb = os.path.getsize(extracted_file) / 1024 / 1024
+    transformed_mb = os.path.getsize(transformed_file) / 1024 / 1024
+    processed_mb = os.path.getsize(processed_file) / 1024 / 1024
+    staged_read = input_mb + extracted_mb + transformed_mb
+    staged_written = extracted_mb + transformed_mb + processed_mb
+    with open(processed_file, 'rb') as f:
+        staged_output = f.read()
+
+    start = time.perf_counter()
+    process_web_log_fused(input_file, processed_file)
+    fused_elapsed = time.perf_counter() - start
+    with open(processed_file, 'rb') as f:
+        identical = f.read() == staged_output
+
+    logger.info(f"staged: {staged_elapsed:.2f}s, read {staged_read:.0f} MB, wrote {staged_written:.0f} MB")
+    logger.info(f" fused: {fused_elapsed:.2f}s, read {input_mb:.0f} MB, wrote {processed_mb:.0f} MB")
+    logger.info(f"saved {staged_read - input_mb:.0f} MB of reads and {staged_written - processed_mb:.0f} MB of writes, "
+                f"{staged_elapsed / fused_elapsed:.2f}x faster, identical output: {identical}")
+
+def legacy_format_timestamp(timestamp):
+    """The original transform_web_log_data conversion"""
+    try:
+        return datetime.strptime(timestamp.split(' ')[0], '%d/%b/%Y:%H:%M:%S').strftime('%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        return None
+
+def benchmark_timestamps(input_file):
+    with open(input_file) as f:
+        timestamps = [match.group(1) for match in map(TIMESTAMP_PATTERN.search, f) if match]
+
+    uncached = format_timestamp.__wrapped__
+    results = {}
+    for name, func in (('strptime', legacy_format_timestamp),
+                       ('clf parser', uncached),
+                       ('clf + lru', format_timestamp)):
+        format_timestamp.cache_clear()
+        start = time.perf_counter()
+        for timestamp in timestamps:
+            func(timestamp)
+        elapsed = time.perf_counter() - start
+        results[name] = len(timestamps) / elapsed
+        logger.info(f"{name:>12}: {results[name]:,.0f} timestamps/sec "
+                    f"({results[name] / results['strptime']:.1f}x strptime)")
+
+    info = format_timestamp.cache_info()
+    logger.info(f"LRU memo: {info.hits} hits, {info.misses} misses, {info.currsize} entries")
+    return results
+
+def benchmark_scan(input_file, workdir, trace_memory):
+    for name, func, output_file in (('extract', extract_web_log, 'extracted_data.txt'),
+                                    ('fused', process_web_log_fused, 'weblog_processed.txt')):
+        output_file = os.path.join(workdir, output_file)
+        lines_rate, _, _ = measure(f"{name} str", func, input_file, output_file, trace_memory=trace_memory)
+        with open(output_file, 'rb') as f:
+            expected = f.read()
+        mmap_rate, _, _ = measure(f"{name} mmap", lambda i, o: func(i, o, mmap_scan=True), input_file,
+                                  output_file, trace_memory=trace_memory)
+        with open(output_file, 'rb') as f:
+            identical = f.read() == expected
+        logger.info(f"{'':>12}  {mmap_rate / lines_rate:.2f}x the str path, identical output: {identical}")
+
+def benchmark_compression(input_file, workdir, worker_counts, disk_mbps):
+    """Compare decompress + extract CPU time with the time to read each file from disk
+
+    Files are read from the page cache here, so the measured time is the
+    CPU cost; a disk-bound run takes at least compressed size / bandwidth.
+    """
+    output_file = os.path.join(workdir, 'extracted_data.txt')
+    raw_mb = os.path.getsize(input_file) / 1024 / 1024
+    suffixes = ['', '.gz', '.bz2', '.xz'] + (['.zst'] if zstandard is not None else [])
+
+    results = {}
+    for suffix in suffixes:
+        compressed_file = input_file
+        if suffix:
+            compressed_file = os.path.join(workdir, 'accesslog.txt' + suffix)
+            start = time.perf_counter()
+            with open(input_file, 'rb') as source, open_log(compressed_file, 'wb') as target:
+                shutil.copyfileobj(source, target, 1024 * 1024)
+            compress_elapsed = time.perf_counter() - start
+        size_mb = os.path.getsize(compressed_file) / 1024 / 1024
+
+        start = time.perf_counter()
+        extract_web_log(compressed_file, output_file)
+        elapsed = time.perf_counter() - start
+        results[suffix or 'plain'] = (size_mb, elapsed)
+        compress = f", compress {raw_mb / compress_elapsed:.1f} MB/sec" if suffix else ""
+        logger.info(f"{suffix or 'plain':>6}: {size_mb:.1f} MB ({raw_mb / size_mb:.1f}x), "
+                    f"extract {raw_mb / elapsed:.1f} MB/sec of log{compress}")
+
+    for mbps in disk_mbps:
+        estimates = {name: max(elapsed, size_mb / mbps) for name, (size_mb, elapsed) in results.items()}
+        best = min(estimates, key=estimates.get)
+        logger.info(f"at {mbps:>5} MB/sec disk: " + ", ".join(f"{name} {seconds:.2f}s"
+                                                           for name, seconds in estimates.items())
+                    + f" -> {best}")
+
+    members_file = os.path.join(workdir, 'accesslog_members.txt.gz')
+    write_gzip_members(input_file, members_file, workers=max(worker_counts))
+    baseline = None
+    for workers in worker_counts:
+        start = time.perf_counter()
+        extract_web_log(members_file, output_file, workers)
+        elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        logger.info(f"multi-member .gz x{workers}: {raw_mb / elapsed:.1f} MB/sec of log "
+                    f"({baseline / elapsed:.2f}x)")
+
+def directory_size_mb(path):
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(path) for name in names) / 1024 / 1024
+
+def query_csv(processed_file, start, end):
+    """Date-range query the way a CSV consumer has to do it: parse every line"""
+    low, high = start.strftime('%Y-%m-%d %H:%M:%S'), end.strftime('%Y-%m-%d %H:%M:%S')
+    rows = 0
+    with open(processed_file) as f:
+        next(f)
+        for line in f:
+            timestamp = line.rstrip('\n').split(',', 1)[1]
+            if low <= timestamp < high:
+                rows += 1
+    return rows
+
+def benchmark_columnar(input_file, workdir, range_hours):
+    processed_file = os.path.join(workdir, 'weblog_processed.txt')
+    process_web_log_fused(input_file, processed_file)
+    with open(processed_file) as f:
+        next(f)
+        first = datetime.strptime(next(f).rstrip('\n').split(',', 1)[1], '%Y-%m-%d %H:%M:%S')
+    start = first.replace(minute=0, second=0) + timedelta(hours=range_hours)
+    end = start + timedelta(hours=range_hours)
+    logger.info(f"query: {start} <= timestamp < {end}")
+
+    timings = {}
+    start_time = time.perf_counter()
+    rows = query_csv(processed_file, start, end)
+    timings['csv'] = time.perf_counter() - start_time
+    logger.info(f"{'csv':>8}: {os.path.getsize(processed_file) / 1024 / 1024:.1f} MB on disk, "
+                f"{rows} rows in {timings['csv']:.3f}s")
+
+    for file_format in ('parquet', 'arrow'):
+        dataset_dir = os.path.join(workdir, f"weblog_processed_{file_format}")
+        start_time = time.perf_counter()
+        write_web_log_dataset(processed_file, dataset_dir, file_format, header=True)
+        write_elapsed = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        table = read_web_log_range(dataset_dir, start, end, file_format=file_format)
+        timings[file_format] = time.perf_counter() - start_time
+        logger.info(f"{file_format:>8}: {directory_size_mb(dataset_dir):.1f} MB on disk (written in "
+                    f"{write_elapsed:.2f}s), {table.num_rows} rows in {timings[file_format]:.3f}s "
+                    f"({timings['csv'] / timings[file_format]:.1f}x csv)")
+    return timings
+
+def benchmark_incremental(input_file, workdir, appends):
+    """Append input_file to a growing log and time a full vs incremental extract after each append"""
+    log_file = os.path.join(workdir, 'growing_accesslog.txt')
+    checkpoint_file = os.path.join(workdir, 'accesslog.checkpoint.json')
+    output_file = os.path.join(workdir, 'extracted_data.txt')
+    with open(input_file, 'rb') as f:
+        day = f.read()
+
+    for run in range(1, appends + 1):
+        with open(log_file, 'ab') as f:
+            f.write(day)
+        total_mb = os.path.getsize(log_file) / 1024 / 1024
+
+        start = time.perf_counter()
+        extract_web_log(log_file, output_file)
+        full_elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        lines = extract_web_log_incremental(log_file, output_file, checkpoint_file)
+        incremental_elapsed = time.perf_counter() - start
+
+        logger.info(f"run {run}: log {total_mb:.0f} MB, full {full_elapsed:.2f}s, "
+                    f"incremental {incremental_elapsed:.2f}s for {lines} new lines")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark web log processing stages')
+    parser.add_argument('stage', choices=['extract', 'parallel', 'fused', 'timestamps', 'scan', 'compression', 'columnar', 'incremental'])
+    parser.add_argument('--size-mb', type=int, default=200, help='size of the synthetic access log')
+    parser.add_argument('--input', help='use an existing access log instead of generating one')
+    parser.add_argument('--replicate', type=int, default=100,
+                        help='parallel: replicate accesslog.txt this many times (10-1000)')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8],
+                        help='parallel: worker counts to compare')
+    parser.add_argument('--disk-mbps', type=float, nargs='+', default=[50, 200, 1000],
+                        help='compression: disk read bandwidths for the run time estimate')
+    parser.add_argument('--range-hours', type=int, default=6,
+                        help='columnar: length of the queried time range')
+    parser.add_argument('--appends', type=int, default=5,
+                        help='incremental: number of appends to the growing log')
+    parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc peak memory pass')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        input_file = args.input
+        if not input_file:
+            input_file = os.path.join(workdir, 'accesslog.txt')
+            if args.stage == 'parallel':
+                replicate_log(input_file, args.replicate)
+            else:
+                generate_log(input_file, args.size_mb)
+
+        if args.stage == 'extract':
+            benchmark_extract(input_file, workdir, not args.no_memory)
+        elif args.stage == 'parallel':
+            benchmark_parallel(input_file, workdir, args.workers)
+        elif args.stage == 'fused':
+            benchmark_fused(input_file, workdir)
+        elif args.stage == 'scan':
+            benchmark_scan(input_file, workdir, not args.no_memory)
+        elif args.stage == 'compression':
+            benchmark_compression(input_file, workdir, args.workers, args.disk_mbps)
+        elif args.stage == 'columnar':
+            benchmark_columnar(input_file, workdir, args.range_hours)
+        elif args.stage == 'incremental':
+            benchmark_incremental(input_file, workdir, args.appends)
+        else:
+            benchmark_timestamps(input_file)
+
+if __name__ == "__main__":
+    main()
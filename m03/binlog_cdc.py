@@ -0,0 +1,283 @@
+# Change-data-capture sync mode for the Module 03 sales synchronization.
+# The rowid watermark in automation.py only sees rows appended to sales_data,
+# so updates and deletes never reach FactSales and every run has to poll.
+# Here the MySQL binlog is tailed as a replica would: row events for
+# sales.sales_data are folded per rowid into micro-batches, and each batch is
+# applied to FactSales in one PostgreSQL transaction that also subtracts and
+# re-adds the touched rows in fact_summary and the sales rollups and stores
+# the binlog position it covers (etl_state.etl_binlog_position). Batches
+# always end on a source transaction boundary, and applying a change deletes
+# and re-inserts its rowid, so replaying events after a crash is harmless.
+# The source needs binlog_format=ROW and binlog_row_image=FULL, and the MySQL
+# user needs the REPLICATION SLAVE and REPLICATION CLIENT privileges.
+# This module requires python-mysql-replication:
+# python3 -m pip install mysql-replication
+
+import argparse
+import logging
+import mysql.connector
+import time
+from datetime import datetime
+
+try:
+    from pymysqlreplication import BinLogStreamReader
+    from pymysqlreplication.event import XidEvent
+    from pymysqlreplication.row_event import WriteRowsEvent, UpdateRowsEvent, DeleteRowsEvent
+except ImportError:  # the rowid-based synchronization in automation.py still works
+    BinLogStreamReader = None
+
+from automation import (mysql_config, mysql_pool, postgres_pool, synchronize_data, transform_batch,
+                        load_fact_rows, load_partitioned_rows, FACT_TABLE, DEFAULT_LOAD_METHOD)
+from etl_state import (get_watermark, start_run, advance_watermark, get_binlog_position,
+                       save_binlog_position)
+from warehouse_summary import ensure_fact_summary, refresh_fact_summary, adjust_fact_summary
+from sales_rollups import ensure_sales_rollups, refresh_sales_rollups, adjust_sales_rollups
+from partitions import is_partitioned
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Source table tailed in the binlog
+SOURCE_SCHEMA = mysql_config['database']
+SOURCE_TABLE = 'sales_data'
+SOURCE_COLUMNS = ('rowid', 'product_id', 'customer_id', 'quantity', 'price', 'timestamp')
+
+# Replica id announced to MySQL; must differ from the server and any other replica
+CDC_SERVER_ID = 4203
+
+# A micro-batch is applied at the first transaction boundary after this many
+# row changes or this many seconds, and whenever the reader catches up
+DEFAULT_CDC_BATCH_SIZE = 5000
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+# Pause before reconnecting once the binlog has been read to the end
+DEFAULT_POLL_INTERVAL = 1.0
+
+def require_replication():
+    """Raise a helpful error when the CDC mode is used without python-mysql-replication"""
+    if BinLogStreamReader is None:
+        raise ImportError("The binlog CDC mode requires python-mysql-replication: "
+                          "python3 -m pip install mysql-replication")
+
+def replication_settings():
+    """Connection settings for the binlog reader, taken from automation.mysql_config"""
+    return {
+        'host': mysql_config['host'],
+        'port': int(mysql_config.get('port', 3306)),
+        'user': mysql_config['user'],
+        'passwd': mysql_config['password'],
+    }
+
+def get_source_binlog_position():
+    """Return the source's current (log_file, log_pos)"""
+    with mysql_pool.connection() as mysql_conn:
+        mysql_cursor = mysql_conn.cursor()
+        try:
+            mysql_cursor.execute("SHOW BINARY LOG STATUS")
+        except mysql.connector.Error:
+            # Servers before MySQL 8.2 only know the old statement
+            mysql_cursor.execute("SHOW MASTER STATUS")
+        row = mysql_cursor.fetchone()
+        mysql_cursor.close()
+    if row is None:
+        raise RuntimeError("Binary logging is disabled on the MySQL source (log_bin=OFF)")
+    return row[0], row[1]
+
+def source_record(values):
+    """Convert binlog row values into a source record tuple in SOURCE_COLUMNS order"""
+    return tuple(values[column] for column in SOURCE_COLUMNS)
+
+def fold_rows_event(pending, event):
+    """Fold one rows event into pending, mapping rowid to its latest record or None when deleted
+
+    Returns the number of row changes in the event.
+    """
+    for row in event.rows:
+        if isinstance(event, DeleteRowsEvent):
+            pending[row['values']['rowid']] = None
+        elif isinstance(event, UpdateRowsEvent):
+            before, after = row['before_values'], row['after_values']
+            if before['rowid'] != after['rowid']:
+                pending[before['rowid']] = None
+            pending[after['rowid']] = source_record(after)
+        else:
+            pending[row['values']['rowid']] = source_record(row['values'])
+    return len(event.rows)
+
+class BinlogApplier:
+    """Applies folded binlog changes to FactSales, committing each batch with its binlog position"""
+
+    def __init__(self, postgres_conn, run_id, method=DEFAULT_LOAD_METHOD):
+        self.conn = postgres_conn
+        self.cursor = postgres_conn.cursor()
+        self.method = method
+        self.applied = 0
+        self.batches = 0
+
+        get_watermark(self.cursor)
+        start_run(self.cursor, run_id)
+        ensure_fact_summary(self.cursor)
+        ensure_sales_rollups(self.cursor)
+        self.partitioned = is_partitioned(self.cursor, FACT_TABLE)
+        self.known_months = set()
+        self.conn.commit()
+
+    def apply(self, pending, position, changes):
+        """Apply the folded changes and save the binlog position they reach in one transaction"""
+        started = time.perf_counter()
+        rowids = list(pending)
+        written = 0
+        inserted = 0
+        if rowids:
+            # Take the current versions out of the summaries, then out of the table
+            adjust_fact_summary(self.cursor, rowids, -1)
+            adjust_sales_rollups(self.cursor, rowids, -1)
+            self.cursor.execute(f"DELETE FROM {FACT_TABLE} WHERE rowid = ANY(%s) RETURNING rowid", (rowids,))
+            replaced = {row[0] for row in self.cursor.fetchall()}
+            deleted = len(replaced)
+
+            records = sorted(record for record in pending.values() if record is not None)
+            if records:
+                fact_rows, batch_max_rowid, _ = transform_batch(self.cursor, records)
+                if self.partitioned:
+                    written = load_partitioned_rows(self.cursor, fact_rows, self.known_months, method=self.method)
+                else:
+                    written = load_fact_rows(self.cursor, fact_rows, method=self.method)
+                # Updated rows were already counted when they were first loaded
+                inserted = sum(1 for record in records if record[0] not in replaced)
+
+                # Rows at or below the summaries' rowid are re-added here, new
+                # rows above it by the regular refresh
+                adjust_fact_summary(self.cursor, rowids, 1)
+                adjust_sales_rollups(self.cursor, rowids, 1)
+                refresh_fact_summary(self.cursor)
+                refresh_sales_rollups(self.cursor)
+                advance_watermark(self.cursor, batch_max_rowid, inserted, time.perf_counter() - started)
+            logger.info(f"Applied {changes} binlog row changes up to {position[0]}:{position[1]}: "
+                        f"{deleted} FactSales rows replaced or deleted, {written} written ({inserted} new)")
+
+        save_binlog_position(self.cursor, *position, changes=changes)
+        self.conn.commit()
+        self.applied += changes
+        self.batches += 1 if rowids else 0
+
+    def close(self):
+        self.cursor.close()
+
+def bootstrap_cdc():
+    """Catch up with the rowid synchronization and store the binlog position it starts from
+
+    The position is read before the catch-up, so changes made while it runs
+    are replayed from the binlog afterwards; replays are idempotent.
+    Updates and deletes made before CDC was first started are not recovered.
+    """
+    position = get_source_binlog_position()
+    logger.info(f"No binlog checkpoint yet, catching up by rowid from {position[0]}:{position[1]}")
+    synchronize_data(streaming=True)
+    with postgres_pool.connection() as postgres_conn:
+        postgres_cursor = postgres_conn.cursor()
+        save_binlog_position(postgres_cursor, *position)
+        postgres_conn.commit()
+        postgres_cursor.close()
+    return position
+
+def tail_binlog(applier, position, batch_size=DEFAULT_CDC_BATCH_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL):
+    """Read the binlog from position to its current end, applying micro-batches
+
+    Returns the position everything up to has been committed. Changes of a
+    transaction are only buffered once its commit (Xid) event is read, so a
+    batch never contains part of a source transaction.
+    """
+    stream = BinLogStreamReader(
+        connection_settings=replication_settings(),
+        server_id=CDC_SERVER_ID,
+        only_events=[WriteRowsEvent, UpdateRowsEvent, DeleteRowsEvent, XidEvent],
+        only_schemas=[SOURCE_SCHEMA],
+        only_tables=[SOURCE_TABLE],
+        resume_stream=True,
+        log_file=position[0],
+        log_pos=position[1],
+        blocking=False,
+    )
+    committed = position
+    pending = {}
+    transaction = []
+    changes = 0
+    batch_started = time.perf_counter()
+    try:
+        for event in stream:
+            if not isinstance(event, XidEvent):
+                transaction.append(event)
+                continue
+
+            # Transaction boundary: its changes become part of the batch
+            for rows_event in transaction:
+                changes += fold_rows_event(pending, rows_event)
+            transaction = []
+            position = (stream.log_file, stream.log_pos)
+
+            if changes >= batch_size or time.perf_counter() - batch_started >= flush_interval:
+                applier.apply(pending, position, changes)
+                committed = position
+                pending = {}
+                changes = 0
+                batch_started = time.perf_counter()
+    finally:
+        stream.close()
+
+    # Caught up: apply what is left, or just move the checkpoint past
+    # transactions that did not touch sales_data
+    if position != committed:
+        applier.apply(pending, position, changes)
+        committed = position
+    return committed
+
+def synchronize_data_cdc(batch_size=DEFAULT_CDC_BATCH_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL,
+                         poll_interval=DEFAULT_POLL_INTERVAL, max_seconds=None, method=DEFAULT_LOAD_METHOD):
+    """Tail the MySQL binlog and apply sales_data changes to FactSales until max_seconds pass
+
+    Runs until interrupted when max_seconds is None. Returns the number of
+    row changes applied.
+    """
+    require_replication()
+    run_id = datetime.now().strftime('cdc_%Y%m%dT%H%M%S')
+    deadline = time.monotonic() + max_seconds if max_seconds is not None else None
+    applier = None
+    try:
+        logger.info("Starting binlog CDC synchronization")
+        with postgres_pool.connection() as postgres_conn:
+            postgres_cursor = postgres_conn.cursor()
+            position = get_binlog_position(postgres_cursor)
+            postgres_conn.commit()
+            postgres_cursor.close()
+        if position is None:
+            position = bootstrap_cdc()
+        logger.info(f"Tailing {SOURCE_SCHEMA}.{SOURCE_TABLE} from binlog {position[0]}:{position[1]}")
+
+        with postgres_pool.connection() as postgres_conn:
+            applier = BinlogApplier(postgres_conn, run_id, method=method)
+            while deadline is None or time.monotonic() < deadline:
+                position = tail_binlog(applier, position, batch_size, flush_interval)
+                time.sleep(poll_interval)
+            applier.close()
+
+        logger.info(f"Binlog CDC stopped at {position[0]}:{position[1]} after {applier.applied} row changes "
+                    f"in {applier.batches} batches")
+        return applier.applied
+    except KeyboardInterrupt:
+        logger.info("Binlog CDC interrupted; uncommitted changes are replayed on the next start")
+        return applier.applied if applier else 0
+    except Exception as e:
+        # The pool rolls back the uncommitted batch when the connection is returned
+        logger.error(f"Binlog CDC synchronization failed: {e}")
+        raise
+
+# Main execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply sales_data changes from the MySQL binlog to FactSales")
+    parser.add_argument('--seconds', type=float, default=None, help="stop after this many seconds")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_CDC_BATCH_SIZE)
+    parser.add_argument('--flush-interval', type=float, default=DEFAULT_FLUSH_INTERVAL)
+    args = parser.parse_args()
+    synchronize_data_cdc(args.batch_size, args.flush_interval, max_seconds=args.seconds)
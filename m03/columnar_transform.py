@@ -0,0 +1,206 @@
+# Columnar transform path for the Module 03 sales synchronization.
+# An extracted batch is converted once into NumPy column arrays, dimension
+# keys are computed with vectorized lookups against the DimensionCache, and
+# the columns are serialized straight into COPY input, so no per-row dict is
+# built between extraction and load.
+# This module requires NumPy: python3 -m pip install numpy
+
+import io
+import logging
+from datetime import date, datetime
+from operator import attrgetter, itemgetter
+
+from dimension_cache import CATEGORY_BUCKETS, COUNTRY_BUCKETS
+
+try:
+    import numpy as np
+except ImportError:  # the row-oriented path in automation.py still works
+    np = None
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Key value used for dimension keys that could not be resolved (loaded as NULL)
+MISSING_KEY = -1
+
+# Proleptic Gregorian ordinal of 1970-01-01, for epoch-second arithmetic
+EPOCH_ORDINAL = 719163
+
+def require_numpy():
+    """Raise a helpful error when the columnar path is used without NumPy"""
+    if np is None:
+        raise ImportError("The columnar transform requires NumPy: python3 -m pip install numpy")
+
+def records_to_columns(records):
+    """Convert source record tuples into a dict of NumPy column arrays
+
+    Timestamps become datetime64[s] (sub-second precision is dropped, as in
+    the MySQL source column) and a day_ordinal column is kept for date keys.
+    A NULL timestamp stays NaT (loaded as NULL, as in the row path) while its
+    date key is taken from the current date, like lookup_dimension_keys does.
+    """
+    require_numpy()
+    count = len(records)
+
+    def column(index, dtype):
+        return np.fromiter(map(itemgetter(index), records), dtype=dtype, count=count)
+
+    now = datetime.now()
+    source_timestamps = list(map(itemgetter(5), records))
+    timestamps = [timestamp or now for timestamp in source_timestamps]
+
+    def part(name):
+        return np.fromiter(map(attrgetter(name), timestamps), dtype=np.int64, count=count)
+
+    day_ordinal = np.fromiter(map(datetime.toordinal, timestamps), dtype=np.int64, count=count)
+    seconds = ((day_ordinal - EPOCH_ORDINAL) * 86400
+               + part('hour') * 3600 + part('minute') * 60 + part('second'))
+    timestamp = seconds.astype('datetime64[s]')
+    nulls = [index for index, value in enumerate(source_timestamps) if value is None]
+    if nulls:
+        timestamp[nulls] = np.datetime64('NaT')
+
+    return {
+        'rowid': column(0, np.int64),
+        'product_id': column(1, np.int64),
+        'customer_id': column(2, np.int64),
+        'quantity': column(3, np.int64),
+        'price': np.fromiter(map(float, map(itemgetter(4), records)), dtype=np.float64, count=count),
+        'timestamp': timestamp,
+        'day_ordinal': day_ordinal,
+    }
+
+class ColumnarKeyResolver:
+    """Vectorized dimension key lookups built from a DimensionCache"""
+
+    def __init__(self, dimension_cache):
+        require_numpy()
+        # Build from one snapshot so a concurrent refresh cannot mix versions
+        self.snapshot = dimension_cache.snapshot()
+        date_keys, category_ids, country_ids, self.version = self.snapshot
+        self.date_keys = date_keys
+        # Dense day-ordinal -> dateid table; DimDate covers a few thousand days
+        ordinals = [day.toordinal() for day in date_keys]
+        self.first_ordinal = min(ordinals, default=0)
+        self.date_ids = np.full(max(ordinals, default=-1) - self.first_ordinal + 1, MISSING_KEY, dtype=np.int64)
+        for ordinal, dateid in zip(ordinals, date_keys.values()):
+            self.date_ids[ordinal - self.first_ordinal] = dateid
+        self.category_ids = np.array(sorted(category_ids), dtype=np.int64)
+        self.country_ids = np.array(sorted(country_ids), dtype=np.int64)
+
+    def resolve(self, columns):
+        """Add date_key, category_key and country_key arrays to the columns"""
+        count = len(columns['rowid'])
+        positions = columns['day_ordinal'] - self.first_ordinal
+        in_range = (positions >= 0) & (positions < len(self.date_ids))
+        columns['date_key'] = np.full(count, MISSING_KEY, dtype=np.int64)
+        columns['date_key'][in_range] = self.date_ids[positions[in_range]]
+
+        # Same fixed assignment as dimension_cache.category_id / country_id
+        for key, ids in (('category_key', self.category_ids), ('country_key', self.country_ids)):
+            candidates = dimension_ids(columns, key)
+            columns[key] = np.where(np.isin(candidates, ids), candidates, MISSING_KEY)
+
+        return columns
+
+# Dimension key column -> (source column, number of dimension ids it is spread over)
+DIMENSION_SOURCES = {
+    'category_key': ('product_id', CATEGORY_BUCKETS),
+    'country_key': ('customer_id', COUNTRY_BUCKETS),
+}
+
+def dimension_ids(columns, key):
+    """DimCategory or DimCountry ids the rows are assigned to, resolved or not"""
+    source, buckets = DIMENSION_SOURCES[key]
+    return columns[source] % buckets + 1
+
+def count_missing_keys(columns):
+    """Number of rows with at least one dimension key that could not be resolved"""
+    missing = ((columns['date_key'] == MISSING_KEY) | (columns['category_key'] == MISSING_KEY)
+               | (columns['country_key'] == MISSING_KEY))
+    return int(missing.sum())
+
+def missing_keys(columns):
+    """Dates and category/country ids that could not be resolved, by dimension"""
+    ordinals = np.unique(columns['day_ordinal'][columns['date_key'] == MISSING_KEY])
+    missing = {'date': {date.fromordinal(ordinal) for ordinal in ordinals.tolist()}}
+    for dimension, key in (('category', 'category_key'), ('country', 'country_key')):
+        ids = dimension_ids(columns, key)[columns[key] == MISSING_KEY]
+        missing[dimension] = set(np.unique(ids).tolist())
+    return missing
+
+def render_values(values, render):
+    """Render an array to a list of strings, formatting each distinct value once"""
+    distinct, inverse = np.unique(values, return_inverse=True)
+    if len(distinct) * 2 > len(values):
+        return render(values)
+    return np.array(render(distinct), dtype=object)[inverse].tolist()
+
+def render_numbers(values):
+    return list(map(str, values.tolist()))
+
+def render_prices(values):
+    return list(map(str, values.round(2).tolist()))
+
+def render_timestamps(values):
+    # NaT is written as an empty field, which COPY reads as NULL
+    return ['' if text == 'NaT' else text for text in np.datetime_as_string(values, unit='s').tolist()]
+
+def render_keys(values):
+    return ['' if value == MISSING_KEY else str(value) for value in values.tolist()]
+
+def column_strings(columns, names):
+    """Render each named column as a list of COPY-ready CSV fields"""
+    rendered = []
+    for name in names:
+        if name == 'timestamp':
+            render = render_timestamps
+        elif name == 'price':
+            render = render_prices
+        elif name.endswith('_key'):
+            render = render_keys
+        else:
+            render = render_numbers
+        rendered.append(render_values(columns[name], render))
+    return rendered
+
+def columns_to_csv(columns, names):
+    """Serialize the columns into a CSV buffer in the given column order"""
+    rendered = column_strings(columns, names)
+    buffer = io.StringIO()
+    buffer.write('\n'.join(map(','.join, zip(*rendered))))
+    buffer.write('\n')
+    buffer.seek(0)
+    return buffer
+
+def copy_columns(postgres_cursor, columns, names, table):
+    """Stream a columnar batch into the table with COPY FROM STDIN"""
+    copy_sql = f"COPY {table} ({', '.join(names)}) FROM STDIN WITH (FORMAT csv)"
+    postgres_cursor.copy_expert(copy_sql, columns_to_csv(columns, names))
+
+def columns_to_rows(columns, names):
+    """Return the columns as row tuples for the INSERT-based load methods"""
+    lists = []
+    for name in names:
+        values = columns[name]
+        if name.endswith('_key'):
+            objects = values.astype(object)
+            objects[values == MISSING_KEY] = None
+            lists.append(objects.tolist())
+        else:
+            lists.append(values.tolist())
+    return list(zip(*lists))
+
+def split_columns_by_month(columns):
+    """Split a columnar batch into {(year, month): columns} by timestamp month"""
+    if np.isnat(columns['timestamp']).any():
+        raise ValueError("Rows with a NULL timestamp cannot be routed to a monthly partition")
+    months = columns['timestamp'].astype('datetime64[M]')
+    groups = {}
+    for month in np.unique(months):
+        mask = months == month
+        # datetime64[M] counts months since 1970-01
+        year, month_index = divmod(int(month.astype(np.int64)), 12)
+        groups[(1970 + year, month_index + 1)] = {name: values[mask] for name, values in columns.items()}
+    return groups
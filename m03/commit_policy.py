@@ -0,0 +1,134 @@
+# Commit policies for the Module 03 sales synchronization.
+# insert_records commits every batch together with its checkpoint; the
+# policy decides where a batch ends: after N source rows, after about M bytes
+# of row data, once T seconds have passed since the last commit, or
+# adaptively, resizing batches so each commit takes about a target latency.
+# Limits can be combined and the first one reached ends the batch. The
+# latency of every commit is recorded, so a run reports rows/sec and the
+# p99 commit latency of its setting.
+
+import logging
+import time
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Policy kinds accepted by CommitPolicy.from_spec, e.g. 'rows:5000',
+# 'bytes:4000000', 'seconds:2' or 'adaptive:0.25' (target seconds per commit)
+COMMIT_POLICY_KINDS = ('rows', 'bytes', 'seconds', 'adaptive')
+
+# Adaptive batches start at this size and stay within these bounds; one
+# commit can at most halve or double the next batch
+ADAPTIVE_START_ROWS = 5000
+ADAPTIVE_MIN_ROWS = 500
+ADAPTIVE_MAX_ROWS = 200000
+
+def record_size(record):
+    """Approximate bytes a source record adds to a load, as text"""
+    return sum(len(str(value)) for value in record) + len(record)
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers, 0.0 when empty"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+class CommitPolicy:
+    """Decides where batches end and records how long each commit took"""
+
+    def __init__(self, rows=None, max_bytes=None, seconds=None, target_latency=None,
+                 min_rows=ADAPTIVE_MIN_ROWS, max_rows=ADAPTIVE_MAX_ROWS):
+        if rows is None and max_bytes is None and seconds is None and target_latency is None:
+            raise ValueError("A commit policy needs a row, byte, time or target latency limit")
+        if target_latency is not None and rows is None:
+            rows = ADAPTIVE_START_ROWS
+        self.rows = rows
+        self.max_bytes = max_bytes
+        self.seconds = seconds
+        self.target_latency = target_latency
+        self.min_rows = min_rows
+        self.max_rows = max_rows
+        self.latencies = []
+        self.committed_rows = 0
+        self.started = None
+        self._last_commit = None
+
+    @classmethod
+    def from_spec(cls, spec):
+        """Build a policy from '<kind>:<value>', kind being one of COMMIT_POLICY_KINDS"""
+        kind, _, value = spec.partition(':')
+        if kind not in COMMIT_POLICY_KINDS or not value:
+            raise ValueError(f"Invalid commit policy '{spec}', expected <kind>:<value> with kind in "
+                             f"{COMMIT_POLICY_KINDS}")
+        if kind == 'rows':
+            return cls(rows=int(value))
+        if kind == 'bytes':
+            return cls(max_bytes=int(value))
+        if kind == 'seconds':
+            return cls(seconds=float(value))
+        return cls(target_latency=float(value))
+
+    def describe(self):
+        if self.target_latency is not None:
+            return f"adaptive {self.target_latency}s"
+        limits = [f"{self.rows} rows" if self.rows else None,
+                  f"{self.max_bytes} bytes" if self.max_bytes else None,
+                  f"{self.seconds}s" if self.seconds is not None else None]
+        return ' / '.join(limit for limit in limits if limit)
+
+    def batches(self, records):
+        """Yield lists of records from any iterable, ending each where the policy commits
+
+        The caller is expected to load and commit each batch, then call
+        record(), before asking for the next one.
+        """
+        self.started = self._last_commit = time.perf_counter()
+        batch = []
+        limit = self.rows
+        for record in records:
+            if not batch and self.max_bytes is not None:
+                # Sales rows are close to fixed width, so the byte limit is
+                # turned into a row limit from each batch's first record
+                byte_rows = max(1, self.max_bytes // record_size(record))
+                limit = min(self.rows, byte_rows) if self.rows is not None else byte_rows
+            batch.append(record)
+            if ((limit is not None and len(batch) >= limit)
+                    or (self.seconds is not None and time.perf_counter() - self._last_commit >= self.seconds)):
+                yield batch
+                batch = []
+                limit = self.rows
+        if batch:
+            yield batch
+
+    def record(self, rows, seconds):
+        """Record a committed batch of rows that took seconds; adaptive policies resize the next batch"""
+        self.latencies.append(seconds)
+        self.committed_rows += rows
+        self._last_commit = time.perf_counter()
+        if self.target_latency is not None and rows:
+            factor = min(2.0, max(0.5, self.target_latency / seconds)) if seconds > 0 else 2.0
+            self.rows = int(min(self.max_rows, max(self.min_rows, rows * factor)))
+
+    def summary(self, elapsed=None):
+        """Commit count, rows/sec and commit latency percentiles as a dict"""
+        if elapsed is None:
+            elapsed = time.perf_counter() - self.started if self.started is not None else 0.0
+        return {
+            'policy': self.describe(),
+            'commits': len(self.latencies),
+            'rows': self.committed_rows,
+            'rows_per_second': round(self.committed_rows / elapsed, 1) if elapsed else 0.0,
+            'p50_commit_seconds': round(percentile(self.latencies, 50), 4),
+            'p99_commit_seconds': round(percentile(self.latencies, 99), 4),
+            'max_commit_seconds': round(max(self.latencies, default=0.0), 4),
+        }
+
+    def log_summary(self, elapsed=None):
+        summary = self.summary(elapsed)
+        logger.info(f"Commit policy {summary['policy']}: {summary['rows']} rows in {summary['commits']} commits, "
+                    f"{summary['rows_per_second']:,.0f} rows/sec, commit latency p50 "
+                    f"{summary['p50_commit_seconds']:.3f}s p99 {summary['p99_commit_seconds']:.3f}s")
+        return summary
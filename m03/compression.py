@@ -0,0 +1,196 @@
+# Compressed file support for the Module 03 web log pipeline.
+# Files are opened by suffix (.gz, .bz2, .xz, .zst) so every stage can stream
+# compressed input and output directly instead of decompressing to disk.
+# Multi-member gzip files (concatenated .gz files, pigz --independent,
+# bgzip, or write_gzip_members below) can be split on member boundaries and
+# decompressed by several processes at once.
+# .zst support requires zstandard: python3 -m pip install zstandard
+
+import io
+import os
+import bz2
+import gzip
+import lzma
+import zlib
+import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import zstandard
+except ImportError:  # .gz, .bz2 and .xz only use the standard library
+    zstandard = None
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Compressed formats recognised by file suffix
+COMPRESSION_SUFFIXES = ('.gz', '.bz2', '.xz', '.zst')
+
+# Compression levels for written files (gzip's command line default, zstd's default)
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+# Plain files are read and written through a 1 MB buffer
+IO_BUFFER_SIZE = 1024 * 1024
+
+# gzip member header: magic number and the deflate compression method
+GZIP_MAGIC = b'\x1f\x8b\x08'
+
+# Uncompressed bytes per member written by write_gzip_members
+GZIP_MEMBER_SIZE = 4 * 1024 * 1024
+
+def compression_of(path):
+    """Return the compression suffix of path, or None for a plain file"""
+    for suffix in COMPRESSION_SUFFIXES:
+        if path.endswith(suffix):
+            return suffix
+    return None
+
+def open_log(path, mode='rt'):
+    """Open a plain or compressed file; mode is one of r/w/a with t (text) or b (binary)"""
+    compression = compression_of(path)
+    if compression is None:
+        return open(path, mode, buffering=IO_BUFFER_SIZE)
+    if compression == '.gz':
+        return gzip.open(path, mode, compresslevel=GZIP_LEVEL)
+    if compression == '.bz2':
+        return bz2.open(path, mode)
+    if compression == '.xz':
+        return lzma.open(path, mode)
+
+    if zstandard is None:
+        raise ImportError("Reading and writing .zst files requires zstandard: python3 -m pip install zstandard")
+    raw = open(path, mode[0] + 'b')
+    if mode[0] == 'r':
+        # Appended runs produce one frame each
+        stream = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True, closefd=True)
+    else:
+        stream = zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(raw, closefd=True)
+    return io.TextIOWrapper(stream) if 't' in mode else stream
+
+def is_gzip_member(f, offset):
+    """Check whether a gzip member plausibly starts at offset by decompressing its first block"""
+    f.seek(offset)
+    data = f.read(64 * 1024)
+    if not data.startswith(GZIP_MAGIC) or len(data) < 10 or data[3] & 0xE0:
+        return False
+    try:
+        zlib.decompressobj(31).decompress(data, 1024)
+    except zlib.error:
+        return False
+    return True
+
+def find_gzip_member(f, offset, end):
+    """Offset of the first gzip member header at or after offset, or None"""
+    window = IO_BUFFER_SIZE
+    while offset < end:
+        f.seek(offset)
+        data = f.read(min(window, end - offset) + len(GZIP_MAGIC) - 1)
+        index = data.find(GZIP_MAGIC)
+        while index >= 0:
+            if is_gzip_member(f, offset + index):
+                return offset + index
+            index = data.find(GZIP_MAGIC, index + 1)
+        offset += window
+    return None
+
+def gzip_member_ranges(path, shards):
+    """Split a gzip file into at most `shards` (start, end) byte ranges on member boundaries
+
+    A single-member file always comes back as one range. Boundaries are
+    found by searching for member headers; iter_gzip_members detects the
+    (very unlikely) case of a header pattern inside compressed data.
+    """
+    size = os.path.getsize(path)
+    boundaries = [0]
+    with open(path, 'rb') as f:
+        for i in range(1, shards):
+            offset = find_gzip_member(f, max(size * i // shards, boundaries[-1] + 1), size)
+            if offset is None:
+                break
+            if offset > boundaries[-1]:
+                boundaries.append(offset)
+    boundaries.append(size)
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if end > start]
+
+def iter_gzip_members(f, start, end):
+    """Yield decompressed chunks of the gzip members stored in bytes [start, end) of f
+
+    Raises ValueError if end is not the end of a member.
+    """
+    f.seek(start)
+    position = start
+    decompressor = zlib.decompressobj(31)
+    in_member = False
+    while position < end:
+        data = f.read(min(IO_BUFFER_SIZE, end - position))
+        if not data:
+            break
+        position += len(data)
+        while data:
+            if not in_member and data[:1] == b'\x00' and not data.strip(b'\x00'):
+                # Zero padding after the last member
+                break
+            in_member = True
+            chunk = decompressor.decompress(data)
+            if chunk:
+                yield chunk
+            if decompressor.eof:
+                data = decompressor.unused_data
+                decompressor = zlib.decompressobj(31)
+                in_member = False
+            else:
+                data = b''
+    if in_member:
+        raise ValueError(f"Byte {end} of {f.name} is not a gzip member boundary")
+
+def compress_member(data):
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+def iter_member_data(f, member_size):
+    """Read a binary file in chunks of about member_size bytes, cut after a newline"""
+    pending = b''
+    while True:
+        data = f.read(member_size)
+        if not data:
+            break
+        data = pending + data
+        cut = data.rfind(b'\n') + 1
+        if cut == 0:
+            pending = data
+            continue
+        pending = data[cut:]
+        yield data[:cut]
+    if pending:
+        yield pending
+
+def write_gzip_members(input_file, output_file, member_size=GZIP_MEMBER_SIZE, workers=1):
+    """Gzip input_file as independent members of about member_size bytes each
+
+    The result is an ordinary .gz file (gunzip and gzip.open read it as one
+    stream) that can also be decompressed in parallel. Members are
+    compressed on `workers` processes when workers > 1.
+    """
+    members = 0
+    with open_log(input_file, 'rb') as source, open(output_file, 'wb') as target:
+        chunks = iter_member_data(source, member_size)
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                # Keep at most 2 * workers members in flight, written in order
+                in_flight = deque()
+                for chunk in chunks:
+                    in_flight.append(executor.submit(compress_member, chunk))
+                    if len(in_flight) >= workers * 2:
+                        target.write(in_flight.popleft().result())
+                        members += 1
+                while in_flight:
+                    target.write(in_flight.popleft().result())
+                    members += 1
+        else:
+            for member in map(compress_member, chunks):
+                target.write(member)
+                members += 1
+    logger.info(f"Wrote {members} gzip members to {output_file}")
+    return members
@@ -0,0 +1,166 @@
+# Connection pooling for the Module 03 ETL functions.
+# A pool opens connections lazily, hands them out through a context manager,
+# health-checks connections that have sat idle, and keeps them open between
+# calls so repeated ETL steps (and repeated DAG task runs inside the same
+# Airflow worker process) skip the connection handshake.
+
+import os
+import time
+import queue
+import atexit
+import logging
+import threading
+from contextlib import contextmanager
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_SIZE = 4
+DEFAULT_HEALTH_CHECK_INTERVAL = 30  # seconds idle before a connection is pinged
+
+class ConnectionPool:
+    """Thread-safe, lazily opened pool of DB-API connections for one engine"""
+
+    def __init__(self, name, connect, ping, max_size=DEFAULT_MAX_SIZE,
+                 health_check_interval=DEFAULT_HEALTH_CHECK_INTERVAL):
+        self.name = name
+        self.max_size = max_size
+        self.health_check_interval = health_check_interval
+        self._connect = connect
+        self._ping = ping
+        self._lock = threading.Lock()
+        self._reset()
+        _pools.append(self)
+
+    def _reset(self):
+        """Forget all connections (used on first use and after a fork)"""
+        self._pid = os.getpid()
+        self._idle = queue.LifoQueue()
+        self._size = 0
+        self.stats = {'opened': 0, 'reused': 0, 'discarded': 0}
+
+    def _check_pid(self):
+        # Connections inherited from a parent process must not be shared
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._reset()
+
+    def _count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def _open(self):
+        conn = self._connect()
+        self._count('opened')
+        logger.info(f"Opened new {self.name} connection ({self._size}/{self.max_size} in pool)")
+        return conn
+
+    def _discard(self, conn):
+        with self._lock:
+            self._size -= 1
+            self.stats['discarded'] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, conn, idle_since):
+        if time.monotonic() - idle_since < self.health_check_interval:
+            return True
+        try:
+            return self._ping(conn)
+        except Exception as e:
+            logger.warning(f"{self.name} connection failed health check: {e}")
+            return False
+
+    def acquire(self, timeout=None):
+        """Return an open connection, creating one if the pool is not full"""
+        self._check_pid()
+        while True:
+            try:
+                conn, idle_since = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    can_open = self._size < self.max_size
+                    if can_open:
+                        self._size += 1
+                if can_open:
+                    try:
+                        return self._open()
+                    except Exception:
+                        with self._lock:
+                            self._size -= 1
+                        raise
+                try:
+                    conn, idle_since = self._idle.get(timeout=timeout)
+                except queue.Empty:
+                    raise TimeoutError(f"No {self.name} connection available after {timeout}s")
+
+            if self._is_healthy(conn, idle_since):
+                self._count('reused')
+                return conn
+            self._discard(conn)
+
+    def release(self, conn, broken=False):
+        """Return a connection to the pool, ending any open transaction"""
+        if self._pid != os.getpid():
+            return
+        if not broken:
+            try:
+                conn.rollback()
+            except Exception:
+                broken = True
+        if broken:
+            self._discard(conn)
+        else:
+            self._idle.put((conn, time.monotonic()))
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Context manager that borrows a connection and always gives it back"""
+        conn = self.acquire(timeout)
+        try:
+            yield conn
+        finally:
+            # release() rolls back; a connection that cannot roll back is dropped
+            self.release(conn)
+
+    def close_all(self):
+        """Close every idle connection held by the pool"""
+        if self._pid != os.getpid():
+            return
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+# Every pool created in this process, closed together at interpreter exit
+_pools = []
+
+def close_all_pools():
+    """Close idle connections in every pool created by this process"""
+    for pool in _pools:
+        pool.close_all()
+
+atexit.register(close_all_pools)
+
+def ping_mysql(conn):
+    """Health check for mysql.connector connections"""
+    return conn.is_connected()
+
+def ping_postgres(conn):
+    """Health check for psycopg2 connections"""
+    if conn.closed:
+        return False
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT 1")
+        cursor.fetchone()
+    finally:
+        cursor.close()
+    conn.rollback()
+    return True
@@ -0,0 +1,203 @@
+# In-memory dimension key cache for the Module 03 sales synchronization.
+# DimDate, DimCategory and DimCountry are preloaded (from the warehouse or
+# from the Module 02 CSV exports) into plain dicts and lists so surrogate keys
+# for a whole batch are resolved without a query per row. New dimension rows
+# are picked up incrementally by fetching only ids above the highest cached id.
+# Source rows carry no category or country attributes, so products and
+# customers map to fixed dimension ids (see category_id and country_id);
+# adding dimension rows never remaps facts that are already loaded.
+# Additions replace the maps instead of changing them in place, so a
+# snapshot() taken under the lock stays consistent while other threads
+# refresh the cache.
+
+import os
+import csv
+import logging
+import threading
+from collections import namedtuple
+from datetime import datetime
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Module 02 dimension exports
+M02_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'm02')
+
+# Consistent view of the cached keys; the maps in it are never modified
+DimensionSnapshot = namedtuple('DimensionSnapshot', 'date_keys category_ids country_ids version')
+
+# Products and customers are spread over this many DimCategory and
+# DimCountry ids, the sizes of the Module 02 dimensions
+CATEGORY_BUCKETS = 4
+COUNTRY_BUCKETS = 56
+
+# Dimensions whose unresolved keys can trigger a refresh
+DIMENSIONS = ('date', 'category', 'country')
+
+def category_id(product_id):
+    """DimCategory id a product is assigned to"""
+    return product_id % CATEGORY_BUCKETS + 1
+
+def country_id(customer_id):
+    """DimCountry id a customer is assigned to"""
+    return customer_id % COUNTRY_BUCKETS + 1
+
+class DimensionCache:
+    """Surrogate key lookups for DimDate, DimCategory and DimCountry"""
+
+    def __init__(self):
+        # Serializes loads and refreshes when batches are transformed on several threads
+        self._lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+        self.date_keys = {}        # date -> dateid
+        self.category_keys = {}    # category name -> categoryid
+        self.country_keys = {}     # country name -> countryid
+        self._category_ids = frozenset()  # cached categoryids
+        self._country_ids = frozenset()   # cached countryids
+        self._max_ids = {'date': 0, 'category': 0, 'country': 0}
+        self._missing = {dimension: set() for dimension in DIMENSIONS}  # keys still unknown after a refresh
+        self.version = 0             # bumped whenever dimension rows are added
+        self.loaded = False
+
+    def _add_dates(self, rows):
+        date_keys = dict(self.date_keys)
+        for dateid, day in rows:
+            if isinstance(day, str):
+                day = datetime.strptime(day, '%Y-%m-%d').date()
+            elif isinstance(day, datetime):
+                day = day.date()
+            date_keys[day] = int(dateid)
+            self._max_ids['date'] = max(self._max_ids['date'], int(dateid))
+        self.date_keys = date_keys
+        self.version += 1
+
+    def _add_categories(self, rows):
+        category_keys = dict(self.category_keys)
+        for categoryid, category in rows:
+            category_keys[category] = int(categoryid)
+            self._max_ids['category'] = max(self._max_ids['category'], int(categoryid))
+        self.category_keys = category_keys
+        self._category_ids = frozenset(category_keys.values())
+        self.version += 1
+
+    def _add_countries(self, rows):
+        country_keys = dict(self.country_keys)
+        for countryid, country in rows:
+            country_keys[country] = int(countryid)
+            self._max_ids['country'] = max(self._max_ids['country'], int(countryid))
+        self.country_keys = country_keys
+        self._country_ids = frozenset(country_keys.values())
+        self.version += 1
+
+    def snapshot(self):
+        """Return the current date map, category and country ids and version as one consistent view"""
+        with self._lock:
+            return DimensionSnapshot(self.date_keys, self._category_ids, self._country_ids, self.version)
+
+    def unknown_keys(self, snapshot, days=(), category_ids=(), country_ids=()):
+        """Dates and category/country ids missing from snapshot that have not already failed a refresh
+
+        Returns a dict of sets keyed by dimension ('date', 'category', 'country').
+        """
+        with self._lock:
+            return {
+                'date': {day for day in days if day not in snapshot.date_keys} - self._missing['date'],
+                'category': set(category_ids) - snapshot.category_ids - self._missing['category'],
+                'country': set(country_ids) - snapshot.country_ids - self._missing['country'],
+            }
+
+    def mark_missing(self, unknown, snapshot):
+        """Remember keys still missing from snapshot after a refresh so they do not trigger another one"""
+        with self._lock:
+            self._missing['date'].update(day for day in unknown['date'] if day not in snapshot.date_keys)
+            self._missing['category'].update(unknown['category'] - snapshot.category_ids)
+            self._missing['country'].update(unknown['country'] - snapshot.country_ids)
+
+    def load_from_warehouse(self, postgres_cursor):
+        """Load every dimension row from the PostgreSQL data warehouse"""
+        with self._lock:
+            self._clear()
+            self._fetch_new_rows(postgres_cursor)
+            self.loaded = True
+        logger.info(f"Dimension cache loaded: {len(self.date_keys)} dates, "
+                    f"{len(self.category_keys)} categories, {len(self.country_keys)} countries")
+
+    def load_from_csv(self, directory=M02_DIR):
+        """Load every dimension row from the Module 02 CSV exports"""
+        def read(filename, key_column, value_column):
+            with open(os.path.join(directory, filename), newline='', encoding='utf-8-sig') as f:
+                return [(row[key_column], row[value_column]) for row in csv.DictReader(f)]
+
+        with self._lock:
+            self._clear()
+            self._add_dates(read('DimDate.csv', 'dateid', 'date'))
+            self._add_categories(read('DimCategory.csv', 'categoryid', 'category'))
+            self._add_countries(read('DimCountry.csv', 'countryid', 'country'))
+            self.loaded = True
+        logger.info(f"Dimension cache loaded from {directory}: {len(self.date_keys)} dates, "
+                    f"{len(self.category_keys)} categories, {len(self.country_keys)} countries")
+
+    def refresh(self, postgres_cursor):
+        """Fetch only dimension rows added since the last load or refresh"""
+        with self._lock:
+            return self._fetch_new_rows(postgres_cursor)
+
+    def _fetch_new_rows(self, postgres_cursor):
+        postgres_cursor.execute("SELECT dateid, date FROM DimDate WHERE dateid > %s",
+                                (self._max_ids['date'],))
+        new_dates = postgres_cursor.fetchall()
+        if new_dates:
+            self._add_dates(new_dates)
+            self._missing['date'].clear()
+
+        postgres_cursor.execute("SELECT categoryid, category FROM DimCategory WHERE categoryid > %s",
+                                (self._max_ids['category'],))
+        new_categories = postgres_cursor.fetchall()
+        if new_categories:
+            self._add_categories(new_categories)
+            self._missing['category'].clear()
+
+        postgres_cursor.execute("SELECT countryid, country FROM DimCountry WHERE countryid > %s",
+                                (self._max_ids['country'],))
+        new_countries = postgres_cursor.fetchall()
+        if new_countries:
+            self._add_countries(new_countries)
+            self._missing['country'].clear()
+
+        return len(new_dates) + len(new_categories) + len(new_countries)
+
+    def resolve_batch(self, records, postgres_cursor=None):
+        """Return (date_key, category_key, country_key) for each source record
+
+        Products and customers resolve to their fixed category_id() and
+        country_id(). A date or id missing from the cache triggers an
+        incremental refresh when a cursor is given; keys still missing
+        resolve to None and do not trigger another refresh until new rows
+        appear in their dimension.
+        """
+        snapshot = self.snapshot()
+        now = datetime.now()
+
+        days = [(record[5] or now).date() for record in records]
+        categories = [category_id(record[1]) for record in records]
+        countries = [country_id(record[2]) for record in records]
+        unknown = self.unknown_keys(snapshot, days, categories, countries)
+        if any(unknown.values()) and postgres_cursor is not None:
+            self.refresh(postgres_cursor)
+            snapshot = self.snapshot()
+            self.mark_missing(unknown, snapshot)
+        date_keys, category_ids, country_ids, _ = snapshot
+
+        keys = [(date_keys.get(day),
+                 category if category in category_ids else None,
+                 country if country in country_ids else None)
+                for day, category, country in zip(days, categories, countries)]
+
+        for position, dimension in enumerate(('DimDate', 'DimCategory', 'DimCountry')):
+            missing = sum(1 for key in keys if key[position] is None)
+            if missing:
+                logger.warning(f"{missing} records have keys not present in {dimension}")
+        return keys
@@ -0,0 +1,136 @@
+# ETL checkpoint state for the Module 03 sales synchronization.
+# The etl_watermark table keeps one row per source table with the last
+# committed rowid, the current run id, row counts and timings. It is updated
+# in the same transaction as each loaded batch, so the checkpoint always
+# matches what is committed in FactSales and a crashed run resumes from its
+# last committed batch with a single primary key lookup.
+# The etl_binlog_position table is the matching checkpoint for the binlog
+# change-data-capture mode (binlog_cdc.py): the MySQL binlog file and
+# offset up to which changes are committed in FactSales.
+
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Source identifiers for the MySQL sales_data table
+SALES_SOURCE = 'mysql.sales'
+SALES_TABLE = 'sales_data'
+
+CREATE_WATERMARK_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS etl_watermark (
+    source VARCHAR(50) NOT NULL,
+    source_table VARCHAR(100) NOT NULL,
+    last_rowid BIGINT NOT NULL DEFAULT 0,
+    run_id VARCHAR(250),
+    run_started_at TIMESTAMP,
+    run_rows BIGINT NOT NULL DEFAULT 0,
+    run_batches INTEGER NOT NULL DEFAULT 0,
+    run_seconds DOUBLE PRECISION NOT NULL DEFAULT 0,
+    last_batch_rows INTEGER NOT NULL DEFAULT 0,
+    last_batch_seconds DOUBLE PRECISION NOT NULL DEFAULT 0,
+    total_rows BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (source, source_table)
+)
+"""
+
+CREATE_BINLOG_POSITION_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS etl_binlog_position (
+    source VARCHAR(50) PRIMARY KEY,
+    log_file VARCHAR(255) NOT NULL,
+    log_pos BIGINT NOT NULL,
+    total_changes BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+def ensure_state_table(postgres_cursor):
+    """Create the etl_watermark table if it does not exist yet"""
+    postgres_cursor.execute(CREATE_WATERMARK_TABLE_SQL)
+
+def get_watermark(postgres_cursor, source=SALES_SOURCE, source_table=SALES_TABLE,
+                  fact_table='FactSales'):
+    """Return the last committed rowid for a source table
+
+    The first call for a source bootstraps its row from MAX(rowid) of the
+    fact table, so warehouses loaded before the state table existed carry on
+    from where they were. Every later call is a primary key lookup.
+    """
+    ensure_state_table(postgres_cursor)
+    postgres_cursor.execute(
+        "SELECT last_rowid FROM etl_watermark WHERE source = %s AND source_table = %s",
+        (source, source_table)
+    )
+    row = postgres_cursor.fetchone()
+    if row is not None:
+        return row[0]
+
+    postgres_cursor.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {fact_table}")
+    last_rowid = postgres_cursor.fetchone()[0]
+    postgres_cursor.execute("""
+        INSERT INTO etl_watermark (source, source_table, last_rowid, total_rows)
+        VALUES (%s, %s, %s, 0)
+        ON CONFLICT (source, source_table) DO NOTHING
+    """, (source, source_table, last_rowid))
+    logger.info(f"Bootstrapped watermark for {source}.{source_table} at rowid {last_rowid}")
+    return last_rowid
+
+def start_run(postgres_cursor, run_id, source=SALES_SOURCE, source_table=SALES_TABLE):
+    """Reset the per-run counters for a new synchronization run"""
+    postgres_cursor.execute("""
+        UPDATE etl_watermark
+        SET run_id = %s, run_started_at = CURRENT_TIMESTAMP,
+            run_rows = 0, run_batches = 0, run_seconds = 0,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE source = %s AND source_table = %s
+    """, (run_id, source, source_table))
+
+def advance_watermark(postgres_cursor, last_rowid, rows, seconds,
+                      source=SALES_SOURCE, source_table=SALES_TABLE):
+    """Record a loaded batch; call inside the batch's transaction before commit"""
+    postgres_cursor.execute("""
+        UPDATE etl_watermark
+        SET last_rowid = GREATEST(last_rowid, %s),
+            run_rows = run_rows + %s,
+            run_batches = run_batches + 1,
+            run_seconds = run_seconds + %s,
+            last_batch_rows = %s,
+            last_batch_seconds = %s,
+            total_rows = total_rows + %s,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE source = %s AND source_table = %s
+    """, (last_rowid, rows, seconds, rows, seconds, rows, source, source_table))
+
+def rewind_watermark(postgres_cursor, last_rowid, source=SALES_SOURCE, source_table=SALES_TABLE):
+    """Move the checkpoint back to last_rowid so later source rows are synchronized again
+
+    The caller is responsible for removing the fact rows above last_rowid
+    (or loading them idempotently) in the same transaction.
+    """
+    postgres_cursor.execute("""
+        UPDATE etl_watermark
+        SET last_rowid = %s, updated_at = CURRENT_TIMESTAMP
+        WHERE source = %s AND source_table = %s
+    """, (last_rowid, source, source_table))
+    logger.info(f"Rewound watermark for {source}.{source_table} to rowid {last_rowid}")
+
+def get_binlog_position(postgres_cursor, source=SALES_SOURCE):
+    """Return the committed (log_file, log_pos) binlog checkpoint, or None if there is none yet"""
+    postgres_cursor.execute(CREATE_BINLOG_POSITION_TABLE_SQL)
+    postgres_cursor.execute("SELECT log_file, log_pos FROM etl_binlog_position WHERE source = %s", (source,))
+    row = postgres_cursor.fetchone()
+    return tuple(row) if row is not None else None
+
+def save_binlog_position(postgres_cursor, log_file, log_pos, changes=0, source=SALES_SOURCE):
+    """Record the binlog position applied up to; call inside the transaction that applied the changes"""
+    postgres_cursor.execute("""
+        INSERT INTO etl_binlog_position (source, log_file, log_pos, total_changes)
+        VALUES (%s, %s, %s, %s)
+        ON CONFLICT (source) DO UPDATE SET
+            log_file = EXCLUDED.log_file,
+            log_pos = EXCLUDED.log_pos,
+            total_changes = etl_binlog_position.total_changes + EXCLUDED.total_changes,
+            updated_at = CURRENT_TIMESTAMP
+    """, (source, log_file, log_pos, changes))
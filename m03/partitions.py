@@ -0,0 +1,47 @@
+# Monthly range partitioning helpers for the data warehouse fact tables.
+# FactSales and FactWebLog can be declared PARTITION BY RANGE (timestamp)
+# with one partition per calendar month, named <table>_YYYY_MM. Partitions
+# are created by the loaders as data for a new month arrives, and loaders
+# can write a batch straight into its partitions instead of relying on
+# tuple routing through the parent table.
+
+import logging
+from datetime import datetime
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def is_partitioned(postgres_cursor, table):
+    """Return True if table exists and is a partitioned table"""
+    postgres_cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)",
+                            (table.lower(),))
+    return postgres_cursor.fetchone() is not None
+
+def partition_name(table, year, month):
+    return f"{table}_{year:04d}_{month:02d}"
+
+def ensure_month_partitions(postgres_cursor, months, table):
+    """Create the monthly partitions for (year, month) pairs that do not exist yet"""
+    for year, month in sorted(months):
+        start = datetime(year, month, 1)
+        end = datetime(year + month // 12, month % 12 + 1, 1)
+        postgres_cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {partition_name(table, year, month)} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{end:%Y-%m-%d}')"
+        )
+    logger.info(f"Ensured {len(months)} monthly partitions of {table}")
+
+def route_to_partitions(postgres_cursor, groups, known_months, table):
+    """Create the partitions a batch needs and yield (partition table, rows) pairs
+
+    groups maps (year, month) to that month's share of the batch;
+    known_months is a set of months already created in this load and is
+    updated in place, so each partition is checked once per load.
+    """
+    new_months = set(groups) - known_months
+    if new_months:
+        ensure_month_partitions(postgres_cursor, new_months, table)
+        known_months.update(new_months)
+    for (year, month), rows in sorted(groups.items()):
+        yield partition_name(table, year, month), rows
@@ -5,6 +5,11 @@
 import psycopg2
 import logging
 
+from etl_state import CREATE_WATERMARK_TABLE_SQL, CREATE_BINLOG_POSITION_TABLE_SQL
+from weblog_warehouse import create_web_log_table
+from warehouse_summary import CREATE_SUMMARY_TABLE_SQL
+from sales_rollups import CREATE_ROLLUP_TABLES_SQL
+
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -16,6 +21,30 @@ dsn_pwd = 'password123'     # Replace with your postgres password
 dsn_port = "5432"           # PostgreSQL port
 dsn_database = "staging"    # Module 02 data warehouse database
 
+# Create FactSales range partitioned by month on timestamp (one partition per
+# month, created by the loader as data arrives). Only applies when the table
+# does not exist yet; an existing FactSales keeps its layout.
+FACTSALES_PARTITIONED = False
+
+def make_foreign_keys_deferrable(cursor, table='FactSales'):
+    """Make the table's existing foreign keys DEFERRABLE INITIALLY IMMEDIATE
+    
+    Tables created before the keys were declared deferrable are altered in
+    place; rows are still checked immediately unless a transaction runs
+    SET CONSTRAINTS ... DEFERRED, as the bulk merge in automation.py does.
+    Returns the names of the altered constraints.
+    """
+    cursor.execute("""
+        SELECT conname FROM pg_constraint
+        WHERE conrelid = %s::regclass AND contype = 'f' AND NOT condeferrable
+    """, (table,))
+    constraints = [row[0] for row in cursor.fetchall()]
+    for constraint in constraints:
+        cursor.execute(f'ALTER TABLE {table} ALTER CONSTRAINT "{constraint}" DEFERRABLE INITIALLY IMMEDIATE')
+    if constraints:
+        logger.info(f"Made {len(constraints)} foreign keys of {table} deferrable")
+    return constraints
+
 def create_connection():
     """Create and return a PostgreSQL connection to the data warehouse"""
     try:
@@ -32,8 +61,14 @@ def create_connection():
         logger.error(f"Error connecting to PostgreSQL: {e}")
         raise
 
-def create_data_warehouse_tables():
-    """Create the data warehouse tables if they don't exist (Module 02 schema)"""
+def create_data_warehouse_tables(partitioned=FACTSALES_PARTITIONED):
+    """Create the data warehouse tables if they don't exist (Module 02 schema)
+    
+    With partitioned=True FactSales is created PARTITION BY RANGE (timestamp).
+    Its primary key then has to include the partition key, so it becomes
+    (rowid, timestamp); rowids are still unique because the source assigns
+    them, and rowid range scans still use the key's leading column.
+    """
     try:
         conn = create_connection()
         cursor = conn.cursor()
@@ -82,17 +117,52 @@ def create_data_warehouse_tables():
             date_key INTEGER,
             category_key INTEGER,
             country_key INTEGER,
-            FOREIGN KEY (date_key) REFERENCES DimDate(dateid),
-            FOREIGN KEY (category_key) REFERENCES DimCategory(categoryid),
-            FOREIGN KEY (country_key) REFERENCES DimCountry(countryid)
+            FOREIGN KEY (date_key) REFERENCES DimDate(dateid) DEFERRABLE INITIALLY IMMEDIATE,
+            FOREIGN KEY (category_key) REFERENCES DimCategory(categoryid) DEFERRABLE INITIALLY IMMEDIATE,
+            FOREIGN KEY (country_key) REFERENCES DimCountry(countryid) DEFERRABLE INITIALLY IMMEDIATE
         )
         """
         
+        # Partitioned variant of FactSales; monthly partitions are created by
+        # partitions.ensure_month_partitions when rows for a month are loaded
+        create_partitioned_factsales_sql = """
+        CREATE TABLE IF NOT EXISTS FactSales (
+            rowid INTEGER NOT NULL,
+            product_id INTEGER NOT NULL,
+            customer_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL,
+            price DECIMAL(10,2) NOT NULL,
+            timestamp TIMESTAMP NOT NULL,
+            date_key INTEGER,
+            category_key INTEGER,
+            country_key INTEGER,
+            PRIMARY KEY (rowid, timestamp),
+            FOREIGN KEY (date_key) REFERENCES DimDate(dateid) DEFERRABLE INITIALLY IMMEDIATE,
+            FOREIGN KEY (category_key) REFERENCES DimCategory(categoryid) DEFERRABLE INITIALLY IMMEDIATE,
+            FOREIGN KEY (country_key) REFERENCES DimCountry(countryid) DEFERRABLE INITIALLY IMMEDIATE
+        ) PARTITION BY RANGE (timestamp)
+        """
+        
         # Execute table creation
         cursor.execute(create_dimdate_sql)
         cursor.execute(create_dimcategory_sql)
         cursor.execute(create_dimcountry_sql)
-        cursor.execute(create_factsales_sql)
+        cursor.execute(create_partitioned_factsales_sql if partitioned else create_factsales_sql)
+        make_foreign_keys_deferrable(cursor)
+        
+        # Create the ETL checkpoint table used by incremental synchronization
+        cursor.execute(CREATE_WATERMARK_TABLE_SQL)
+        cursor.execute(CREATE_BINLOG_POSITION_TABLE_SQL)
+        
+        # Create the running FactSales statistics read by validation
+        cursor.execute(CREATE_SUMMARY_TABLE_SQL)
+        
+        # Create the pre-aggregated reporting tables maintained by the ETL
+        for create_rollup_sql in CREATE_ROLLUP_TABLES_SQL:
+            cursor.execute(create_rollup_sql)
+        
+        # Create the web log fact table loaded by the Airflow DAG
+        create_web_log_table(cursor)
         
         conn.commit()
         logger.info("Data warehouse tables created successfully")
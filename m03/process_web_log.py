@@ -8,12 +8,21 @@ from datetime import datetime, timedelta
 from airflow import DAG
 from airflow.operators.bash_operator import BashOperator
 from airflow.operators.python_operator import PythonOperator
-import re
 import os
-import mysql.connector
+import hashlib
+import itertools
 import psycopg2
 import logging
 
+from warehouse_summary import validate_fact_summary
+from sales_rollups import rebuild_sales_rollups
+from automation import get_last_rowid, stream_latest_records, insert_records
+from compression import COMPRESSION_SUFFIXES
+from weblog_columnar import write_web_log_dataset
+from weblog_warehouse import load_web_log_warehouse, WEBLOG_FACT_TABLE
+from weblog import (extract_web_log, transform_web_log, load_web_log, process_web_log_fused,
+                    extract_web_log_incremental, process_web_log_fused_incremental)
+
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -39,14 +48,96 @@ dag = DAG(
     tags=['web_logs', 'etl', 'data_warehouse'],
 )
 
-# Database connection configurations
-mysql_config = {
-    'user': 'root',
-    'password': 'password123',
-    'host': 'localhost',
-    'database': 'sales'
-}
+# Web log files inside the Airflow dags folder
+DAGS_FOLDER = '/home/project/airflow/dags'
+ACCESS_LOG_FILE = os.path.join(DAGS_FOLDER, 'accesslog.txt')
+EXTRACTED_FILE = os.path.join(DAGS_FOLDER, 'extracted_data.txt')
+TRANSFORMED_FILE = os.path.join(DAGS_FOLDER, 'transformed_data.txt')
+PROCESSED_FILE = os.path.join(DAGS_FOLDER, 'weblog_processed.txt')
+PROCESSED_DATASET_DIR = os.path.join(DAGS_FOLDER, 'weblog_processed')
+CHECKPOINT_FILE = os.path.join(DAGS_FOLDER, 'accesslog.checkpoint.json')
+
+# Rotated copies of a log are searched for an unread tail after rotation
+ROTATED_LOG_SUFFIXES = ('.1',)
+
+# Worker processes for web log parsing; override per run with
+# dag_run.conf {"weblog_workers": N}
+WEBLOG_WORKERS = 1
+
+# 'staged' runs extract -> transform -> load through intermediate files;
+# 'fused' writes weblog_processed.txt in a single pass from the extract task.
+# Override per run with dag_run.conf {"weblog_mode": "fused"}
+WEBLOG_MODE = 'staged'
+
+# Timestamps are normalized to UTC by default; dag_run.conf
+# {"weblog_keep_offset": true} keeps local time with a '+hh:mm' offset
+WEBLOG_KEEP_OFFSET = False
+
+# Incremental ingestion reads only the bytes appended to accesslog.txt since
+# the last run (tracked in CHECKPOINT_FILE, or a checkpoint of its own for
+# another weblog_input) and appends to weblog_processed.txt. It reads the log
+# serially with the line scanner, whatever weblog_workers and weblog_scanner say.
+# Override per run with dag_run.conf {"weblog_incremental": true}
+WEBLOG_INCREMENTAL = False
+
+# 'lines' decodes and regex-scans the access log line by line; 'mmap' scans
+# the memory-mapped file as bytes and decodes only the emitted fields.
+# Override per run with dag_run.conf {"weblog_scanner": "mmap"}
+WEBLOG_SCANNER = 'lines'
+
+# dag_run.conf {"weblog_input": ".../accesslog.txt.1.gz"} reads another
+# (possibly compressed) log instead of accesslog.txt; .gz, .bz2, .xz and .zst
+# are decompressed on the fly. {"weblog_compression": "gz"} writes the
+# extracted, transformed and processed files compressed with that suffix.
+WEBLOG_COMPRESSION = None
 
+# 'csv' writes weblog_processed.txt; 'parquet' or 'arrow' write a
+# date-partitioned columnar dataset to weblog_processed/ instead (needs pyarrow);
+# 'warehouse' COPYs the records into FactWebLog, replacing the rows of the run's ds.
+# Override per run with dag_run.conf {"weblog_output_format": "parquet"}
+WEBLOG_OUTPUT_FORMAT = 'csv'
+
+# Create FactWebLog range partitioned by month when it does not exist yet;
+# dag_run.conf {"weblog_partitioned": true}
+WEBLOG_PARTITIONED = False
+
+# 'incremental' validation reads FactSales statistics from fact_summary and
+# aggregates only newly loaded rows; 'full' reconciles them with a full scan
+# (also done automatically once FULL_RECONCILIATION_INTERVAL has passed).
+# Override per run with dag_run.conf {"validation_mode": "full"}
+VALIDATION_MODE = 'incremental'
+
+# Sales rows already in FactSales fail the load by default; 'nothing' skips
+# them and 'update' overwrites them, so a retried or overlapping run only
+# writes what is missing.
+# Override per run with dag_run.conf {"sales_on_conflict": "nothing"}
+SALES_ON_CONFLICT = None
+
+def get_stage_file(context, path):
+    """Name of an intermediate or output file with the run's compression suffix"""
+    compression = get_run_option(context, 'weblog_compression', WEBLOG_COMPRESSION)
+    if not compression:
+        return path
+    if f".{compression}" not in COMPRESSION_SUFFIXES:
+        raise ValueError(f"Unsupported weblog_compression {compression!r}")
+    return f"{path}.{compression}"
+
+def get_checkpoint_file(input_file):
+    """Incremental ingestion checkpoint for input_file; accesslog.txt keeps CHECKPOINT_FILE"""
+    path = os.path.abspath(input_file)
+    if path == ACCESS_LOG_FILE:
+        return CHECKPOINT_FILE
+    digest = hashlib.sha1(path.encode()).hexdigest()[:12]
+    return os.path.join(DAGS_FOLDER, f"{os.path.basename(path)}.{digest}.checkpoint.json")
+
+def get_run_option(context, name, default):
+    """Read an option from the triggering dag_run.conf, falling back to a default"""
+    dag_run = context.get('dag_run')
+    conf = (dag_run.conf if dag_run is not None else None) or {}
+    return conf.get(name, default)
+
+# Database connection configuration; the sales synchronization uses the
+# connection settings and pools in automation.py
 postgres_config = {
     'host': 'localhost',
     'database': 'staging',  # Module 02 data warehouse
@@ -55,96 +146,121 @@ postgres_config = {
     'port': '5432'
 }
 
-def extract_web_log_data():
+def check_incremental_warehouse(context):
+    """Reject incremental runs with warehouse output
+    
+    A warehouse load replaces every FactWebLog row of its ds, but an
+    incremental run only has the lines appended since the last checkpoint,
+    so a second run on the same ds would drop the rows loaded earlier.
+    """
+    if (get_run_option(context, 'weblog_incremental', WEBLOG_INCREMENTAL)
+            and get_run_option(context, 'weblog_output_format', WEBLOG_OUTPUT_FORMAT) == 'warehouse'):
+        raise ValueError("Incremental web log runs cannot use the 'warehouse' output format: "
+                         "each load replaces the whole ds with only the newly appended lines")
+
+def extract_web_log_data(**context):
     """Extract IP addresses and dates from web log file"""
-    input_file = '/home/project/airflow/dags/accesslog.txt'
-    output_file = '/home/project/airflow/dags/extracted_data.txt'
+    input_file = get_run_option(context, 'weblog_input', ACCESS_LOG_FILE)
+    output_file = get_stage_file(context, EXTRACTED_FILE)
+    processed_file = get_stage_file(context, PROCESSED_FILE)
+    workers = int(get_run_option(context, 'weblog_workers', WEBLOG_WORKERS))
+    incremental = bool(get_run_option(context, 'weblog_incremental', WEBLOG_INCREMENTAL))
+    mmap_scan = get_run_option(context, 'weblog_scanner', WEBLOG_SCANNER) == 'mmap'
+    
+    # Checked before the checkpoint advances, so no appended lines are skipped
+    check_incremental_warehouse(context)
+    if incremental:
+        checkpoint_file = get_checkpoint_file(input_file)
+        rotated_files = [input_file + suffix for suffix in ROTATED_LOG_SUFFIXES]
+        if workers > 1 or mmap_scan:
+            logger.warning(f"Incremental ingestion reads {input_file} serially line by line; "
+                           f"ignoring weblog_workers={workers} and weblog_scanner="
+                           f"{get_run_option(context, 'weblog_scanner', WEBLOG_SCANNER)!r}")
     
     try:
-        # Read the access log file
-        with open(input_file, 'r') as f:
-            lines = f.readlines()
-        
-        extracted_data = []
+        if get_run_option(context, 'weblog_mode', WEBLOG_MODE) == 'fused':
+            # Parse, transform and write the final output in one pass
+            keep_offset = bool(get_run_option(context, 'weblog_keep_offset', WEBLOG_KEEP_OFFSET))
+            if incremental:
+                count = process_web_log_fused_incremental(input_file, processed_file, checkpoint_file,
+                                                          rotated_files, keep_offset)
+            else:
+                count = process_web_log_fused(input_file, processed_file, workers, keep_offset, mmap_scan)
+            logger.info(f"Processed {count} records to {processed_file} in fused mode")
+            return
         
-        for line in lines:
-            # Extract IP address (first field)
-            ip_match = re.match(r'^(\d+\.\d+\.\d+\.\d+)', line.strip())
-            
-            # Extract timestamp (field in square brackets)
-            timestamp_match = re.search(r'\[([^\]]+)\]', line)
-            
-            if ip_match and timestamp_match:
-                ip_address = ip_match.group(1)
-                timestamp = timestamp_match.group(1)
-                extracted_data.append(f"{ip_address},{timestamp}")
-        
-        # Write extracted data to file
-        with open(output_file, 'w') as f:
-            for data in extracted_data:
-                f.write(data + '\n')
+        if incremental:
+            # Only the bytes appended since the last checkpoint
+            count = extract_web_log_incremental(input_file, output_file, checkpoint_file, rotated_files)
+        else:
+            # Stream the access log (sharded across processes when workers > 1)
+            count = extract_web_log(input_file, output_file, workers, mmap_scan)
         
-        logger.info(f"Extracted {len(extracted_data)} records to {output_file}")
+        logger.info(f"Extracted {count} records to {output_file}")
         
     except Exception as e:
         logger.error(f"Error extracting web log data: {e}")
         raise
 
-def transform_web_log_data():
+def transform_web_log_data(**context):
     """Transform the extracted data - convert timestamp format"""
-    input_file = '/home/project/airflow/dags/extracted_data.txt'
-    output_file = '/home/project/airflow/dags/transformed_data.txt'
+    input_file = get_stage_file(context, EXTRACTED_FILE)
+    output_file = get_stage_file(context, TRANSFORMED_FILE)
+    workers = int(get_run_option(context, 'weblog_workers', WEBLOG_WORKERS))
+    keep_offset = bool(get_run_option(context, 'weblog_keep_offset', WEBLOG_KEEP_OFFSET))
+    
+    if get_run_option(context, 'weblog_mode', WEBLOG_MODE) == 'fused':
+        logger.info("Fused mode: transform already done by extract_web_log_data")
+        return
     
     try:
-        # Read extracted data
-        with open(input_file, 'r') as f:
-            lines = f.readlines()
-        
-        transformed_data = []
-        
-        for line in lines:
-            if line.strip():
-                parts = line.strip().split(',')
-                if len(parts) >= 2:
-                    ip_address = parts[0]
-                    timestamp = parts[1]
-                    
-                    # Transform timestamp from "dd/MMM/yyyy:HH:mm:ss +0000" to "yyyy-mm-dd HH:mm:ss"
-                    try:
-                        # Parse the original timestamp
-                        dt = datetime.strptime(timestamp.split(' ')[0], '%d/%b/%Y:%H:%M:%S')
-                        # Format to new format
-                        new_timestamp = dt.strftime('%Y-%m-%d %H:%M:%S')
-                        transformed_data.append(f"{ip_address},{new_timestamp}")
-                    except ValueError:
-                        # If parsing fails, keep original
-                        transformed_data.append(line.strip())
-        
-        # Write transformed data to file
-        with open(output_file, 'w') as f:
-            for data in transformed_data:
-                f.write(data + '\n')
+        # Reformat timestamps line by line (sharded across processes when workers > 1)
+        count = transform_web_log(input_file, output_file, workers, keep_offset)
         
-        logger.info(f"Transformed {len(transformed_data)} records to {output_file}")
+        logger.info(f"Transformed {count} records to {output_file}")
         
     except Exception as e:
         logger.error(f"Error transforming web log data: {e}")
         raise
 
-def load_web_log_data():
+def load_web_log_data(**context):
     """Load the transformed web log data into the final destination"""
-    input_file = '/home/project/airflow/dags/transformed_data.txt'
-    output_file = '/home/project/airflow/dags/weblog_processed.txt'
+    input_file = get_stage_file(context, TRANSFORMED_FILE)
+    output_file = get_stage_file(context, PROCESSED_FILE)
+    output_format = get_run_option(context, 'weblog_output_format', WEBLOG_OUTPUT_FORMAT)
+    incremental = bool(get_run_option(context, 'weblog_incremental', WEBLOG_INCREMENTAL))
+    fused = get_run_option(context, 'weblog_mode', WEBLOG_MODE) == 'fused'
+    check_incremental_warehouse(context)
+    
+    if fused:
+        if output_format == 'csv':
+            logger.info("Fused mode: load already done by extract_web_log_data")
+            return
+        # Load from the fused CSV output (which has a header); columnar datasets are rebuilt
+        input_file, incremental = output_file, False
     
     try:
-        # Read transformed data
-        with open(input_file, 'r') as f:
-            data = f.read()
+        if output_format == 'warehouse':
+            # Idempotent per ds: earlier rows of this ds are replaced in the same transaction
+            partitioned = bool(get_run_option(context, 'weblog_partitioned', WEBLOG_PARTITIONED))
+            postgres_conn = psycopg2.connect(**postgres_config)
+            try:
+                count = load_web_log_warehouse(postgres_conn, input_file, context['ds'], header=fused,
+                                               partitioned=partitioned)
+            finally:
+                postgres_conn.close()
+            logger.info(f"Loaded {count} web log records into {WEBLOG_FACT_TABLE}")
+            return
+        
+        if output_format != 'csv':
+            # Date-partitioned Parquet / Arrow IPC dataset (new files added in incremental mode)
+            count = write_web_log_dataset(input_file, PROCESSED_DATASET_DIR, output_format,
+                                          header=fused, append=incremental)
+            logger.info(f"Loaded {count} web log records to {PROCESSED_DATASET_DIR}")
+            return
         
-        # Write to final destination with header
-        with open(output_file, 'w') as f:
-            f.write("IP_Address,Timestamp\n")
-            f.write(data)
+        # Write to final destination with header (appended to in incremental mode)
+        load_web_log(input_file, output_file, append=incremental)
         
         logger.info(f"Loaded web log data to {output_file}")
         
@@ -152,87 +268,51 @@ def load_web_log_data():
         logger.error(f"Error loading web log data: {e}")
         raise
 
-def synchronize_sales_data():
-    """Synchronize sales data from MySQL to PostgreSQL data warehouse"""
+def synchronize_sales_data(**context):
+    """Synchronize sales data from MySQL to PostgreSQL data warehouse
+
+    Runs the same load as automation.synchronize_data: dimension keys come
+    from the shared DimensionCache, and each batch commits with its
+    etl_watermark advance, fact_summary and rollup refresh.
+    """
     try:
-        # Connect to MySQL (source)
-        mysql_conn = mysql.connector.connect(**mysql_config)
-        mysql_cursor = mysql_conn.cursor()
-        
-        # Connect to PostgreSQL (data warehouse)
-        postgres_conn = psycopg2.connect(**postgres_config)
-        postgres_cursor = postgres_conn.cursor()
-        
-        # Get last processed rowid from FactSales
-        postgres_cursor.execute("SELECT COALESCE(MAX(rowid), 0) FROM FactSales")
-        last_rowid = postgres_cursor.fetchone()[0]
-        
-        # Get new records from MySQL
-        mysql_cursor.execute("""
-            SELECT rowid, product_id, customer_id, quantity, price, timestamp
-            FROM sales_data 
-            WHERE rowid > %s
-            ORDER BY rowid
-        """, (last_rowid,))
-        
-        new_records = mysql_cursor.fetchall()
-        
-        if new_records:
-            # Insert new records into FactSales
-            for record in new_records:
-                rowid, product_id, customer_id, quantity, price, timestamp = record
-                
-                # Simple dimension key lookups (for demo purposes)
-                date_key = timestamp.strftime('%Y%m%d') if timestamp else datetime.now().strftime('%Y%m%d')
-                category_key = (product_id % 5) + 1
-                country_key = (customer_id % 10) + 1
-                
-                postgres_cursor.execute("""
-                    INSERT INTO FactSales (rowid, product_id, customer_id, quantity, price, timestamp, date_key, category_key, country_key)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """, (rowid, product_id, customer_id, quantity, price, timestamp, date_key, category_key, country_key))
-            
-            postgres_conn.commit()
-            logger.info(f"Synchronized {len(new_records)} records to data warehouse")
-        else:
-            logger.info("No new records to synchronize")
-        
-        # Close connections
-        mysql_cursor.close()
-        mysql_conn.close()
-        postgres_cursor.close()
-        postgres_conn.close()
+        on_conflict = get_run_option(context, 'sales_on_conflict', SALES_ON_CONFLICT)
+        last_rowid = get_last_rowid()
+        records = itertools.chain.from_iterable(stream_latest_records(last_rowid))
+        insert_records(records, on_conflict=on_conflict,
+                       run_id=context.get('run_id') or datetime.now().isoformat())
+        logger.info(f"Synchronized sales data above rowid {last_rowid} to data warehouse")
         
     except Exception as e:
         logger.error(f"Error synchronizing sales data: {e}")
         raise
 
-def validate_data_warehouse():
+def validate_data_warehouse(**context):
     """Validate data warehouse integrity and generate summary statistics"""
+    full = get_run_option(context, 'validation_mode', VALIDATION_MODE) == 'full'
     try:
         postgres_conn = psycopg2.connect(**postgres_config)
         postgres_cursor = postgres_conn.cursor()
         
-        # Get record counts from each table
-        tables = ['DimDate', 'DimCategory', 'DimCountry', 'FactSales']
+        # Get record counts from each dimension table (small, bounded tables)
+        tables = ['DimDate', 'DimCategory', 'DimCountry']
         
         for table in tables:
             postgres_cursor.execute(f"SELECT COUNT(*) FROM {table}")
             count = postgres_cursor.fetchone()[0]
             logger.info(f"{table}: {count} records")
         
-        # Get latest sales data summary
-        postgres_cursor.execute("""
-            SELECT 
-                COUNT(*) as total_sales,
-                SUM(quantity) as total_quantity,
-                SUM(price * quantity) as total_revenue,
-                MAX(timestamp) as latest_sale
-            FROM FactSales
-        """)
-        
-        summary = postgres_cursor.fetchone()
-        logger.info(f"Sales Summary - Total Sales: {summary[0]}, Total Quantity: {summary[1]}, Total Revenue: {summary[2]}, Latest Sale: {summary[3]}")
+        # FactSales statistics come from the running aggregates in fact_summary;
+        # only rows loaded since the last refresh are scanned, unless a full
+        # reconciliation is requested or due
+        summary = validate_fact_summary(postgres_cursor, full=full)
+        if full:
+            # The rollups only see new rowids; rebuild them along with the summary
+            rebuild_sales_rollups(postgres_cursor)
+        postgres_conn.commit()
+        logger.info(f"FactSales: {summary['row_count']} records")
+        logger.info(f"Sales Summary - Total Sales: {summary['row_count']}, Total Quantity: {summary['quantity_sum']}, "
+                    f"Total Revenue: {summary['revenue_sum']}, Latest Sale: {summary['max_timestamp']}")
         
         postgres_cursor.close()
         postgres_conn.close()
@@ -0,0 +1,316 @@
+# Thread-based extract/transform/load pipeline for the sales synchronization.
+# Keyset ranges of the source delta are read by extract workers, resolved
+# against the dimension cache by transform workers and loaded by a single
+# writer, with bounded queues between the stages. A cap on batches in
+# flight makes a slow warehouse throttle the extractors instead of letting
+# memory grow. Every stage records how long it was busy, how long it waited
+# for input (starved by the stage before it) and for room in its output
+# queue (held back by the stage after it), plus the depth of its input
+# queue, so a run shows whether MySQL, Python or PostgreSQL is the
+# bottleneck of a deployment.
+
+import queue
+import logging
+import threading
+import time
+from datetime import datetime
+
+import automation
+from automation import (mysql_pool, postgres_pool, get_last_rowid, get_source_max_rowid, split_rowid_ranges,
+                        fetch_rowid_range, transform_batch, FactBatchLoader, DEFAULT_RANGE_SIZE,
+                        DEFAULT_LOAD_METHOD)
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Default stage concurrency; the load stage always has a single writer so
+# batches commit in rowid order, as the watermark and summaries require
+DEFAULT_EXTRACT_WORKERS = 2
+DEFAULT_TRANSFORM_WORKERS = 1
+
+# Batches buffered between two stages
+DEFAULT_QUEUE_SIZE = 4
+
+# Marks the end of the stream on a queue
+END_OF_STREAM = None
+
+# How often blocked workers check whether the pipeline was stopped
+POLL_INTERVAL = 0.1
+
+class StageMetrics:
+    """Batch, row, busy-time, queue-wait and input-queue-depth counters for one stage"""
+
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.batches = 0
+        self.rows = 0
+        self.busy_seconds = 0.0
+        self.input_wait_seconds = 0.0
+        self.output_wait_seconds = 0.0
+        self.depth_samples = 0
+        self.depth_total = 0
+        self.max_depth = 0
+        self._lock = threading.Lock()
+
+    def add(self, busy=0.0, input_wait=0.0, output_wait=0.0, rows=None, depth=None):
+        with self._lock:
+            self.busy_seconds += busy
+            self.input_wait_seconds += input_wait
+            self.output_wait_seconds += output_wait
+            if rows is not None:
+                self.batches += 1
+                self.rows += rows
+            if depth is not None:
+                self.depth_samples += 1
+                self.depth_total += depth
+                self.max_depth = max(self.max_depth, depth)
+
+    def summary(self, elapsed):
+        """Metrics as a dict; utilization is busy time over workers * elapsed"""
+        return {
+            'workers': self.workers,
+            'batches': self.batches,
+            'rows': self.rows,
+            'busy_seconds': round(self.busy_seconds, 3),
+            'input_wait_seconds': round(self.input_wait_seconds, 3),
+            'output_wait_seconds': round(self.output_wait_seconds, 3),
+            'avg_input_depth': round(self.depth_total / self.depth_samples, 2) if self.depth_samples else 0.0,
+            'max_input_depth': self.max_depth,
+            'utilization': round(self.busy_seconds / (self.workers * elapsed), 3) if elapsed else 0.0,
+        }
+
+class SalesPipeline:
+    """Bounded producer/consumer pipeline around range extraction, key lookup and batch loading"""
+
+    def __init__(self, extract_workers=DEFAULT_EXTRACT_WORKERS, transform_workers=DEFAULT_TRANSFORM_WORKERS,
+                 queue_size=DEFAULT_QUEUE_SIZE, range_size=DEFAULT_RANGE_SIZE, columnar=False,
+                 method=DEFAULT_LOAD_METHOD):
+        # Every worker holds a pooled connection; the pools are sized up front
+        # in automation.py and are not grown here
+        if extract_workers > mysql_pool.max_size or transform_workers + 1 > postgres_pool.max_size:
+            raise ValueError(f"{extract_workers} extract and {transform_workers} transform workers need "
+                             f"{extract_workers} MySQL and {transform_workers + 1} PostgreSQL connections, "
+                             f"the pools hold {mysql_pool.max_size} and {postgres_pool.max_size} "
+                             f"(automation.MYSQL_POOL_SIZE, POSTGRES_POOL_SIZE)")
+        self.extract_workers = extract_workers
+        self.transform_workers = transform_workers
+        self.queue_size = queue_size
+        self.range_size = range_size
+        self.columnar = columnar
+        self.method = method
+        self.metrics = {
+            'extract': StageMetrics('extract', extract_workers),
+            'transform': StageMetrics('transform', transform_workers),
+            'load': StageMetrics('load', 1),
+        }
+        self._extracted = queue.Queue(maxsize=queue_size)
+        self._transformed = queue.Queue(maxsize=queue_size)
+        # Every batch holds a slot from range assignment until it is committed,
+        # which bounds memory even while the writer reorders batches
+        self._in_flight = threading.BoundedSemaphore(2 * queue_size + extract_workers + transform_workers)
+        self._ranges = iter(())
+        self._ranges_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._errors = []
+
+    def _put(self, output, item):
+        """Put with backpressure; returns the seconds spent waiting, or None if stopped"""
+        start = time.perf_counter()
+        while not self._stop.is_set():
+            try:
+                output.put(item, timeout=POLL_INTERVAL)
+                return time.perf_counter() - start
+            except queue.Full:
+                continue
+        return None
+
+    def _get(self, source):
+        """Get the next item; returns (item, seconds waited, depth left), or None if stopped"""
+        start = time.perf_counter()
+        while not self._stop.is_set():
+            try:
+                item = source.get(timeout=POLL_INTERVAL)
+                return item, time.perf_counter() - start, source.qsize()
+            except queue.Empty:
+                continue
+        return None
+
+    def _acquire_slot(self):
+        while not self._stop.is_set():
+            if self._in_flight.acquire(timeout=POLL_INTERVAL):
+                return True
+        return False
+
+    def _run_worker(self, target):
+        try:
+            target()
+        except Exception as e:
+            logger.error(f"{threading.current_thread().name} failed: {e}")
+            self._errors.append(e)
+            self._stop.set()
+
+    def _extract(self):
+        metrics = self.metrics['extract']
+        while True:
+            wait_start = time.perf_counter()
+            if not self._acquire_slot():
+                return
+            with self._ranges_lock:
+                item = next(self._ranges, None)
+            if item is None:
+                self._in_flight.release()
+                return
+            # Waiting for an in-flight slot is backpressure from later stages
+            slot_wait = time.perf_counter() - wait_start
+
+            seq, bounds = item
+            start = time.perf_counter()
+            records = fetch_rowid_range(bounds)
+            busy = time.perf_counter() - start
+
+            output_wait = self._put(self._extracted, (seq, records))
+            metrics.add(busy=busy, output_wait=slot_wait + (output_wait or 0.0), rows=len(records))
+            if output_wait is None:
+                return
+
+    def _transform(self):
+        metrics = self.metrics['transform']
+        with postgres_pool.connection() as postgres_conn:
+            cursor = postgres_conn.cursor()
+            resolver = None
+            while True:
+                got = self._get(self._extracted)
+                if got is None:
+                    return
+                (item, input_wait, depth) = got
+                if item is END_OF_STREAM:
+                    break
+                seq, records = item
+
+                start = time.perf_counter()
+                if records:
+                    transformed, batch_max_rowid, resolver = transform_batch(cursor, records, self.columnar, resolver)
+                    result = (seq, transformed, batch_max_rowid, len(records), start)
+                else:
+                    result = (seq, None, None, 0, start)
+                busy = time.perf_counter() - start
+
+                output_wait = self._put(self._transformed, result)
+                metrics.add(busy=busy, input_wait=input_wait, output_wait=output_wait or 0.0,
+                            rows=len(records), depth=depth)
+                if output_wait is None:
+                    return
+            cursor.close()
+
+    def _load(self, run_id):
+        metrics = self.metrics['load']
+        pending = {}
+        next_seq = 0
+        with postgres_pool.connection() as postgres_conn:
+            loader = FactBatchLoader(postgres_conn, run_id, method=self.method)
+            while True:
+                got = self._get(self._transformed)
+                if got is None:
+                    return
+                (item, input_wait, depth) = got
+                if item is END_OF_STREAM:
+                    break
+                pending[item[0]] = item
+
+                # Commit strictly in range order; later ranges wait in pending
+                start = time.perf_counter()
+                while next_seq in pending:
+                    _, transformed, batch_max_rowid, rows, started = pending.pop(next_seq)
+                    if rows:
+                        loader.load(transformed, batch_max_rowid, rows, started)
+                    self._in_flight.release()
+                    next_seq += 1
+                metrics.add(busy=time.perf_counter() - start, input_wait=input_wait, depth=depth)
+            loader.close()
+            if pending:
+                raise RuntimeError(f"Pipeline ended with {len(pending)} batches not loaded")
+            metrics.rows = loader.loaded
+            metrics.batches = next_seq
+
+    def _start(self, name, count, target):
+        threads = [threading.Thread(target=self._run_worker, args=(target,), name=f'{name}-{i}', daemon=True)
+                   for i in range(count)]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def _finish(self, threads, output, sentinels):
+        """Wait for a stage's threads, then tell the next stage the stream has ended"""
+        for thread in threads:
+            thread.join()
+        for _ in range(sentinels):
+            if self._put(output, END_OF_STREAM) is None:
+                break
+
+    def run(self, last_rowid, run_id=None):
+        """Synchronize the source rows above last_rowid; returns the number of rows loaded"""
+        run_id = run_id or datetime.now().strftime('pipeline_%Y%m%dT%H%M%S')
+        max_rowid = get_source_max_rowid()
+        ranges = split_rowid_ranges(last_rowid, max_rowid, self.range_size)
+        self._ranges = iter(enumerate(ranges))
+        logger.info(f"Pipelining rowids ({last_rowid}, {max_rowid}] as {len(ranges)} ranges with "
+                    f"{self.extract_workers} extract and {self.transform_workers} transform workers")
+
+        # The cache is loaded once up front so transform workers only ever refresh it
+        if not automation.dimension_cache.loaded:
+            with postgres_pool.connection() as postgres_conn:
+                automation.dimension_cache.load_from_warehouse(postgres_conn.cursor())
+
+        start = time.perf_counter()
+        loaders = self._start('load', 1, lambda: self._load(run_id))
+        transformers = self._start('transform', self.transform_workers, self._transform)
+        extractors = self._start('extract', self.extract_workers, self._extract)
+
+        self._finish(extractors, self._extracted, self.transform_workers)
+        self._finish(transformers, self._transformed, 1)
+        self._finish(loaders, None, 0)
+        self.elapsed = time.perf_counter() - start
+
+        if self._errors:
+            raise self._errors[0]
+        self.log_metrics()
+        return self.metrics['load'].rows
+
+    def stage_summaries(self):
+        return {name: metrics.summary(self.elapsed) for name, metrics in self.metrics.items()}
+
+    def log_metrics(self):
+        """Log per-stage metrics and name the busiest stage"""
+        summaries = self.stage_summaries()
+        for name, summary in summaries.items():
+            logger.info(f"{name:>9}: {summary['workers']} workers, {summary['batches']} batches, "
+                        f"busy {summary['busy_seconds']:.2f}s ({summary['utilization']:.0%}), "
+                        f"waited {summary['input_wait_seconds']:.2f}s for input and "
+                        f"{summary['output_wait_seconds']:.2f}s for output, "
+                        f"input queue depth avg {summary['avg_input_depth']} max {summary['max_input_depth']}")
+        bottleneck = max(summaries, key=lambda name: summaries[name]['utilization'])
+        logger.info(f"Bottleneck: {bottleneck} stage ({summaries[bottleneck]['utilization']:.0%} busy)")
+
+def synchronize_data_pipelined(extract_workers=DEFAULT_EXTRACT_WORKERS, transform_workers=DEFAULT_TRANSFORM_WORKERS,
+                               queue_size=DEFAULT_QUEUE_SIZE, range_size=DEFAULT_RANGE_SIZE, columnar=False,
+                               method=DEFAULT_LOAD_METHOD):
+    """Pipelined counterpart of automation.synchronize_data; returns the SalesPipeline with its metrics"""
+    try:
+        logger.info("Starting pipelined ETL synchronization process")
+        pipeline = SalesPipeline(extract_workers, transform_workers, queue_size, range_size, columnar, method)
+        loaded = pipeline.run(get_last_rowid())
+        logger.info(f"ETL synchronization completed: {loaded} records in {pipeline.elapsed:.2f}s "
+                    f"({loaded / pipeline.elapsed if pipeline.elapsed else 0.0:,.0f} rows/sec)")
+        return pipeline
+    except Exception as e:
+        logger.error(f"Pipelined ETL synchronization failed: {e}")
+        raise
+    finally:
+        for pool in (mysql_pool, postgres_pool):
+            logger.info(f"{pool.name} pool: {pool.stats['opened']} opened, {pool.stats['reused']} reused")
+
+# Main execution
+if __name__ == "__main__":
+    synchronize_data_pipelined()
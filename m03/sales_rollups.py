@@ -0,0 +1,245 @@
+# Pre-aggregated FactSales rollup tables (MQT style) for reporting.
+# The synchronization folds every loaded batch into three summary tables in
+# the same transaction as the batch:
+#   sales_rollup_quarterly        - per year and quarter
+#   sales_rollup_country_category - per country and category
+#   sales_rollup_daily            - per sale date, category and country
+# Only rows above the rowid recorded in sales_rollup_state are aggregated,
+# so maintenance cost follows the batch size; rows changed in place (binlog
+# CDC) are subtracted and re-added by rowid. rollup_report() answers the
+# grouping sets / rollup / cube reports of the Module 02 reporting lab from
+# the smallest table that covers the requested columns; those tables grow
+# with the dimensions, not with FactSales.
+
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Rows without a category or country key are grouped under this key
+UNKNOWN_KEY = 0
+
+# Rollup tables, smallest first: name -> (key column, SQL type, expression over FactSales)
+ROLLUP_TABLES = {
+    'sales_rollup_quarterly': (
+        ('year', 'INTEGER', 'EXTRACT(YEAR FROM timestamp)::integer'),
+        ('quarter', 'INTEGER', 'EXTRACT(QUARTER FROM timestamp)::integer'),
+    ),
+    'sales_rollup_country_category': (
+        ('country_key', 'INTEGER', f'COALESCE(country_key, {UNKNOWN_KEY})'),
+        ('category_key', 'INTEGER', f'COALESCE(category_key, {UNKNOWN_KEY})'),
+    ),
+    'sales_rollup_daily': (
+        ('sale_date', 'DATE', 'timestamp::date'),
+        ('category_key', 'INTEGER', f'COALESCE(category_key, {UNKNOWN_KEY})'),
+        ('country_key', 'INTEGER', f'COALESCE(country_key, {UNKNOWN_KEY})'),
+    ),
+}
+
+CREATE_ROLLUP_STATE_SQL = """
+CREATE TABLE IF NOT EXISTS sales_rollup_state (
+    fact_table VARCHAR(100) PRIMARY KEY,
+    max_rowid BIGINT NOT NULL DEFAULT 0,
+    rebuilt_at TIMESTAMP,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+def create_rollup_table_sql(table):
+    keys = ROLLUP_TABLES[table]
+    columns = ",\n    ".join(f"{column} {sql_type} NOT NULL" for column, sql_type, _ in keys)
+    return f"""
+CREATE TABLE IF NOT EXISTS {table} (
+    {columns},
+    row_count BIGINT NOT NULL,
+    quantity_sum BIGINT NOT NULL,
+    revenue_sum NUMERIC(20,2) NOT NULL,
+    PRIMARY KEY ({', '.join(column for column, _, _ in keys)})
+)
+"""
+
+CREATE_ROLLUP_TABLES_SQL = (CREATE_ROLLUP_STATE_SQL,) + tuple(create_rollup_table_sql(table) for table in ROLLUP_TABLES)
+
+# Report columns: name -> {rollup table: SQL expression}
+REPORT_COLUMNS = {
+    'date': {'sales_rollup_daily': "r.sale_date"},
+    'year': {'sales_rollup_quarterly': "r.year",
+             'sales_rollup_daily': "EXTRACT(YEAR FROM r.sale_date)::integer"},
+    'quarter': {'sales_rollup_quarterly': "r.quarter",
+                'sales_rollup_daily': "EXTRACT(QUARTER FROM r.sale_date)::integer"},
+    'month': {'sales_rollup_daily': "EXTRACT(MONTH FROM r.sale_date)::integer"},
+    'category': {'sales_rollup_country_category': "COALESCE(cat.category, 'Unknown')",
+                 'sales_rollup_daily': "COALESCE(cat.category, 'Unknown')"},
+    'country': {'sales_rollup_country_category': "COALESCE(cty.country, 'Unknown')",
+                'sales_rollup_daily': "COALESCE(cty.country, 'Unknown')"},
+}
+
+REPORT_JOINS = {
+    'category': "LEFT JOIN DimCategory cat ON cat.categoryid = r.category_key",
+    'country': "LEFT JOIN DimCountry cty ON cty.countryid = r.country_key",
+}
+
+REPORT_MEASURES = {
+    'sales_count': "SUM(r.row_count)",
+    'total_quantity': "SUM(r.quantity_sum)",
+    'total_sales': "SUM(r.revenue_sum)",
+    'average_sales': "ROUND(SUM(r.revenue_sum) / NULLIF(SUM(r.row_count), 0), 2)",
+}
+
+# 'group by' is a plain aggregation, the others add subtotal rows
+REPORT_GROUPINGS = ('group by', 'grouping sets', 'rollup', 'cube')
+
+def ensure_rollup_tables(postgres_cursor):
+    """Create the rollup tables and their state table if they do not exist yet"""
+    for create_sql in CREATE_ROLLUP_TABLES_SQL:
+        postgres_cursor.execute(create_sql)
+
+def lock_rollup_state(postgres_cursor, fact_table='FactSales'):
+    """Lock the rollup state row for the transaction and return its max_rowid"""
+    postgres_cursor.execute("SELECT max_rowid FROM sales_rollup_state WHERE fact_table = %s FOR UPDATE",
+                            (fact_table,))
+    row = postgres_cursor.fetchone()
+    if row is None:
+        raise RuntimeError(f"Rollups for {fact_table} are not initialized; call ensure_sales_rollups first")
+    return row[0]
+
+def fold_into_rollups(postgres_cursor, condition, params, sign=1, fact_table='FactSales'):
+    """Add (sign=1) or subtract (sign=-1) the fact rows matching condition in every rollup table
+
+    The matching rows are read once and aggregated into all tables by a
+    single statement. Returns (row count, max rowid) of the matching rows.
+    """
+    if sign not in (1, -1):
+        raise ValueError(f"sign must be 1 or -1, got {sign!r}")
+    upserts = []
+    for table, keys in ROLLUP_TABLES.items():
+        columns = ', '.join(column for column, _, _ in keys)
+        upserts.append(f"""
+        {table} AS (
+            INSERT INTO {table} ({columns}, row_count, quantity_sum, revenue_sum)
+            SELECT {', '.join(expression for _, _, expression in keys)}, {sign} * COUNT(*), SUM(quantity), SUM(revenue)
+            FROM delta
+            GROUP BY {', '.join(str(i) for i in range(1, len(keys) + 1))}
+            ON CONFLICT ({columns}) DO UPDATE SET
+                row_count = {table}.row_count + EXCLUDED.row_count,
+                quantity_sum = {table}.quantity_sum + EXCLUDED.quantity_sum,
+                revenue_sum = {table}.revenue_sum + EXCLUDED.revenue_sum
+        )""")
+    postgres_cursor.execute(f"""
+        WITH delta AS (
+            SELECT rowid, timestamp, category_key, country_key,
+                   {sign} * quantity AS quantity, {sign} * price * quantity AS revenue
+            FROM {fact_table}
+            WHERE {condition}
+        ),{','.join(upserts)}
+        SELECT COUNT(*), MAX(rowid) FROM delta
+    """, params)
+    return postgres_cursor.fetchone()
+
+def refresh_sales_rollups(postgres_cursor, through_rowid=None, fact_table='FactSales'):
+    """Fold fact rows above the recorded rowid (up to through_rowid) into every rollup table
+
+    Call inside the transaction that loaded the rows. The state row is
+    locked first, so concurrent refreshes never count the same rows twice.
+    Returns the number of fact rows added.
+    """
+    from_rowid = lock_rollup_state(postgres_cursor, fact_table)
+    upper_bound = "AND rowid <= %(through_rowid)s" if through_rowid is not None else ""
+    added, max_rowid = fold_into_rollups(postgres_cursor, f"rowid > %(from_rowid)s {upper_bound}",
+                                         {'from_rowid': from_rowid, 'through_rowid': through_rowid},
+                                         fact_table=fact_table)
+    if added:
+        postgres_cursor.execute("""
+            UPDATE sales_rollup_state SET max_rowid = %s, updated_at = CURRENT_TIMESTAMP
+            WHERE fact_table = %s
+        """, (max_rowid, fact_table))
+    return added
+
+def adjust_sales_rollups(postgres_cursor, rowids, sign, fact_table='FactSales'):
+    """Add (sign=1) or subtract (sign=-1) the current fact rows with the given rowids
+
+    Used when rows are updated or deleted in place: subtract the old
+    versions before changing them and add the new versions afterwards.
+    Only rows at or below the recorded rowid are in the rollups, so rows
+    above it are left to refresh_sales_rollups. Returns the rows adjusted.
+    """
+    max_rowid = lock_rollup_state(postgres_cursor, fact_table)
+    rowids = list(rowids)
+    if not rowids or min(rowids) > max_rowid:
+        return 0
+    adjusted, _ = fold_into_rollups(postgres_cursor, "rowid = ANY(%(rowids)s) AND rowid <= %(max_rowid)s",
+                                    {'rowids': rowids, 'max_rowid': max_rowid}, sign, fact_table)
+    if adjusted and sign < 0:
+        for table in ROLLUP_TABLES:
+            postgres_cursor.execute(f"DELETE FROM {table} WHERE row_count = 0")
+    return adjusted
+
+def rebuild_sales_rollups(postgres_cursor, fact_table='FactSales'):
+    """Recompute every rollup table from a full scan of the fact table
+
+    Needed once to bootstrap the tables and after rows are updated or
+    deleted outside the ETL, which the rowid-based refresh cannot see.
+    """
+    ensure_rollup_tables(postgres_cursor)
+    postgres_cursor.execute("""
+        INSERT INTO sales_rollup_state (fact_table, max_rowid, rebuilt_at) VALUES (%s, 0, CURRENT_TIMESTAMP)
+        ON CONFLICT (fact_table) DO UPDATE SET max_rowid = 0, rebuilt_at = CURRENT_TIMESTAMP
+    """, (fact_table,))
+    postgres_cursor.execute(f"TRUNCATE {', '.join(ROLLUP_TABLES)}")
+    added = refresh_sales_rollups(postgres_cursor, fact_table=fact_table)
+    logger.info(f"Rebuilt sales rollups from {added} {fact_table} rows")
+    return added
+
+def ensure_sales_rollups(postgres_cursor, fact_table='FactSales'):
+    """Create the rollup tables and bootstrap them with one full scan if needed"""
+    ensure_rollup_tables(postgres_cursor)
+    postgres_cursor.execute("SELECT 1 FROM sales_rollup_state WHERE fact_table = %s", (fact_table,))
+    if postgres_cursor.fetchone() is None:
+        rebuild_sales_rollups(postgres_cursor, fact_table)
+
+def choose_rollup_table(columns):
+    """Return the smallest rollup table that has every requested report column"""
+    for table in ROLLUP_TABLES:
+        if all(table in REPORT_COLUMNS[column] for column in columns):
+            return table
+    raise ValueError(f"No rollup table covers the columns {list(columns)}")
+
+def rollup_report_sql(columns, grouping='rollup', measures=('total_sales',)):
+    """Build the report query for rollup_report"""
+    unknown = [column for column in columns if column not in REPORT_COLUMNS]
+    if unknown or not columns:
+        raise ValueError(f"Report columns must be a non-empty subset of {sorted(REPORT_COLUMNS)}, got {list(columns)}")
+    unknown = [measure for measure in measures if measure not in REPORT_MEASURES]
+    if unknown or not measures:
+        raise ValueError(f"Report measures must be a non-empty subset of {sorted(REPORT_MEASURES)}, got {list(measures)}")
+    if grouping not in REPORT_GROUPINGS:
+        raise ValueError(f"Unknown grouping {grouping!r}; expected one of {REPORT_GROUPINGS}")
+
+    table = choose_rollup_table(columns)
+    expressions = [REPORT_COLUMNS[column][table] for column in columns]
+    joins = [REPORT_JOINS[column] for column in REPORT_JOINS if column in columns]
+    select = ', '.join([f"{expression} AS {column}" for expression, column in zip(expressions, columns)] +
+                       [f"{REPORT_MEASURES[measure]} AS {measure}" for measure in measures])
+    if grouping == 'group by':
+        group_by = ', '.join(expressions)
+    elif grouping == 'grouping sets':
+        group_by = f"GROUPING SETS ({', '.join(expressions)})"
+    else:
+        group_by = f"{grouping.upper()} ({', '.join(expressions)})"
+    order_by = ', '.join(f"{column} NULLS LAST" for column in columns)
+    return f"SELECT {select} FROM {table} r {' '.join(joins)} GROUP BY {group_by} ORDER BY {order_by}"
+
+def rollup_report(postgres_cursor, columns, grouping='rollup', measures=('total_sales',)):
+    """Answer a grouping sets / rollup / cube report from the rollup tables
+
+    columns are report columns ('date', 'year', 'quarter', 'month',
+    'category', 'country') and measures any of 'sales_count',
+    'total_quantity', 'total_sales' and 'average_sales'. Returns rows of
+    the column values followed by the measures; subtotal rows have None in
+    the rolled-up columns, e.g.
+    rollup_report(cursor, ['year', 'country'], 'rollup') is the lab's
+    rollup query on year, country and total sales.
+    """
+    postgres_cursor.execute(rollup_report_sql(columns, grouping, measures))
+    return postgres_cursor.fetchall()
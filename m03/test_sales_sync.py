@@ -0,0 +1,930 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the sales synchronization helpers
+Commit policies, rowid range splitting and the SQL builders are checked
+without a database; tests of automation.py and binlog_cdc.py are skipped when the MySQL,
+PostgreSQL or replication drivers are not installed
+"""
+
+import os
+import sys
+import time
+import itertools
+import threading
+from datetime import date, datetime
+from types import SimpleNamespace
+
+import pytest
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from commit_policy import CommitPolicy, percentile, record_size, ADAPTIVE_START_ROWS
+from sales_rollups import rollup_report_sql, choose_rollup_table
+from dimension_cache import DimensionCache, CATEGORY_BUCKETS, category_id, country_id
+
+@pytest.fixture(scope='module')
+def automation():
+    # automation.py imports mysql.connector and psycopg2 at module level
+    return pytest.importorskip('automation')
+
+def sales_record(rowid):
+    return (rowid, 100 + rowid, 200 + rowid, 3, 19.99, None)
+
+def commit_all(policy, records, seconds=0.01):
+    """Consume policy.batches() the way insert_records does, returning the batch sizes"""
+    sizes = []
+    for batch in policy.batches(records):
+        sizes.append(len(batch))
+        policy.record(len(batch), seconds)
+    return sizes
+
+def test_commit_policy_from_spec():
+    assert CommitPolicy.from_spec('rows:5000').rows == 5000
+    assert CommitPolicy.from_spec('bytes:4000000').max_bytes == 4000000
+    assert CommitPolicy.from_spec('seconds:2').seconds == 2.0
+    adaptive = CommitPolicy.from_spec('adaptive:0.25')
+    assert adaptive.target_latency == 0.25
+    assert adaptive.rows == ADAPTIVE_START_ROWS
+
+@pytest.mark.parametrize('spec', ['rows', 'rows:', 'lines:10', ':5', ''])
+def test_commit_policy_from_spec_rejects_invalid(spec):
+    with pytest.raises(ValueError):
+        CommitPolicy.from_spec(spec)
+
+def test_commit_policy_needs_a_limit():
+    with pytest.raises(ValueError):
+        CommitPolicy()
+
+def test_row_policy_batches():
+    policy = CommitPolicy(rows=4)
+    assert commit_all(policy, (sales_record(rowid) for rowid in range(10))) == [4, 4, 2]
+    assert policy.committed_rows == 10
+    assert len(policy.latencies) == 3
+
+def test_byte_policy_batches():
+    size = record_size(sales_record(1))
+    policy = CommitPolicy(max_bytes=size * 3)
+    assert commit_all(policy, [sales_record(rowid) for rowid in range(1, 8)]) == [3, 3, 1]
+    # The smaller of a row and a byte limit wins
+    assert commit_all(CommitPolicy(rows=2, max_bytes=size * 3), [sales_record(1)] * 5) == [2, 2, 1]
+
+def test_time_policy_ends_batches_after_the_interval():
+    def slow_records():
+        for rowid in range(4):
+            time.sleep(0.02)
+            yield sales_record(rowid)
+
+    assert commit_all(CommitPolicy(seconds=0.01), slow_records()) == [1, 1, 1, 1]
+
+def test_adaptive_policy_resizes_within_bounds():
+    policy = CommitPolicy(target_latency=1.0, min_rows=10, max_rows=1000)
+    policy.rows = 100
+    policy.record(100, 0.25)
+    assert policy.rows == 200  # at most doubled
+    policy.record(200, 10.0)
+    assert policy.rows == 100  # at most halved
+    policy.record(100, 2.0)
+    assert policy.rows == 50
+    policy.record(50, 0.0)
+    assert policy.rows == 100
+    policy.rows = 900
+    policy.record(900, 0.1)
+    assert policy.rows == 1000
+    policy.rows = 15
+    policy.record(15, 5.0)
+    assert policy.rows == 10
+
+def test_percentile_nearest_rank():
+    assert percentile([], 99) == 0.0
+    assert percentile([5.0], 50) == 5.0
+    values = [float(value) for value in range(1, 101)]
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 99) == 99.0
+    assert percentile(values, 100) == 100.0
+    assert percentile([3.0, 1.0, 2.0], 50) == 2.0
+
+def test_commit_policy_summary():
+    policy = CommitPolicy(rows=5)
+    for seconds in (0.1, 0.2, 0.3):
+        policy.record(5, seconds)
+    summary = policy.summary(elapsed=3.0)
+    assert summary['commits'] == 3
+    assert summary['rows'] == 15
+    assert summary['rows_per_second'] == 5.0
+    assert summary['p50_commit_seconds'] == 0.2
+    assert summary['p99_commit_seconds'] == 0.3
+    assert summary['max_commit_seconds'] == 0.3
+    assert summary['policy'] == '5 rows'
+
+def test_split_rowid_ranges(automation):
+    assert automation.split_rowid_ranges(0, 10, 4) == [(0, 4), (4, 8), (8, 10)]
+    assert automation.split_rowid_ranges(5, 5, 4) == []
+    assert automation.split_rowid_ranges(10, 5, 4) == []
+    assert automation.split_rowid_ranges(0, 8, 4) == [(0, 4), (4, 8)]
+    assert automation.split_rowid_ranges(7, 8, 100) == [(7, 8)]
+
+def test_on_conflict_clause(automation):
+    assert automation.on_conflict_clause('nothing') == "ON CONFLICT (rowid) DO NOTHING"
+    assert (automation.on_conflict_clause('nothing', automation.conflict_columns(True))
+            == "ON CONFLICT (rowid, timestamp) DO NOTHING")
+
+    clause = automation.on_conflict_clause('update', automation.conflict_columns(True))
+    assert clause.startswith("ON CONFLICT (rowid, timestamp) DO UPDATE SET product_id = EXCLUDED.product_id, ")
+    assert "rowid = EXCLUDED" not in clause and "timestamp = EXCLUDED" not in clause
+    assert clause.endswith("WHERE (target.product_id, target.customer_id, target.quantity, target.price, "
+                           "target.date_key, target.category_key, target.country_key) IS DISTINCT FROM "
+                           "(EXCLUDED.product_id, EXCLUDED.customer_id, EXCLUDED.quantity, EXCLUDED.price, "
+                           "EXCLUDED.date_key, EXCLUDED.category_key, EXCLUDED.country_key)")
+
+    with pytest.raises(ValueError):
+        automation.on_conflict_clause('replace')
+
+def test_choose_rollup_table():
+    assert choose_rollup_table(['year', 'quarter']) == 'sales_rollup_quarterly'
+    assert choose_rollup_table(['country', 'category']) == 'sales_rollup_country_category'
+    assert choose_rollup_table(['year', 'country']) == 'sales_rollup_daily'
+    assert choose_rollup_table(['date']) == 'sales_rollup_daily'
+
+def test_rollup_report_sql():
+    assert rollup_report_sql(['year', 'quarter']) == (
+        "SELECT r.year AS year, r.quarter AS quarter, SUM(r.revenue_sum) AS total_sales "
+        "FROM sales_rollup_quarterly r  GROUP BY ROLLUP (r.year, r.quarter) "
+        "ORDER BY year NULLS LAST, quarter NULLS LAST")
+
+    sql = rollup_report_sql(['country', 'category'], 'cube', ('sales_count', 'average_sales'))
+    assert sql.startswith("SELECT COALESCE(cty.country, 'Unknown') AS country, "
+                          "COALESCE(cat.category, 'Unknown') AS category, SUM(r.row_count) AS sales_count, ")
+    assert "FROM sales_rollup_country_category r " in sql
+    assert "LEFT JOIN DimCategory cat ON cat.categoryid = r.category_key" in sql
+    assert "LEFT JOIN DimCountry cty ON cty.countryid = r.country_key" in sql
+    assert "GROUP BY CUBE (COALESCE(cty.country, 'Unknown'), COALESCE(cat.category, 'Unknown'))" in sql
+
+    assert "GROUP BY GROUPING SETS (r.year)" in rollup_report_sql(['year'], 'grouping sets')
+    assert "GROUP BY r.sale_date ORDER BY" in rollup_report_sql(['date'], 'group by')
+
+@pytest.mark.parametrize('columns, grouping, measures', [
+    ([], 'rollup', ('total_sales',)),
+    (['week'], 'rollup', ('total_sales',)),
+    (['year'], 'rollup', ()),
+    (['year'], 'rollup', ('median_sales',)),
+    (['year'], 'pivot', ('total_sales',)),
+])
+def test_rollup_report_sql_rejects_invalid(columns, grouping, measures):
+    with pytest.raises(ValueError):
+        rollup_report_sql(columns, grouping, measures)
+
+class FailingPool:
+    """Stands in for a connection pool whose database is unreachable"""
+    name = 'PostgreSQL'
+
+    def connection(self, timeout=None):
+        raise ConnectionError("connection refused")
+
+def test_get_last_rowid_raises_on_connection_failure(automation, monkeypatch):
+    monkeypatch.setattr(automation, 'postgres_pool', FailingPool())
+    with pytest.raises(ConnectionError):
+        automation.get_last_rowid()
+
+class DimensionCursor:
+    """Fake warehouse cursor serving DimDate, DimCategory and DimCountry rows above a given id"""
+
+    def __init__(self, dates, categories, countries):
+        self.tables = {'DimDate': dates, 'DimCategory': categories, 'DimCountry': countries}
+        self.queries = 0
+        self.rows = []
+
+    def execute(self, sql, params):
+        self.queries += 1
+        table = sql.split(' FROM ')[1].split()[0]
+        self.rows = [row for row in self.tables[table] if row[0] > params[0]]
+
+    def fetchall(self):
+        return self.rows
+
+def dimension_cursor(categories=4, countries=56):
+    return DimensionCursor([(1, date(2024, 1, 1)), (2, date(2024, 1, 2))],
+                           [(categoryid, f"category {categoryid}") for categoryid in range(1, categories + 1)],
+                           [(countryid, f"country {countryid}") for countryid in range(1, countries + 1)])
+
+def test_dimension_keys_stay_fixed_when_a_category_is_added():
+    cursor = dimension_cursor()
+    cache = DimensionCache()
+    cache.load_from_warehouse(cursor)
+    records = [(rowid, product_id, 60 + product_id, 1, 1.0, datetime(2024, 1, 1, 12))
+               for rowid, product_id in enumerate(range(10))]
+    before = cache.resolve_batch(records, cursor)
+    assert [key[1] for key in before] == [category_id(product_id) for product_id in range(10)]
+
+    cursor.tables['DimCategory'].append((5, 'category 5'))
+    cache.refresh(cursor)
+    assert cache.resolve_batch(records, cursor) == before
+
+def test_unknown_category_refreshes_once():
+    cursor = dimension_cursor(categories=3)
+    cache = DimensionCache()
+    cache.load_from_warehouse(cursor)
+    record = (1, CATEGORY_BUCKETS - 1, 0, 1, 1.0, datetime(2024, 1, 2))  # category id 4 is not loaded
+
+    queries = cursor.queries
+    assert cache.resolve_batch([record], cursor) == [(2, None, country_id(0))]
+    assert cursor.queries == queries + 3  # one refresh of all three dimensions
+    assert cache.resolve_batch([record], cursor) == [(2, None, country_id(0))]
+    assert cursor.queries == queries + 3  # still missing: no second refresh
+
+    cursor.tables['DimCategory'].append((4, 'category 4'))
+    cursor.tables['DimDate'].append((3, date(2024, 1, 3)))
+    later = (2, CATEGORY_BUCKETS - 1, 0, 1, 1.0, datetime(2024, 1, 3))
+    assert cache.resolve_batch([record, later], cursor) == [(2, 4, country_id(0)), (3, 4, country_id(0))]
+
+def test_columnar_keys_match_row_keys():
+    pytest.importorskip('numpy')
+    from columnar_transform import ColumnarKeyResolver, records_to_columns, MISSING_KEY
+
+    cursor = dimension_cursor(categories=3, countries=50)
+    cache = DimensionCache()
+    cache.load_from_warehouse(cursor)
+    records = [(rowid, rowid * 7, rowid * 13, 1, 1.0, datetime(2024, 1, 1 + rowid % 3)) for rowid in range(200)]
+    columns = ColumnarKeyResolver(cache).resolve(records_to_columns(records))
+    columnar = list(zip(*(columns[key].tolist() for key in ('date_key', 'category_key', 'country_key'))))
+    rows = [tuple(MISSING_KEY if key is None else key for key in keys) for keys in cache.resolve_batch(records)]
+    assert columnar == rows
+
+def test_columnar_keeps_null_timestamps():
+    pytest.importorskip('numpy')
+    from columnar_transform import records_to_columns, columns_to_rows, columns_to_csv
+
+    loaded = datetime(2024, 1, 2, 3, 4, 5)
+    columns = records_to_columns([(1, 2, 3, 4, 5.5, loaded), (2, 2, 3, 4, 5.5, None)])
+    assert columns_to_rows(columns, ['rowid', 'timestamp']) == [(1, loaded), (2, None)]
+    assert columns_to_csv(columns, ['rowid', 'timestamp']).read() == "1,2024-01-02T03:04:05\n2,\n"
+
+def test_columnar_rows_match_row_transform(automation, monkeypatch):
+    pytest.importorskip('numpy')
+    from columnar_transform import ColumnarKeyResolver, records_to_columns, columns_to_rows
+
+    cursor = dimension_cursor()
+    cache = DimensionCache()
+    cache.load_from_warehouse(cursor)
+    monkeypatch.setattr(automation, 'dimension_cache', cache)
+    records = [(1, 5, 7, 2, 9.5, datetime(2024, 1, 1, 8)), (2, 6, 8, 1, 3.25, datetime(2024, 1, 2, 9)),
+               (3, 7, 9, 4, 1.0, None)]
+    rows = [automation.fact_row(record) for record in automation.lookup_dimension_keys(None, records)]
+    columns = ColumnarKeyResolver(cache).resolve(records_to_columns(records))
+    assert columns_to_rows(columns, automation.FACT_COLUMNS) == rows
+
+@pytest.fixture(scope='module')
+def binlog_cdc():
+    pytest.importorskip('pymysqlreplication')
+    return pytest.importorskip('binlog_cdc')
+
+def rows_event(event_class, rows):
+    """A rows event carrying already decoded rows, without a binlog packet behind it"""
+    fake_class = type(event_class.__name__, (event_class,), {'__init__': lambda self: None, 'rows': None})
+    event = fake_class()
+    event.rows = rows
+    return event
+
+def source_values(rowid, quantity=1):
+    return {'rowid': rowid, 'product_id': 10 + rowid, 'customer_id': 20 + rowid, 'quantity': quantity,
+            'price': 2.5, 'timestamp': datetime(2024, 1, 1, rowid)}
+
+def binlog_cdc_record(rowid, quantity=1):
+    from binlog_cdc import source_record
+    return source_record(source_values(rowid, quantity))
+
+class FactCursor:
+    """Cursor over an in-memory set of FactSales rowids that records the SQL it runs"""
+
+    def __init__(self, rowids=()):
+        self.rowids = set(rowids)
+        self.statements = []
+        self.result = []
+
+    def execute(self, sql, params=None):
+        self.statements.append((' '.join(sql.split()), params))
+        if sql.startswith('DELETE'):
+            self.result = [(rowid,) for rowid in params[0] if rowid in self.rowids]
+            self.rowids.difference_update(params[0])
+
+    def fetchall(self):
+        return self.result
+
+    def close(self):
+        pass
+
+class FactConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.commits = 0
+
+    def cursor(self):
+        return self._cursor
+
+    def commit(self):
+        self.commits += 1
+
+@pytest.fixture
+def cdc_applier(binlog_cdc, monkeypatch):
+    """A BinlogApplier over FactCursor with the warehouse helpers replaced by recorders"""
+    calls = {'loaded': [], 'watermark': [], 'position': [], 'adjust': []}
+    cursor = FactCursor(rowids=[1, 2, 3])
+
+    def load_fact_rows(cursor, rows, method=None):
+        calls['loaded'].append(list(rows))
+        cursor.rowids.update(row[0] for row in rows)
+        return len(rows)
+
+    monkeypatch.setattr(binlog_cdc, 'transform_batch', lambda cursor, records: (records, records[-1][0], None))
+    monkeypatch.setattr(binlog_cdc, 'load_fact_rows', load_fact_rows)
+    monkeypatch.setattr(binlog_cdc, 'advance_watermark',
+                        lambda cursor, last_rowid, rows, seconds: calls['watermark'].append((last_rowid, rows)))
+    monkeypatch.setattr(binlog_cdc, 'save_binlog_position',
+                        lambda cursor, log_file, log_pos, changes=0: calls['position'].append((log_file, log_pos, changes)))
+    for name in ('adjust_fact_summary', 'adjust_sales_rollups'):
+        monkeypatch.setattr(binlog_cdc, name, lambda cursor, rowids, sign: calls['adjust'].append((sorted(rowids), sign)))
+    for name in ('refresh_fact_summary', 'refresh_sales_rollups', 'ensure_fact_summary', 'ensure_sales_rollups',
+                 'get_watermark'):
+        monkeypatch.setattr(binlog_cdc, name, lambda cursor: None)
+    monkeypatch.setattr(binlog_cdc, 'start_run', lambda cursor, run_id: None)
+    monkeypatch.setattr(binlog_cdc, 'is_partitioned', lambda cursor, table: False)
+    return binlog_cdc.BinlogApplier(FactConnection(cursor), 'test_run'), cursor, calls
+
+def test_fold_rows_event_keeps_latest_version(binlog_cdc):
+    from pymysqlreplication.row_event import WriteRowsEvent, UpdateRowsEvent, DeleteRowsEvent
+
+    pending = {}
+    changes = binlog_cdc.fold_rows_event(pending, rows_event(WriteRowsEvent, [{'values': source_values(4)},
+                                                                              {'values': source_values(5)}]))
+    changes += binlog_cdc.fold_rows_event(pending, rows_event(UpdateRowsEvent, [
+        {'before_values': source_values(4), 'after_values': source_values(4, quantity=9)},
+        {'before_values': source_values(1), 'after_values': source_values(6)},
+    ]))
+    changes += binlog_cdc.fold_rows_event(pending, rows_event(DeleteRowsEvent, [{'values': source_values(5)}]))
+
+    assert changes == 5
+    assert pending == {4: binlog_cdc.source_record(source_values(4, quantity=9)), 5: None, 1: None,
+                       6: binlog_cdc.source_record(source_values(6))}
+
+def test_apply_counts_only_new_rows_in_watermark(cdc_applier):
+    applier, cursor, calls = cdc_applier
+    updated = binlog_cdc_record(2, quantity=7)
+    new = binlog_cdc_record(4)
+    applier.apply({2: updated, 3: None, 4: new}, ('binlog.000001', 120), changes=3)
+
+    deletes = [(sql, params) for sql, params in cursor.statements if sql.startswith('DELETE')]
+    assert deletes == [("DELETE FROM FactSales WHERE rowid = ANY(%s) RETURNING rowid", ([2, 3, 4],))]
+    assert calls['loaded'] == [[updated, new]]
+    assert calls['adjust'] == [([2, 3, 4], -1), ([2, 3, 4], -1), ([2, 3, 4], 1), ([2, 3, 4], 1)]
+    assert calls['watermark'] == [(4, 1)]  # the update of rowid 2 is not a new row
+    assert calls['position'] == [('binlog.000001', 120, 3)]
+    assert cursor.rowids == {1, 2, 4}
+    assert (applier.applied, applier.batches) == (3, 1)
+
+    # Replaying the same batch after a crash adds no rows
+    applier.apply({2: updated, 3: None, 4: new}, ('binlog.000001', 120), changes=3)
+    assert calls['watermark'][-1] == (4, 0)
+    assert cursor.rowids == {1, 2, 4}
+
+def test_apply_without_changes_only_moves_the_position(cdc_applier):
+    applier, cursor, calls = cdc_applier
+    applier.apply({}, ('binlog.000002', 4), changes=0)
+    assert cursor.statements == []
+    assert calls['watermark'] == [] and calls['loaded'] == []
+    assert calls['position'] == [('binlog.000002', 4, 0)]
+    assert applier.batches == 0
+
+def test_apply_deletes_only(cdc_applier):
+    applier, cursor, calls = cdc_applier
+    applier.apply({1: None, 9: None}, ('binlog.000001', 300), changes=2)
+    assert cursor.rowids == {2, 3}
+    assert calls['loaded'] == [] and calls['watermark'] == []
+    assert calls['adjust'] == [([1, 9], -1), ([1, 9], -1)]
+
+def test_tail_binlog_applies_whole_transactions(binlog_cdc, monkeypatch):
+    from pymysqlreplication.event import XidEvent
+    from pymysqlreplication.row_event import WriteRowsEvent, UpdateRowsEvent
+
+    xid = type('XidEvent', (XidEvent,), {'__init__': lambda self: None})
+    events = [(rows_event(WriteRowsEvent, [{'values': source_values(4)}, {'values': source_values(5)}]), 100),
+              (xid(), 120),
+              (rows_event(UpdateRowsEvent, [{'before_values': source_values(4),
+                                             'after_values': source_values(4, quantity=2)}]), 150),
+              (xid(), 170),
+              (rows_event(WriteRowsEvent, [{'values': source_values(6)}]), 200),
+              (xid(), 220)]
+
+    class Stream:
+        def __init__(self, **settings):
+            self.log_file = settings['log_file']
+            self.log_pos = settings['log_pos']
+
+        def __iter__(self):
+            for event, log_pos in events:
+                self.log_pos = log_pos
+                yield event
+
+        def close(self):
+            pass
+
+    class Applier:
+        def __init__(self):
+            self.batches = []
+
+        def apply(self, pending, position, changes):
+            self.batches.append((dict(pending), position, changes))
+
+    monkeypatch.setattr(binlog_cdc, 'BinLogStreamReader', Stream)
+    monkeypatch.setattr(binlog_cdc, 'replication_settings', lambda: {})
+    applier = Applier()
+    assert binlog_cdc.tail_binlog(applier, ('binlog.000001', 4), batch_size=3, flush_interval=60) == ('binlog.000001', 220)
+    assert applier.batches == [
+        ({4: binlog_cdc_record(4, quantity=2), 5: binlog_cdc_record(5)}, ('binlog.000001', 170), 3),
+        ({6: binlog_cdc_record(6)}, ('binlog.000001', 220), 1),
+    ]
+
+class SqlCursor:
+    """Records executed SQL and answers fetches from a queue of results"""
+
+    def __init__(self, results=()):
+        self.statements = []
+        self.results = list(results)
+        self.rowcount = 0
+
+    def execute(self, sql, params=None):
+        self.statements.append(' '.join(sql.split()))
+
+    def fetchone(self):
+        return self.results.pop(0)
+
+    def fetchall(self):
+        return self.results.pop(0)
+
+def test_validate_staged_keys_counts_and_nulls_invalid_keys(automation):
+    cursor = SqlCursor(results=[(0, 2, 0)])
+    assert automation.validate_staged_keys(cursor) == {'date_key': 0, 'category_key': 2, 'country_key': 0}
+    updates = [sql for sql in cursor.statements if sql.startswith('UPDATE')]
+    assert len(updates) == 1 and 'SET category_key = NULL' in updates[0]
+
+def test_validate_staged_keys_can_reject(automation):
+    cursor = SqlCursor(results=[(1, 0, 3)])
+    with pytest.raises(ValueError, match='1 date_key, 3 country_key'):
+        automation.validate_staged_keys(cursor, reject=True)
+    assert not any(sql.startswith('UPDATE') for sql in cursor.statements)
+
+def test_merge_defers_foreign_keys(automation, monkeypatch):
+    monkeypatch.setattr(automation, 'is_partitioned', lambda cursor, table: False)
+    cursor = SqlCursor()
+    automation.merge_staged_rows(cursor)
+    assert cursor.statements[0] == "SET CONSTRAINTS ALL DEFERRED"
+    assert cursor.statements[1].startswith("INSERT INTO FactSales")
+
+def test_make_foreign_keys_deferrable():
+    postgresqlconnect = pytest.importorskip('postgresqlconnect')
+    cursor = SqlCursor(results=[[('factsales_date_key_fkey',), ('factsales_country_key_fkey',)]])
+    assert postgresqlconnect.make_foreign_keys_deferrable(cursor) == ['factsales_date_key_fkey',
+                                                                      'factsales_country_key_fkey']
+    assert cursor.statements[1:] == [
+        'ALTER TABLE FactSales ALTER CONSTRAINT "factsales_date_key_fkey" DEFERRABLE INITIALLY IMMEDIATE',
+        'ALTER TABLE FactSales ALTER CONSTRAINT "factsales_country_key_fkey" DEFERRABLE INITIALLY IMMEDIATE',
+    ]
+
+def test_rows_to_csv_writes_nulls_as_unquoted_empty_fields(automation):
+    from decimal import Decimal
+
+    rows = [(1, 2, 3, 4, Decimal('19.99'), datetime(2024, 1, 2, 3, 4, 5), 10, None, 30),
+            (2, 2, 3, 4, 5.5, None, None, 'a,"b"', 30)]
+    text = automation.rows_to_csv(rows).read()
+    assert text == ('1,2,3,4,19.99,2024-01-02 03:04:05,10,,30\n'
+                    '2,2,3,4,5.5,,,"a,""b""",30\n')
+
+class CopyCursor:
+    """Records COPY and SAVEPOINT calls; copy_expert can be made to fail like a pooler without COPY"""
+
+    def __init__(self, copy_error=None):
+        self.copy_error = copy_error
+        self.calls = []
+
+    def execute(self, sql, params=None):
+        self.calls.append(sql)
+
+    def copy_expert(self, sql, buffer):
+        if self.copy_error is not None:
+            raise self.copy_error
+        self.calls.append(('COPY', len(buffer.read().splitlines())))
+
+def test_load_fact_rows_copies_after_one_guarded_batch(automation):
+    cursor = CopyCursor()
+    rows = [sales_record(rowid) + (1, 1, 1) for rowid in range(5)]
+    assert automation.load_fact_rows(cursor, rows, method='copy', batch_size=2) == 5
+    assert cursor.calls == ["SAVEPOINT copy_batch", ('COPY', 2), "RELEASE SAVEPOINT copy_batch",
+                            ('COPY', 2), ('COPY', 1)]
+
+def test_load_fact_rows_falls_back_when_copy_is_rejected(automation, monkeypatch):
+    import psycopg2
+
+    inserted = []
+    monkeypatch.setattr(automation, 'insert_values_rows',
+                        lambda cursor, batch, table, page_size: inserted.append(len(batch)))
+    cursor = CopyCursor(copy_error=psycopg2.NotSupportedError("COPY is not supported"))
+    rows = [sales_record(rowid) + (1, 1, 1) for rowid in range(5)]
+    assert automation.load_fact_rows(cursor, rows, method='copy', batch_size=2) == 5
+    assert cursor.calls == ["SAVEPOINT copy_batch", "ROLLBACK TO SAVEPOINT copy_batch"]
+    assert inserted == [2, 2, 1]
+
+def test_load_fact_rows_rejects_unknown_method(automation):
+    with pytest.raises(ValueError, match='Unknown load method'):
+        automation.load_fact_rows(CopyCursor(), [], method='bulk')
+
+class SourceCursor:
+    """mysql.connector cursor over an in-memory sales_data table"""
+
+    def __init__(self, source, buffered):
+        self.source = source
+        self.buffered = buffered
+        self.result = iter(())
+        self.closed = False
+
+    def execute(self, sql, params=()):
+        self.source.queries.append((' '.join(sql.split()), params))
+        if 'MAX(rowid)' in sql:
+            self.result = iter([(max((row[0] for row in self.source.rows), default=0),)])
+            return
+        low, high = (params[0], params[1]) if len(params) == 2 else (params[0], float('inf'))
+        self.source.before_fetch(low, high)
+        self.result = iter([row for row in self.source.rows if low < row[0] <= high])
+
+    def fetchone(self):
+        return next(self.result, None)
+
+    def fetchmany(self, size):
+        self.source.fetches += 1
+        return list(itertools.islice(self.result, size))
+
+    def fetchall(self):
+        return list(self.result)
+
+    def close(self):
+        self.closed = True
+        self.source.closed_cursors += 1
+
+class SourceConnection:
+    def __init__(self, source):
+        self.source = source
+
+    def cursor(self, buffered=True):
+        return SourceCursor(self.source, buffered)
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+class SalesSource:
+    """In-memory sales_data behind a real ConnectionPool"""
+
+    def __init__(self, row_count, pool_size=4):
+        from connection_pool import ConnectionPool
+
+        self.rows = [sales_record(rowid) for rowid in range(1, row_count + 1)]
+        self.queries = []
+        self.fetches = 0
+        self.closed_cursors = 0
+        self.pool = ConnectionPool('source', lambda: SourceConnection(self), lambda conn: True, max_size=pool_size)
+
+    def before_fetch(self, low, high):
+        pass
+
+def test_stream_latest_records_pulls_chunks_lazily(automation, monkeypatch):
+    source = SalesSource(10)
+    monkeypatch.setattr(automation, 'mysql_pool', source.pool)
+
+    chunks = automation.stream_latest_records(3, chunk_size=3)
+    assert next(chunks) == [sales_record(rowid) for rowid in (4, 5, 6)]
+    assert source.fetches == 1
+    assert source.queries == [(' '.join(automation.LATEST_RECORDS_QUERY.split()), (3,))]
+    assert [len(chunk) for chunk in chunks] == [3, 1]
+    assert source.closed_cursors == 1
+
+def test_abandoned_stream_closes_its_cursor(automation, monkeypatch):
+    source = SalesSource(10)
+    monkeypatch.setattr(automation, 'mysql_pool', source.pool)
+
+    chunks = automation.stream_latest_records(0, chunk_size=2)
+    next(chunks)
+    chunks.close()
+    assert source.closed_cursors == 1
+    assert source.fetches == 1
+
+def test_parallel_latest_records_yields_ranges_in_rowid_order(automation, monkeypatch):
+    class SlowFirstRanges(SalesSource):
+        def before_fetch(self, low, high):
+            # Early ranges finish last, so completion order differs from rowid order
+            time.sleep(0.02 if low < 10 else 0)
+
+    source = SlowFirstRanges(25, pool_size=3)
+    monkeypatch.setattr(automation, 'mysql_pool', source.pool)
+
+    chunks = list(automation.parallel_latest_records(2, workers=3, range_size=4))
+    assert [row[0] for chunk in chunks for row in chunk] == list(range(3, 26))
+    assert [len(chunk) for chunk in chunks] == [4, 4, 4, 4, 4, 3]
+    ranges = [params for sql, params in source.queries if len(params) == 2]
+    assert sorted(ranges) == [(2, 6), (6, 10), (10, 14), (14, 18), (18, 22), (22, 25)]
+
+def test_parallel_latest_records_bounds_ranges_in_flight(automation, monkeypatch):
+    source = SalesSource(100, pool_size=2)
+    monkeypatch.setattr(automation, 'mysql_pool', source.pool)
+
+    chunks = automation.parallel_latest_records(0, workers=5, range_size=10)  # capped at the pool size
+    next(chunks)
+    time.sleep(0.05)
+    started = sum(1 for sql, params in source.queries if len(params) == 2)
+    assert started == 2 * 2 + 1  # two ranges per worker, plus the one submitted for the range taken
+    assert sum(len(chunk) for chunk in chunks) == 90
+    assert source.pool.stats['opened'] <= 2
+
+def test_month_partitions_are_named_and_bounded():
+    from partitions import partition_name, ensure_month_partitions
+
+    assert partition_name('FactSales', 2024, 3) == 'FactSales_2024_03'
+    cursor = SqlCursor()
+    ensure_month_partitions(cursor, {(2024, 12), (2024, 2)}, 'FactSales')
+    assert cursor.statements == [
+        "CREATE TABLE IF NOT EXISTS FactSales_2024_02 PARTITION OF FactSales FOR VALUES FROM ('2024-02-01') TO ('2024-03-01')",
+        "CREATE TABLE IF NOT EXISTS FactSales_2024_12 PARTITION OF FactSales FOR VALUES FROM ('2024-12-01') TO ('2025-01-01')",
+    ]
+
+def test_route_to_partitions_creates_each_month_once():
+    from partitions import route_to_partitions
+
+    cursor = SqlCursor()
+    known_months = {(2024, 1)}
+    groups = {(2024, 2): ['b'], (2024, 1): ['a']}
+    assert list(route_to_partitions(cursor, groups, known_months, 'FactSales')) == [
+        ('FactSales_2024_01', ['a']), ('FactSales_2024_02', ['b'])]
+    assert known_months == {(2024, 1), (2024, 2)}
+    assert len(cursor.statements) == 1 and 'FactSales_2024_02' in cursor.statements[0]
+    list(route_to_partitions(cursor, groups, known_months, 'FactSales'))
+    assert len(cursor.statements) == 1
+
+def partitioned_fact_rows():
+    timestamps = [datetime(2024, 1, 31, 23, 59), datetime(2024, 2, 1), datetime(2023, 12, 5), datetime(2024, 1, 1)]
+    return [(rowid, 1, 2, 3, 4.5, timestamp, 1, 1, 1) for rowid, timestamp in enumerate(timestamps, 1)]
+
+def test_load_partitioned_rows_writes_each_month_to_its_partition(automation, monkeypatch):
+    loads = []
+    monkeypatch.setattr(automation, 'load_fact_rows', lambda cursor, rows, table, key_columns, **options:
+                        loads.append((table, [row[0] for row in rows], key_columns)) or len(rows))
+    cursor = SqlCursor()
+    assert automation.load_partitioned_rows(cursor, partitioned_fact_rows(), set()) == 4
+    assert loads == [('FactSales_2023_12', [3], ('rowid', 'timestamp')),
+                     ('FactSales_2024_01', [1, 4], ('rowid', 'timestamp')),
+                     ('FactSales_2024_02', [2], ('rowid', 'timestamp'))]
+    assert len(cursor.statements) == 3
+
+def test_split_columns_by_month_matches_rows(automation):
+    pytest.importorskip('numpy')
+    from columnar_transform import records_to_columns, split_columns_by_month
+
+    rows = partitioned_fact_rows()
+    columns = split_columns_by_month(records_to_columns([row[:6] for row in rows]))
+    assert {month: part['rowid'].tolist() for month, part in columns.items()} == {
+        month: [row[0] for row in part] for month, part in automation.split_rows_by_month(rows).items()}
+
+def test_split_rows_by_month_rejects_null_timestamps(automation):
+    with pytest.raises(ValueError, match='NULL timestamp'):
+        automation.split_rows_by_month([(1, 1, 2, 3, 4.5, None, 1, 1, 1)])
+
+class WarehouseConnection:
+    """psycopg2-like connection that records which threads use it"""
+
+    def __init__(self):
+        self.threads = set()
+
+    def _used(self):
+        self.threads.add(threading.get_ident())
+
+    def cursor(self):
+        self._used()
+        return SimpleNamespace(close=self._used)
+
+    def rollback(self):
+        self._used()
+
+    def close(self):
+        pass
+
+class RecordingLoader:
+    """FactBatchLoader stand-in that records the batches it commits"""
+
+    instances = []
+
+    def __init__(self, postgres_conn, run_id, method=None, fail_at=None, delay=0.002):
+        self.conn = postgres_conn
+        self.batches = []
+        self.loaded = 0
+        self.fail_at = fail_at
+        self.delay = delay
+        RecordingLoader.instances.append(self)
+
+    def load(self, transformed, batch_max_rowid, rows, started):
+        self.conn._used()
+        if len(self.batches) == self.fail_at:
+            raise RuntimeError("load failed")
+        time.sleep(self.delay)
+        self.batches.append(batch_max_rowid)
+        self.loaded += rows
+
+    def close(self):
+        self.conn._used()
+
+def chunked_source(chunks, chunk_size, progress):
+    """stream_latest_records stand-in that records how far extraction ran ahead of the loader"""
+    def stream(last_rowid, size):
+        try:
+            for i in range(chunks):
+                loaded = sum(len(loader.batches) for loader in RecordingLoader.instances)
+                progress['lag'] = max(progress['lag'], i - loaded)
+                yield [sales_record(last_rowid + i * chunk_size + j) for j in range(1, chunk_size + 1)]
+        finally:
+            progress['closed'] = True
+    return stream
+
+@pytest.fixture
+def async_engine(automation, monkeypatch):
+    from connection_pool import ConnectionPool
+
+    async_engine = pytest.importorskip('async_engine')
+    RecordingLoader.instances = []
+    connections = []
+
+    def connect():
+        connections.append(WarehouseConnection())
+        return connections[-1]
+
+    monkeypatch.setattr(async_engine, 'postgres_pool', ConnectionPool('warehouse', connect, lambda conn: True))
+    monkeypatch.setattr(async_engine, 'transform_batch',
+                        lambda cursor, chunk, columnar, resolver: (chunk, chunk[-1][0], resolver))
+    async_engine.test_connections = connections
+    return async_engine
+
+def test_async_engine_loads_batches_in_order_with_backpressure(async_engine, monkeypatch):
+    import asyncio
+
+    progress = {'lag': 0, 'closed': False}
+    monkeypatch.setattr(async_engine, 'stream_latest_records', chunked_source(20, 5, progress))
+    monkeypatch.setattr(async_engine, 'FactBatchLoader', RecordingLoader)
+
+    assert asyncio.run(async_engine.synchronize_async(100, chunk_size=5, queue_size=1)) == 100
+    assert RecordingLoader.instances[0].batches == [105 + 5 * i for i in range(20)]
+    # One chunk in each queue and one held by each stage at most
+    assert 1 < progress['lag'] <= 2 * 1 + 3
+    assert progress['closed']
+    # Every connection was only used from its stage's executor thread
+    assert all(len(conn.threads) == 1 for conn in async_engine.test_connections)
+
+def test_async_engine_stops_every_stage_when_a_load_fails(async_engine, monkeypatch):
+    import asyncio
+
+    progress = {'lag': 0, 'closed': False}
+    monkeypatch.setattr(async_engine, 'stream_latest_records', chunked_source(50, 5, progress))
+    monkeypatch.setattr(async_engine, 'FactBatchLoader',
+                        lambda conn, run_id, method: RecordingLoader(conn, run_id, fail_at=3))
+
+    with pytest.raises(RuntimeError, match='load failed'):
+        asyncio.run(async_engine.synchronize_async(0, chunk_size=5, queue_size=2))
+    assert RecordingLoader.instances[0].batches == [5, 10, 15]
+    assert progress['closed']
+
+@pytest.fixture
+def sales_pipeline(automation, monkeypatch):
+    from connection_pool import ConnectionPool
+
+    sales_pipeline = pytest.importorskip('sales_pipeline')
+    RecordingLoader.instances = []
+    monkeypatch.setattr(sales_pipeline, 'postgres_pool',
+                        ConnectionPool('warehouse', WarehouseConnection, lambda conn: True, max_size=4))
+    monkeypatch.setattr(sales_pipeline, 'mysql_pool', SimpleNamespace(max_size=4))
+    monkeypatch.setattr(sales_pipeline, 'transform_batch',
+                        lambda cursor, records, columnar, resolver: (records, records[-1][0], resolver))
+    monkeypatch.setattr(automation, 'dimension_cache', SimpleNamespace(loaded=True))
+    return sales_pipeline
+
+def ranged_source(progress, empty=()):
+    """fetch_rowid_range stand-in whose early ranges finish last"""
+    lock = threading.Lock()
+
+    def fetch(bounds):
+        low, high = bounds
+        with lock:
+            progress['fetched'] += 1
+            committed = sum(len(loader.batches) for loader in RecordingLoader.instances) + progress['skipped']
+            progress['lag'] = max(progress['lag'], progress['fetched'] - committed)
+        time.sleep(0.01 if low // 10 % 2 == 0 else 0)
+        if bounds in empty:
+            with lock:
+                progress['skipped'] += 1
+            return []
+        return [sales_record(rowid) for rowid in range(low + 1, high + 1)]
+    return fetch
+
+def test_threaded_pipeline_commits_ranges_in_order(sales_pipeline, monkeypatch):
+    progress = {'fetched': 0, 'lag': 0, 'skipped': 0}
+    monkeypatch.setattr(sales_pipeline, 'get_source_max_rowid', lambda: 200)
+    monkeypatch.setattr(sales_pipeline, 'fetch_rowid_range', ranged_source(progress, empty={(50, 60)}))
+    monkeypatch.setattr(sales_pipeline, 'FactBatchLoader', RecordingLoader)
+
+    pipeline = sales_pipeline.SalesPipeline(extract_workers=3, transform_workers=2, queue_size=1, range_size=10)
+    assert pipeline.run(0) == 190
+    assert RecordingLoader.instances[0].batches == [high for high in range(10, 201, 10) if high != 60]
+    # Ranges are only assigned while an in-flight slot is free: one per queued batch plus one per worker
+    assert progress['lag'] <= 2 * 1 + 3 + 2
+    summaries = pipeline.stage_summaries()
+    assert summaries['load']['batches'] == 20
+
+def test_threaded_pipeline_stops_when_a_load_fails(sales_pipeline, monkeypatch):
+    progress = {'fetched': 0, 'lag': 0, 'skipped': 0}
+    monkeypatch.setattr(sales_pipeline, 'get_source_max_rowid', lambda: 1000)
+    monkeypatch.setattr(sales_pipeline, 'fetch_rowid_range', ranged_source(progress))
+    monkeypatch.setattr(sales_pipeline, 'FactBatchLoader',
+                        lambda conn, run_id, method: RecordingLoader(conn, run_id, fail_at=2))
+
+    pipeline = sales_pipeline.SalesPipeline(extract_workers=2, transform_workers=1, queue_size=1, range_size=10)
+    with pytest.raises(RuntimeError, match='load failed'):
+        pipeline.run(0)
+    assert RecordingLoader.instances[0].batches == [10, 20]
+    assert progress['fetched'] < 100
+
+def test_threaded_pipeline_checks_pool_sizes(sales_pipeline):
+    with pytest.raises(ValueError, match='PostgreSQL connections'):
+        sales_pipeline.SalesPipeline(extract_workers=2, transform_workers=4)
+
+class UpsertCursor:
+    """Fact table keyed by rowid that applies INSERT ... ON CONFLICT DO NOTHING and counts rows written"""
+
+    def __init__(self, existing=()):
+        self.rowids = set(existing)
+        self.staged = []
+        self.statements = []
+        self.rowcount = 0
+
+    def insert(self, rows):
+        new = [row for row in rows if row[0] not in self.rowids]
+        self.rowids.update(row[0] for row in new)
+        self.rowcount = len(new)
+
+    def execute(self, sql, params=None):
+        self.statements.append(sql)
+        if sql.startswith('INSERT') and 'SELECT' in sql:
+            self.insert(self.staged)
+        elif sql.startswith('INSERT'):
+            self.insert([params])
+        elif sql.startswith('TRUNCATE'):
+            self.staged = []
+
+    def copy_expert(self, sql, buffer):
+        self.statements.append(sql)
+        self.staged.extend((int(line.split(',')[0]),) for line in buffer.read().splitlines())
+
+def upsert_rows(rowids):
+    return [sales_record(rowid) + (1, 1, 1) for rowid in rowids]
+
+@pytest.mark.parametrize('method', ['copy', 'values', 'row'])
+def test_upsert_counts_only_written_rows(automation, monkeypatch, method):
+    pages = []
+
+    def execute_values(cursor, sql, rows, page_size):
+        pages.append((len(rows), page_size))
+        cursor.statements.append(sql)
+        cursor.insert(rows)
+
+    monkeypatch.setattr(automation.psycopg2.extras, 'execute_values', execute_values)
+    cursor = UpsertCursor(existing={2, 5})
+    written = automation.upsert_fact_rows(cursor, upsert_rows(range(1, 8)), 'nothing', method=method, batch_size=3)
+    assert written == 5
+    assert cursor.rowids == set(range(1, 8))
+
+    inserts = [sql for sql in cursor.statements if sql.startswith('INSERT')]
+    assert all(sql.endswith('ON CONFLICT (rowid) DO NOTHING') for sql in inserts)
+    if method == 'copy':
+        assert cursor.statements[0].startswith(f"CREATE TEMP TABLE IF NOT EXISTS {automation.UPSERT_TABLE}")
+        assert len(inserts) == 3 and cursor.statements.count(f"TRUNCATE {automation.UPSERT_TABLE}") == 3
+        assert all(f"FROM {automation.UPSERT_TABLE}" in sql for sql in inserts)
+    elif method == 'values':
+        # One page per batch, so each rowcount covers a whole batch
+        assert pages == [(3, 3), (3, 3), (1, 1)]
+    else:
+        assert len(inserts) == 7
+
+def test_upsert_replay_writes_nothing(automation):
+    cursor = UpsertCursor()
+    rows = upsert_rows(range(1, 6))
+    assert automation.load_fact_rows(cursor, rows, method='copy', batch_size=2, on_conflict='nothing') == 5
+    assert automation.load_fact_rows(cursor, rows, method='copy', batch_size=2, on_conflict='nothing') == 0
+
+def test_upsert_rejects_unknown_mode_before_loading(automation):
+    cursor = UpsertCursor()
+    with pytest.raises(ValueError, match='Unknown conflict mode'):
+        automation.upsert_fact_rows(cursor, upsert_rows([1]), 'replace')
+    assert cursor.statements == []
@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the web log helpers in weblog.py
+These tests only use temporary files and need no database or Airflow
+"""
+
+import os
+import gzip
+import json
+import sys
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from weblog import (parse_clf_timestamp, format_timestamp, strptime_timestamp, iter_extracted, iter_processed,
+                    iter_scanned_blocks, scan_extracted, scan_processed, shard_ranges, extract_web_log,
+                    process_web_log_fused, extract_web_log_incremental, process_web_log_fused_incremental,
+                    read_checkpoint, transform_web_log, load_web_log)
+from compression import open_log, gzip_member_ranges, write_gzip_members
+from weblog_warehouse import load_web_log_warehouse
+
+def test_parse_clf_timestamp_fields():
+    assert parse_clf_timestamp('17/May/2015:10:05:03 +0000') == (2015, 5, 17, '10:05:03', 0)
+    assert parse_clf_timestamp('01/Jan/2020:00:00:00 -0730') == (2020, 1, 1, '00:00:00', -450)
+    # The zone is optional
+    assert parse_clf_timestamp('31/Dec/1999:23:59:59') == (1999, 12, 31, '23:59:59', 0)
+
+def test_parse_clf_timestamp_leap_years():
+    assert parse_clf_timestamp('29/Feb/2024:12:00:00 +0000') == (2024, 2, 29, '12:00:00', 0)
+    assert parse_clf_timestamp('29/Feb/2000:12:00:00 +0000') == (2000, 2, 29, '12:00:00', 0)
+    assert parse_clf_timestamp('29/Feb/2023:12:00:00 +0000') is None
+    assert parse_clf_timestamp('29/Feb/1900:12:00:00 +0000') is None
+
+@pytest.mark.parametrize('timestamp', [
+    '',
+    '17/May/2015',
+    '17-May-2015:10:05:03 +0000',
+    '17/Foo/2015:10:05:03 +0000',
+    '32/May/2015:10:05:03 +0000',
+    '31/Apr/2015:10:05:03 +0000',
+    '17/May/2015:24:05:03 +0000',
+    '17/May/2015:10:60:03 +0000',
+    '17/May/2015:10:05:60 +0000',
+    '1x/May/2015:10:05:03 +0000',
+    '17/May/2015:10:05:03X+0000',
+    '17/May/2015:10:05:03 0000',
+    '17/May/2015:10:05:03 +00',
+    '17/May/2015:10:05:03 +00a0',
+])
+def test_parse_clf_timestamp_rejects_malformed(timestamp):
+    assert parse_clf_timestamp(timestamp) is None
+
+def test_format_timestamp_normalizes_offsets_to_utc():
+    assert format_timestamp('17/May/2015:10:05:03 +0000') == '2015-05-17 10:05:03'
+    assert format_timestamp('17/May/2015:10:05:03 +0200') == '2015-05-17 08:05:03'
+    assert format_timestamp('31/Dec/2015:22:30:00 -0200') == '2016-01-01 00:30:00'
+    assert format_timestamp('01/Mar/2024:00:30:00 +0100') == '2024-02-29 23:30:00'
+
+def test_format_timestamp_keep_offset():
+    assert format_timestamp('17/May/2015:10:05:03 +0200', keep_offset=True) == '2015-05-17 10:05:03+02:00'
+    assert format_timestamp('17/May/2015:10:05:03 -0930', keep_offset=True) == '2015-05-17 10:05:03-09:30'
+    assert format_timestamp('17/May/2015:10:05:03', keep_offset=True) == '2015-05-17 10:05:03+00:00'
+
+def test_format_timestamp_matches_strptime_for_utc():
+    for timestamp in ('17/May/2015:10:05:03 +0000', '29/Feb/2024:23:59:59 +0000', '01/Jan/1970:00:00:00 +0000'):
+        assert format_timestamp(timestamp) == strptime_timestamp(timestamp)
+
+def test_strptime_fallback_applies_the_offset():
+    # Lower-case months and one-digit days miss the fixed layout and use the fallback
+    assert parse_clf_timestamp('17/may/2015:10:05:03 +0200') is None
+    assert format_timestamp('17/may/2015:10:05:03 +0200') == '2015-05-17 08:05:03'
+    assert format_timestamp('7/May/2015:23:30:00 -0100') == '2015-05-08 00:30:00'
+    assert format_timestamp('17/may/2015:10:05:03 -0130', keep_offset=True) == '2015-05-17 10:05:03-01:30'
+    assert format_timestamp('17/may/2015:10:05:03', keep_offset=True) == '2015-05-17 10:05:03+00:00'
+    assert format_timestamp('17/may/2015:10:05:03 local') is None
+
+def test_format_timestamp_unparseable():
+    assert format_timestamp('not a timestamp') is None
+    assert format_timestamp('29/Feb/2023:12:00:00 +0000') is None
+
+SAMPLE_LINES = [
+    '83.149.9.216 - - [17/May/2015:10:05:03 +0000] "GET /index.html HTTP/1.1" 200 203023 "-" "Mozilla/5.0"\n',
+    '10.0.0.1 - frank [29/Feb/2024:23:59:59 -0700] "GET /a HTTP/1.1" 200 12\n',
+    '  192.168.1.20 - - [01/Jan/2020:00:00:00 +0130] "POST /login HTTP/1.1" 302 0\n',
+    'not a log line at all\n',
+    '10.0.0.2 - - "GET /no-timestamp HTTP/1.1" 404 0\n',
+    '10.0.0.3 - [] - [05/Jun/2016:08:15:00 +0000] "GET /empty-brackets HTTP/1.1" 200 1\n',
+    '\n',
+    '172.16.0.9 - - [bad timestamp] "GET / HTTP/1.1" 500 0\n',
+]
+
+def write_sample_log(path, repeat=50, trailing_newline=True):
+    text = ''.join(SAMPLE_LINES * repeat)
+    if not trailing_newline:
+        text = text.rstrip('\n')
+    with open(path, 'w') as f:
+        f.write(text)
+    return text
+
+def read_text(path):
+    with open(path) as f:
+        return f.read()
+
+@pytest.mark.parametrize('shards', [1, 2, 3, 7, 16])
+def test_shard_ranges_cover_file_on_line_boundaries(tmp_path, shards):
+    path = tmp_path / 'access.log'
+    write_sample_log(path, repeat=5, trailing_newline=False)
+    data = path.read_bytes()
+    ranges = shard_ranges(str(path), shards)
+    assert 1 <= len(ranges) <= shards
+    assert ranges[0][0] == 0 and ranges[-1][1] == len(data)
+    for (_, end), (start, _) in zip(ranges, ranges[1:]):
+        assert end == start
+        assert data[start - 1:start] == b'\n'
+
+def test_shard_ranges_small_and_empty_files(tmp_path):
+    path = tmp_path / 'access.log'
+    path.write_bytes(b'')
+    assert shard_ranges(str(path), 4) == []
+    path.write_bytes(b'one line without newline')
+    assert shard_ranges(str(path), 4) == [(0, 24)]
+
+@pytest.mark.parametrize('workers', [2, 3])
+def test_parallel_stages_match_serial(tmp_path, workers):
+    log = tmp_path / 'access.log'
+    write_sample_log(log)
+    for run in (extract_web_log, process_web_log_fused):
+        expected = tmp_path / 'expected.txt'
+        actual = tmp_path / 'actual.txt'
+        run(str(log), str(expected))
+        run(str(log), str(actual), workers=workers)
+        assert read_text(actual) == read_text(expected)
+
+@pytest.mark.parametrize('keep_offset', [False, True])
+def test_fused_matches_staged_pipeline(tmp_path, keep_offset):
+    log = tmp_path / 'access.log'
+    write_sample_log(log)
+    extracted = tmp_path / 'extracted.txt'
+    transformed = tmp_path / 'transformed.txt'
+    staged = tmp_path / 'staged.csv'
+    fused = tmp_path / 'fused.csv'
+    extract_web_log(str(log), str(extracted))
+    transform_web_log(str(extracted), str(transformed), keep_offset=keep_offset)
+    load_web_log(str(transformed), str(staged))
+    assert process_web_log_fused(str(log), str(fused), keep_offset=keep_offset) == 250
+    assert read_text(fused) == read_text(staged)
+
+@pytest.mark.parametrize('block_size', [16, 100, 1000, 1 << 20])
+def test_scanned_blocks_match_line_reader(block_size):
+    data = ''.join(SAMPLE_LINES * 20).encode()
+    pairs = [pair for block in iter_scanned_blocks(data, block_size=block_size) for pair in block]
+    scanned = [f"{ip.decode()},{timestamp.decode()}" for ip, timestamp in pairs]
+    assert scanned == list(iter_extracted(SAMPLE_LINES * 20))
+
+def test_scanners_match_line_stages():
+    data = ''.join(SAMPLE_LINES * 20).encode()
+    extracted = ''.join(block for block, _ in scan_extracted(data))
+    processed = ''.join(block for block, _ in scan_processed(data))
+    assert extracted.splitlines() == list(iter_extracted(SAMPLE_LINES * 20))
+    assert processed.splitlines() == list(iter_processed(SAMPLE_LINES * 20))
+
+@pytest.mark.parametrize('workers', [1, 3])
+@pytest.mark.parametrize('trailing_newline', [True, False])
+def test_mmap_extract_matches_line_reader(tmp_path, workers, trailing_newline):
+    log = tmp_path / 'access.log'
+    write_sample_log(log, trailing_newline=trailing_newline)
+    expected = tmp_path / 'expected.txt'
+    actual = tmp_path / 'actual.txt'
+    extract_web_log(str(log), str(expected))
+    extract_web_log(str(log), str(actual), workers=workers, mmap_scan=True)
+    assert read_text(actual) == read_text(expected)
+
+@pytest.mark.parametrize('workers', [1, 3])
+def test_mmap_fused_matches_line_reader(tmp_path, workers):
+    log = tmp_path / 'access.log'
+    write_sample_log(log)
+    expected = tmp_path / 'expected.csv'
+    scanned = tmp_path / 'scanned.csv'
+    process_web_log_fused(str(log), str(expected))
+    process_web_log_fused(str(log), str(scanned), workers=workers, mmap_scan=True)
+    assert read_text(scanned) == read_text(expected)
+
+@pytest.mark.parametrize('suffix', ['.gz', '.bz2', '.xz', '.zst'])
+def test_compressed_input_and_output_round_trip(tmp_path, suffix):
+    if suffix == '.zst':
+        pytest.importorskip('zstandard')
+    log = tmp_path / 'access.log'
+    text = write_sample_log(log)
+    compressed_log = tmp_path / f'access.log{suffix}'
+    with open_log(str(compressed_log), 'wt') as f:
+        f.write(text)
+    assert compressed_log.stat().st_size < log.stat().st_size
+
+    expected = tmp_path / 'expected.txt'
+    extract_web_log(str(log), str(expected))
+    actual = tmp_path / f'actual.txt{suffix}'
+    extract_web_log(str(compressed_log), str(actual), workers=2)
+    with open_log(str(actual), 'rt') as f:
+        assert f.read() == read_text(expected)
+
+def test_gzip_members_decompress_as_one_stream(tmp_path):
+    log = tmp_path / 'access.log'
+    text = write_sample_log(log)
+    members = tmp_path / 'access.log.gz'
+    assert write_gzip_members(str(log), str(members), member_size=2000, workers=2) > 3
+    assert gzip.decompress(members.read_bytes()).decode() == text
+    ranges = gzip_member_ranges(str(members), 4)
+    assert len(ranges) == 4
+    assert ranges[0][0] == 0 and ranges[-1][1] == members.stat().st_size
+
+@pytest.mark.parametrize('cuts', [(), (1000, 1001, 5000), (37, 4096, 9999)])
+def test_parallel_gzip_matches_serial(tmp_path, cuts):
+    log = tmp_path / 'access.log'
+    data = write_sample_log(log).encode()
+    # Members cut at arbitrary bytes, so lines span member (and range) boundaries
+    bounds = [0, *cuts, len(data)]
+    compressed = tmp_path / 'access.log.gz'
+    compressed.write_bytes(b''.join(gzip.compress(data[start:end]) for start, end in zip(bounds, bounds[1:])))
+
+    for run in (extract_web_log, process_web_log_fused):
+        expected = tmp_path / 'expected.txt'
+        actual = tmp_path / 'actual.txt'
+        run(str(log), str(expected))
+        run(str(compressed), str(actual), workers=3)
+        assert read_text(actual) == read_text(expected)
+
+def log_line(n):
+    return f'10.0.0.{n} - - [17/May/2015:10:05:{n:02d} +0000] "GET /{n} HTTP/1.1" 200 {n}\n'
+
+def extracted_line(n):
+    return f"10.0.0.{n},17/May/2015:10:05:{n:02d} +0000"
+
+def append_log(path, text):
+    with open(path, 'a') as f:
+        f.write(text)
+
+def run_incremental(tmp_path, rotated_files=()):
+    output = tmp_path / 'extracted.txt'
+    extract_web_log_incremental(str(tmp_path / 'access.log'), str(output), str(tmp_path / 'checkpoint.json'),
+                                [str(path) for path in rotated_files])
+    return read_text(output).splitlines()
+
+def test_incremental_reads_only_new_lines(tmp_path):
+    log = tmp_path / 'access.log'
+    append_log(log, log_line(1) + log_line(2))
+    assert run_incremental(tmp_path) == [extracted_line(1), extracted_line(2)]
+    assert run_incremental(tmp_path) == []
+    append_log(log, log_line(3))
+    assert run_incremental(tmp_path) == [extracted_line(3)]
+    assert read_checkpoint(str(tmp_path / 'checkpoint.json'))['offset'] == log.stat().st_size
+
+def test_incremental_leaves_partial_last_line(tmp_path):
+    log = tmp_path / 'access.log'
+    line = log_line(2)
+    append_log(log, log_line(1) + line[:20])
+    assert run_incremental(tmp_path) == [extracted_line(1)]
+    assert run_incremental(tmp_path) == []
+    append_log(log, line[20:])
+    assert run_incremental(tmp_path) == [extracted_line(2)]
+
+def test_incremental_partial_first_line_is_not_read(tmp_path):
+    log = tmp_path / 'access.log'
+    line = log_line(1)
+    append_log(log, line[:30])
+    assert run_incremental(tmp_path) == []
+    append_log(log, line[30:])
+    assert run_incremental(tmp_path) == [extracted_line(1)]
+
+def test_incremental_rename_rotation(tmp_path):
+    log = tmp_path / 'access.log'
+    rotated = tmp_path / 'access.log.1'
+    append_log(log, log_line(1))
+    assert run_incremental(tmp_path, [rotated]) == [extracted_line(1)]
+
+    # Lines written after the last run but before rotation are still read
+    append_log(log, log_line(2))
+    os.rename(log, rotated)
+    append_log(log, log_line(3))
+    assert run_incremental(tmp_path, [rotated]) == [extracted_line(2), extracted_line(3)]
+    assert run_incremental(tmp_path, [rotated]) == []
+
+def test_incremental_copytruncate_rotation(tmp_path):
+    log = tmp_path / 'access.log'
+    append_log(log, log_line(1) + log_line(2) + log_line(3))
+    assert len(run_incremental(tmp_path)) == 3
+
+    # Truncated in place and refilled with less data than was read
+    with open(log, 'w') as f:
+        f.write(log_line(4))
+    assert run_incremental(tmp_path) == [extracted_line(4)]
+
+def test_incremental_rewritten_file_starts_over(tmp_path):
+    log = tmp_path / 'access.log'
+    append_log(log, log_line(1) + log_line(2))
+    run_incremental(tmp_path)
+
+    # Same inode and a larger size, but the checkpointed line is gone
+    with open(log, 'w') as f:
+        f.write(log_line(5) + log_line(6) + log_line(7))
+    assert run_incremental(tmp_path) == [extracted_line(5), extracted_line(6), extracted_line(7)]
+
+def test_fused_incremental_appends_under_one_header(tmp_path):
+    log = tmp_path / 'access.log'
+    output = tmp_path / 'processed.csv'
+    checkpoint = tmp_path / 'checkpoint.json'
+    append_log(log, log_line(1))
+    process_web_log_fused_incremental(str(log), str(output), str(checkpoint))
+    append_log(log, log_line(2))
+    process_web_log_fused_incremental(str(log), str(output), str(checkpoint))
+    assert read_text(output).splitlines() == ['IP_Address,Timestamp', '10.0.0.1,2015-05-17 10:05:01',
+                                              '10.0.0.2,2015-05-17 10:05:02']
+
+def test_columnar_dataset_skips_unparseable_timestamps(tmp_path):
+    pytest.importorskip('pyarrow')
+    from weblog_columnar import write_web_log_dataset, open_web_log_dataset
+
+    transformed = tmp_path / 'transformed.txt'
+    transformed.write_text('10.0.0.1,2015-05-17 10:05:03\n'
+                           '10.0.0.2,bad timestamp\n'
+                           '10.0.0.3,2015-05-18 01:00:00+02:00\n')
+    for file_format in ('parquet', 'arrow'):
+        dataset_dir = tmp_path / file_format
+        assert write_web_log_dataset(str(transformed), str(dataset_dir), file_format) == 2
+        assert sorted(os.listdir(dataset_dir)) == ['date=2015-05-17']
+        table = open_web_log_dataset(str(dataset_dir), file_format).to_table()
+        assert sorted(table.column('ip_address').to_pylist()) == ['10.0.0.1', '10.0.0.3']
+
+def test_incremental_checkpoint_of_another_log_is_not_resumed(tmp_path):
+    log = tmp_path / 'access.log'
+    append_log(log, log_line(1) + log_line(2))
+    assert run_incremental(tmp_path) == [extracted_line(1), extracted_line(2)]
+    checkpoint = read_checkpoint(str(tmp_path / 'checkpoint.json'))
+    assert checkpoint['path'] == str(log)
+
+    # A checkpoint written before paths were recorded still resumes
+    del checkpoint['path']
+    (tmp_path / 'checkpoint.json').write_text(json.dumps(checkpoint))
+    append_log(log, log_line(3))
+    assert run_incremental(tmp_path) == [extracted_line(3)]
+
+    # The same file under another name is read from the start
+    checkpoint = read_checkpoint(str(tmp_path / 'checkpoint.json'))
+    checkpoint['path'] = str(tmp_path / 'other.log')
+    (tmp_path / 'checkpoint.json').write_text(json.dumps(checkpoint))
+    assert run_incremental(tmp_path) == [extracted_line(1), extracted_line(2), extracted_line(3)]
+
+class WarehouseConnection:
+    """Transactional in-memory FactWebLog: (load_ds, ip, timestamp, date_key) rows"""
+
+    def __init__(self, partitioned=False, fail_on_copy=None):
+        self.partitioned = partitioned
+        self.fail_on_copy = fail_on_copy
+        self.committed = []
+        self.rows = []
+        self.statements = []
+        self.copies = 0
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql, params=None):
+        self.statements.append((sql, params))
+        self.result = None
+        self.rowcount = 0
+        if sql.startswith('SELECT 1 FROM pg_partitioned_table'):
+            self.result = (1,) if self.partitioned else None
+        elif sql.startswith('DELETE'):
+            kept = [row for row in self.rows if row[0] != params[0]]
+            self.rowcount = len(self.rows) - len(kept)
+            self.rows = kept
+
+    def fetchone(self):
+        return self.result
+
+    def copy_expert(self, sql, buffer):
+        self.copies += 1
+        if self.copies == self.fail_on_copy:
+            raise RuntimeError("connection lost")
+        self.rows.extend(tuple(line.split(',')) for line in buffer.read().splitlines())
+
+    def commit(self):
+        self.committed = list(self.rows)
+
+    def rollback(self):
+        self.rows = list(self.committed)
+
+    def close(self):
+        pass
+
+# DimDate with only 17 May 2015
+WAREHOUSE_DATES = SimpleNamespace(snapshot=lambda: SimpleNamespace(date_keys={date(2015, 5, 17): 7}))
+
+def write_transformed(path, records):
+    path.write_text(''.join(f"{ip},{timestamp}\n" for ip, timestamp in records))
+
+def test_warehouse_reload_replaces_the_ds(tmp_path):
+    transformed = tmp_path / 'transformed.txt'
+    write_transformed(transformed, [('10.0.0.1', '2015-05-17 10:05:03'), ('10.0.0.2', '2015-05-18 01:00:00+02:00'),
+                                    ('10.0.0.3', '18/May/2015:01:00:00 +0200')])
+    conn = WarehouseConnection()
+    assert load_web_log_warehouse(conn, str(transformed), '2024-01-01', dimension_cache=WAREHOUSE_DATES) == 2
+    assert load_web_log_warehouse(conn, str(transformed), '2024-01-02', dimension_cache=WAREHOUSE_DATES) == 2
+    assert load_web_log_warehouse(conn, str(transformed), '2024-01-01', dimension_cache=WAREHOUSE_DATES,
+                                  batch_size=1) == 2
+
+    assert ("DELETE FROM FactWebLog WHERE load_ds = %s", ('2024-01-01',)) in conn.statements
+    assert sorted(conn.committed) == [
+        ('2024-01-01', '10.0.0.1', '2015-05-17 10:05:03', '7'), ('2024-01-01', '10.0.0.2', '2015-05-17 23:00:00', '7'),
+        ('2024-01-02', '10.0.0.1', '2015-05-17 10:05:03', '7'), ('2024-01-02', '10.0.0.2', '2015-05-17 23:00:00', '7'),
+    ]
+
+def test_failed_warehouse_reload_keeps_the_previous_rows(tmp_path):
+    transformed = tmp_path / 'transformed.txt'
+    write_transformed(transformed, [('10.0.0.1', '2015-05-17 10:05:03'), ('10.0.0.2', '2015-05-19 11:00:00')])
+    conn = WarehouseConnection()
+    load_web_log_warehouse(conn, str(transformed), '2024-01-01', dimension_cache=WAREHOUSE_DATES)
+    before = list(conn.committed)
+    assert before[1] == ('2024-01-01', '10.0.0.2', '2015-05-19 11:00:00', '')  # no DimDate row: NULL key
+
+    conn.fail_on_copy = conn.copies + 2
+    with pytest.raises(RuntimeError):
+        load_web_log_warehouse(conn, str(transformed), '2024-01-01', dimension_cache=WAREHOUSE_DATES, batch_size=1)
+    assert conn.rows == conn.committed == before
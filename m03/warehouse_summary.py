@@ -0,0 +1,191 @@
+# Running FactSales aggregates for data warehouse validation.
+# The fact_summary table keeps the row count, quantity sum, revenue sum and
+# latest timestamp of a fact table together with the highest rowid they
+# cover. Each refresh aggregates only the rows above that rowid (a primary
+# key range scan), so the synchronization can fold every loaded batch into
+# the summary and validation reads a single row instead of scanning the
+# fact table. A full reconciliation recomputes everything from scratch and
+# reports any drift (e.g. rows updated or deleted outside the ETL).
+
+import logging
+from datetime import timedelta
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Run a full reconciliation when the last one is older than this
+FULL_RECONCILIATION_INTERVAL = timedelta(days=7)
+
+SUMMARY_FIELDS = ('row_count', 'quantity_sum', 'revenue_sum', 'max_timestamp')
+
+CREATE_SUMMARY_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS fact_summary (
+    fact_table VARCHAR(100) PRIMARY KEY,
+    row_count BIGINT NOT NULL DEFAULT 0,
+    quantity_sum BIGINT NOT NULL DEFAULT 0,
+    revenue_sum NUMERIC(20,2) NOT NULL DEFAULT 0,
+    max_timestamp TIMESTAMP,
+    max_rowid BIGINT NOT NULL DEFAULT 0,
+    reconciled_at TIMESTAMP,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+def ensure_summary_table(postgres_cursor):
+    """Create the fact_summary table if it does not exist yet"""
+    postgres_cursor.execute(CREATE_SUMMARY_TABLE_SQL)
+
+def get_fact_summary(postgres_cursor, fact_table='FactSales'):
+    """Return the stored summary as a dict, or None if the fact table has none yet"""
+    postgres_cursor.execute("""
+        SELECT row_count, quantity_sum, revenue_sum, max_timestamp, max_rowid, reconciled_at, updated_at
+        FROM fact_summary WHERE fact_table = %s
+    """, (fact_table,))
+    row = postgres_cursor.fetchone()
+    if row is None:
+        return None
+    return dict(zip(SUMMARY_FIELDS + ('max_rowid', 'reconciled_at', 'updated_at'), row))
+
+def refresh_fact_summary(postgres_cursor, through_rowid=None, fact_table='FactSales'):
+    """Fold fact rows above the summary's max_rowid (up to through_rowid) into the summary
+
+    Call inside the transaction that loaded the rows. The summary row is
+    locked first, so concurrent refreshes never count the same rows twice.
+    Returns the number of rows added.
+    """
+    postgres_cursor.execute("SELECT max_rowid FROM fact_summary WHERE fact_table = %s FOR UPDATE",
+                            (fact_table,))
+    row = postgres_cursor.fetchone()
+    upper_bound = "AND rowid <= %(through_rowid)s" if through_rowid is not None else ""
+    postgres_cursor.execute(f"""
+        WITH delta AS (
+            SELECT COUNT(*) AS row_count,
+                   COALESCE(SUM(quantity), 0) AS quantity_sum,
+                   COALESCE(SUM(price * quantity), 0) AS revenue_sum,
+                   MAX(timestamp) AS max_timestamp,
+                   COALESCE(MAX(rowid), 0) AS max_rowid
+            FROM {fact_table}
+            WHERE rowid > %(from_rowid)s {upper_bound}
+        ),
+        upsert AS (
+            INSERT INTO fact_summary (fact_table, row_count, quantity_sum, revenue_sum, max_timestamp, max_rowid)
+            SELECT %(fact_table)s, row_count, quantity_sum, revenue_sum, max_timestamp, max_rowid FROM delta
+            ON CONFLICT (fact_table) DO UPDATE SET
+                row_count = fact_summary.row_count + EXCLUDED.row_count,
+                quantity_sum = fact_summary.quantity_sum + EXCLUDED.quantity_sum,
+                revenue_sum = fact_summary.revenue_sum + EXCLUDED.revenue_sum,
+                max_timestamp = GREATEST(fact_summary.max_timestamp, EXCLUDED.max_timestamp),
+                max_rowid = GREATEST(fact_summary.max_rowid, EXCLUDED.max_rowid),
+                updated_at = CURRENT_TIMESTAMP
+        )
+        SELECT row_count FROM delta
+    """, {'fact_table': fact_table, 'from_rowid': row[0] if row else 0, 'through_rowid': through_rowid})
+    return postgres_cursor.fetchone()[0]
+
+def adjust_fact_summary(postgres_cursor, rowids, sign, fact_table='FactSales'):
+    """Add (sign=1) or subtract (sign=-1) the current fact rows with the given rowids
+
+    Used when rows are updated or deleted in place: subtract the old
+    versions before changing them and add the new versions afterwards.
+    Only rows at or below max_rowid are in the summary; rows above it are
+    left to refresh_fact_summary. max_timestamp is only ever raised here,
+    so after deletes it can be stale until the next reconciliation.
+    Returns the number of rows adjusted.
+    """
+    postgres_cursor.execute("SELECT max_rowid FROM fact_summary WHERE fact_table = %s FOR UPDATE",
+                            (fact_table,))
+    row = postgres_cursor.fetchone()
+    if row is None:
+        raise RuntimeError(f"No summary for {fact_table}; call ensure_fact_summary first")
+    rowids = list(rowids)
+    if not rowids or min(rowids) > row[0]:
+        return 0
+    postgres_cursor.execute(f"""
+        WITH delta AS (
+            SELECT COUNT(*) AS row_count,
+                   COALESCE(SUM(quantity), 0) AS quantity_sum,
+                   COALESCE(SUM(price * quantity), 0) AS revenue_sum,
+                   MAX(timestamp) AS max_timestamp
+            FROM {fact_table}
+            WHERE rowid = ANY(%(rowids)s) AND rowid <= %(max_rowid)s
+        ),
+        adjusted AS (
+            UPDATE fact_summary SET
+                row_count = fact_summary.row_count + %(sign)s * delta.row_count,
+                quantity_sum = fact_summary.quantity_sum + %(sign)s * delta.quantity_sum,
+                revenue_sum = fact_summary.revenue_sum + %(sign)s * delta.revenue_sum,
+                max_timestamp = CASE WHEN %(sign)s > 0
+                                     THEN GREATEST(fact_summary.max_timestamp, delta.max_timestamp)
+                                     ELSE fact_summary.max_timestamp END,
+                updated_at = CURRENT_TIMESTAMP
+            FROM delta
+            WHERE fact_summary.fact_table = %(fact_table)s
+        )
+        SELECT row_count FROM delta
+    """, {'rowids': rowids, 'max_rowid': row[0], 'sign': sign, 'fact_table': fact_table})
+    return postgres_cursor.fetchone()[0]
+
+def reconcile_fact_summary(postgres_cursor, fact_table='FactSales'):
+    """Recompute the summary with a full scan and log any difference from the stored values
+
+    Returns the reconciled summary dict.
+    """
+    previous = get_fact_summary(postgres_cursor, fact_table)
+    postgres_cursor.execute(f"""
+        SELECT COUNT(*), COALESCE(SUM(quantity), 0), COALESCE(SUM(price * quantity), 0),
+               MAX(timestamp), COALESCE(MAX(rowid), 0)
+        FROM {fact_table}
+    """)
+    row_count, quantity_sum, revenue_sum, max_timestamp, max_rowid = postgres_cursor.fetchone()
+    postgres_cursor.execute("""
+        INSERT INTO fact_summary (fact_table, row_count, quantity_sum, revenue_sum, max_timestamp,
+                                  max_rowid, reconciled_at)
+        VALUES (%s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
+        ON CONFLICT (fact_table) DO UPDATE SET
+            row_count = EXCLUDED.row_count,
+            quantity_sum = EXCLUDED.quantity_sum,
+            revenue_sum = EXCLUDED.revenue_sum,
+            max_timestamp = EXCLUDED.max_timestamp,
+            max_rowid = EXCLUDED.max_rowid,
+            reconciled_at = CURRENT_TIMESTAMP,
+            updated_at = CURRENT_TIMESTAMP
+    """, (fact_table, row_count, quantity_sum, revenue_sum, max_timestamp, max_rowid))
+
+    reconciled = dict(zip(SUMMARY_FIELDS, (row_count, quantity_sum, revenue_sum, max_timestamp)))
+    if previous is not None:
+        drift = {field: (previous[field], reconciled[field]) for field in SUMMARY_FIELDS
+                 if previous[field] != reconciled[field]}
+        if drift:
+            logger.warning(f"{fact_table} summary drifted from the table: " +
+                           ", ".join(f"{field} {stored} -> {actual}" for field, (stored, actual) in drift.items()))
+    logger.info(f"Reconciled {fact_table} summary with a full scan")
+    return reconciled
+
+def ensure_fact_summary(postgres_cursor, fact_table='FactSales'):
+    """Create the summary table and bootstrap the fact table's row with one full scan if needed"""
+    ensure_summary_table(postgres_cursor)
+    if get_fact_summary(postgres_cursor, fact_table) is None:
+        reconcile_fact_summary(postgres_cursor, fact_table)
+
+def validate_fact_summary(postgres_cursor, full=False, fact_table='FactSales',
+                          reconciliation_interval=FULL_RECONCILIATION_INTERVAL):
+    """Return up-to-date summary statistics for a fact table
+
+    Normally only rows loaded since the last refresh are aggregated. A full
+    reconciliation runs when full=True, when there is no summary yet, or
+    when the last reconciliation is older than reconciliation_interval.
+    """
+    ensure_summary_table(postgres_cursor)
+    postgres_cursor.execute("""
+        SELECT reconciled_at IS NULL OR reconciled_at < CURRENT_TIMESTAMP - %s
+        FROM fact_summary WHERE fact_table = %s
+    """, (reconciliation_interval, fact_table))
+    row = postgres_cursor.fetchone()
+    due = row is None or row[0]
+    if full or due:
+        reconcile_fact_summary(postgres_cursor, fact_table)
+    else:
+        added = refresh_fact_summary(postgres_cursor, fact_table=fact_table)
+        logger.info(f"Added {added} {fact_table} rows loaded since the last refresh to the summary")
+    return get_fact_summary(postgres_cursor, fact_table)
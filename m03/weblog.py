@@ -0,0 +1,589 @@
+# Web log processing helpers for the process_web_log Airflow DAG.
+# Every stage is a generator over lines, so files are processed as a stream
+# and memory stays flat regardless of the size of the access log. Output is
+# written in buffered batches instead of one write call per record. Large
+# files can be split into newline-aligned byte ranges and processed by a
+# pool of worker processes, with shard outputs merged back in file order.
+# Alternatively the input can be memory-mapped and scanned as bytes with a
+# single regex per line, decoding only the fields that are written out.
+# Any input or output may be .gz, .bz2, .xz or .zst compressed (see
+# compression.py); multi-member gzip input can be decompressed in parallel.
+# Incremental ingestion keeps a per-file checkpoint (path, inode, size, byte
+# offset and a hash of the last processed line) so each run only reads new bytes.
+
+import os
+import re
+import json
+import mmap
+import shutil
+import hashlib
+import itertools
+import logging
+import tempfile
+from functools import lru_cache, partial
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+
+from compression import compression_of, open_log, gzip_member_ranges, iter_gzip_members
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# IP address (first field) and timestamp (first field in square brackets)
+IP_PATTERN = re.compile(r'^(\d+\.\d+\.\d+\.\d+)')
+TIMESTAMP_PATTERN = re.compile(r'\[([^\]]+)\]')
+
+# Bytes equivalent of both patterns for one line of a memory-mapped log: the
+# IP after leading (ASCII) whitespace and the first non-empty bracketed field.
+# '[]' is the only way the first bracket can fail to match, hence the skip.
+LOG_LINE_BODY = rb'[ \t\r\f\v]*(\d+\.\d+\.\d+\.\d+)[^\[\n]*(?:\[\][^\[\n]*)*\[([^\]\n]+)\]'
+FIRST_LINE_PATTERN = re.compile(LOG_LINE_BODY)
+# The literal newline prefix lets re skip straight to line starts
+NEXT_LINE_PATTERN = re.compile(rb'\n' + LOG_LINE_BODY)
+
+# Common Log Format month abbreviations
+MONTHS = {name: number for number, name in enumerate(
+    ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'), 1)}
+
+DAYS_IN_MONTH = (31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+# Distinct raw timestamps remembered by the conversion cache; access logs
+# repeat the same second on many consecutive lines
+TIMESTAMP_CACHE_SIZE = 4096
+
+# Bytes scanned per regex pass by the memory-mapped scanner
+SCAN_BLOCK_SIZE = 4 * 1024 * 1024
+
+# Header of the final processed web log file
+PROCESSED_HEADER = 'IP_Address,Timestamp'
+
+# Records per writelines() call and bytes of file buffering for output files
+WRITE_BATCH_SIZE = 10000
+IO_BUFFER_SIZE = 1024 * 1024
+
+def iter_extracted(lines):
+    """Yield 'ip,timestamp' for every access log line that has both fields"""
+    ip_match = IP_PATTERN.match
+    timestamp_search = TIMESTAMP_PATTERN.search
+    for line in lines:
+        ip = ip_match(line.strip())
+        if ip is None:
+            continue
+        timestamp = timestamp_search(line)
+        if timestamp is not None:
+            yield f"{ip.group(1)},{timestamp.group(1)}"
+
+def parse_clf_timestamp(timestamp):
+    """Split 'dd/Mon/yyyy:HH:MM:SS +hhmm' into (year, month, day, 'HH:MM:SS', offset minutes)
+
+    Fixed-offset slicing instead of strptime; returns None for anything that
+    does not follow the Common Log Format layout or is not a valid date.
+    """
+    if len(timestamp) < 20 or timestamp[2] != '/' or timestamp[6] != '/' or timestamp[11] != ':' \
+            or timestamp[14] != ':' or timestamp[17] != ':' or (len(timestamp) > 20 and timestamp[20] != ' '):
+        return None
+    month = MONTHS.get(timestamp[3:6])
+    offset_text = timestamp[21:26]
+    clock = timestamp[12:20]
+    if month is None or not (timestamp[0:2] + timestamp[7:11] + clock[0:2] + clock[3:5] + clock[6:8]).isdigit():
+        return None
+    year, day = int(timestamp[7:11]), int(timestamp[0:2])
+    if not (1 <= day <= DAYS_IN_MONTH[month - 1]) or (month == 2 and day == 29 and not is_leap_year(year)) \
+            or clock[0:2] > '23' or clock[3:5] > '59' or clock[6:8] > '59':
+        return None
+    offset = 0
+    if offset_text:
+        if len(offset_text) != 5 or offset_text[0] not in '+-' or not offset_text[1:].isdigit():
+            return None
+        offset = int(offset_text[1:3]) * 60 + int(offset_text[3:5])
+        if offset_text[0] == '-':
+            offset = -offset
+    return year, month, day, clock, offset
+
+def is_leap_year(year):
+    """Gregorian leap year check"""
+    return year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)
+
+def render_timestamp(year, month, day, clock, offset, keep_offset=False):
+    """Format parsed timestamp fields as UTC, or as local time with a '+hh:mm' suffix"""
+    if keep_offset:
+        sign = '-' if offset < 0 else '+'
+        hours, minutes = divmod(abs(offset), 60)
+        return f"{year:04d}-{month:02d}-{day:02d} {clock}{sign}{hours:02d}:{minutes:02d}"
+    if offset:
+        # Only non-UTC offsets pay for datetime arithmetic
+        dt = datetime(year, month, day, int(clock[0:2]), int(clock[3:5]), int(clock[6:8]))
+        return (dt - timedelta(minutes=offset)).strftime('%Y-%m-%d %H:%M:%S')
+    return f"{year:04d}-{month:02d}-{day:02d} {clock}"
+
+def strptime_timestamp(timestamp, keep_offset=False):
+    """Original conversion path, used for timestamps outside the fixed layout
+
+    The zone is applied as in the fast path; a zone strptime cannot read
+    makes the timestamp unparseable.
+    """
+    date_text, _, zone = timestamp.partition(' ')
+    try:
+        dt = datetime.strptime(date_text, '%d/%b/%Y:%H:%M:%S')
+        offset = datetime.strptime(zone, '%z').utcoffset() if zone else timedelta(0)
+    except ValueError:
+        return None
+    return render_timestamp(dt.year, dt.month, dt.day, dt.strftime('%H:%M:%S'),
+                            int(offset.total_seconds()) // 60, keep_offset)
+
+@lru_cache(maxsize=TIMESTAMP_CACHE_SIZE)
+def format_timestamp(timestamp, keep_offset=False):
+    """Convert 'dd/Mon/yyyy:HH:MM:SS +zone' to 'yyyy-mm-dd HH:MM:SS', or None if unparseable
+
+    By default the result is normalized to UTC using the zone offset. With
+    keep_offset=True the local time is kept and the offset is appended as
+    '+hh:mm'. Results are memoized per raw timestamp string.
+    """
+    parsed = parse_clf_timestamp(timestamp)
+    if parsed is None:
+        return strptime_timestamp(timestamp, keep_offset)
+    return render_timestamp(*parsed, keep_offset)
+
+def iter_transformed(lines, keep_offset=False):
+    """Yield 'ip,yyyy-mm-dd HH:MM:SS' for each extracted 'ip,dd/Mon/yyyy:HH:MM:SS +zone' line"""
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        parts = line.split(',')
+        if len(parts) < 2:
+            continue
+        ip_address, timestamp = parts[0], parts[1]
+        
+        # If parsing fails, keep original
+        new_timestamp = format_timestamp(timestamp, keep_offset)
+        yield line if new_timestamp is None else f"{ip_address},{new_timestamp}"
+
+def iter_processed(lines, keep_offset=False):
+    """Fused extract + transform: yield final 'ip,yyyy-mm-dd HH:MM:SS' records from raw log lines"""
+    ip_match = IP_PATTERN.match
+    timestamp_search = TIMESTAMP_PATTERN.search
+    for line in lines:
+        ip = ip_match(line.strip())
+        if ip is None:
+            continue
+        timestamp = timestamp_search(line)
+        if timestamp is None:
+            continue
+        raw_timestamp = timestamp.group(1)
+        yield f"{ip.group(1)},{format_timestamp(raw_timestamp, keep_offset) or raw_timestamp}"
+
+def iter_scanned_blocks(buffer, start=0, end=None, block_size=SCAN_BLOCK_SIZE):
+    """Yield a list of (ip, timestamp) byte string pairs per newline-aligned block of buffer[start:end]
+
+    The buffer (an mmap or bytes) is searched in place and only the matched
+    fields are copied out; start must be at a line boundary.
+    """
+    end = len(buffer) if end is None else end
+    position = start
+    while position < end:
+        cut = end if position + block_size >= end else buffer.rfind(b'\n', position, position + block_size) + 1
+        if cut <= position:
+            # A single line longer than the block
+            cut = buffer.find(b'\n', position + block_size, end) + 1 or end
+        pairs = NEXT_LINE_PATTERN.findall(buffer, position, cut)
+        first = FIRST_LINE_PATTERN.match(buffer, position, cut)
+        yield pairs if first is None else [first.groups()] + pairs
+        position = cut
+
+def scan_extracted(buffer, start=0, end=None):
+    """Bytes scanner equivalent of iter_extracted, yielding (text block, record count)"""
+    for pairs in iter_scanned_blocks(buffer, start, end):
+        if pairs:
+            yield b'\n'.join(map(b','.join, pairs)).decode('utf-8', errors='replace') + '\n', len(pairs)
+
+def scan_processed(buffer, start=0, end=None, keep_offset=False):
+    """Bytes scanner equivalent of iter_processed, yielding (text block, record count)"""
+    for pairs in iter_scanned_blocks(buffer, start, end):
+        if not pairs:
+            continue
+        # Decode and convert each distinct timestamp in the block once
+        formatted = {}
+        for timestamp in {timestamp for _, timestamp in pairs}:
+            raw_timestamp = timestamp.decode('utf-8', errors='replace')
+            formatted[timestamp] = (format_timestamp(raw_timestamp, keep_offset) or raw_timestamp).encode('utf-8')
+        block = b'\n'.join([ip + b',' + formatted[timestamp] for ip, timestamp in pairs])
+        yield block.decode('utf-8', errors='replace') + '\n', len(pairs)
+
+def write_blocks(output_file, blocks, header=None):
+    """Write (text block, record count) pairs from a bytes scanner and return the record count"""
+    count = 0
+    with open_log(output_file, 'wt') as f:
+        if header:
+            f.write(header + '\n')
+        for block, records in blocks:
+            f.write(block)
+            count += records
+    return count
+
+def write_records(output_file, records, header=None, batch_size=WRITE_BATCH_SIZE, append=False):
+    """Write records (one per line) in buffered batches and return the count
+
+    With append=True records are added to an existing file and the header is
+    only written when the file is new or empty.
+    """
+    count = 0
+    if append and os.path.exists(output_file) and os.path.getsize(output_file) > 0:
+        header = None
+    with open_log(output_file, 'at' if append else 'wt') as f:
+        if header:
+            f.write(header + '\n')
+        batch = []
+        for record in records:
+            batch.append(record + '\n')
+            if len(batch) >= batch_size:
+                f.writelines(batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            f.writelines(batch)
+            count += len(batch)
+    return count
+
+def shard_ranges(path, shards):
+    """Split a file into at most `shards` (start, end) byte ranges on line boundaries"""
+    size = os.path.getsize(path)
+    boundaries = [0]
+    with open(path, 'rb') as f:
+        for i in range(1, shards):
+            f.seek(max(size * i // shards, boundaries[-1]))
+            if f.tell() > 0:
+                # Move to the start of the next line unless already on one
+                f.seek(f.tell() - 1)
+                f.readline()
+            boundaries.append(min(f.tell(), size))
+    boundaries.append(size)
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if end > start]
+
+def iter_range_lines(f, start, end):
+    """Yield decoded lines from a binary file between two line-aligned offsets"""
+    f.seek(start)
+    remaining = end - start
+    while remaining > 0:
+        line = f.readline()
+        if not line:
+            break
+        remaining -= len(line)
+        yield line.decode('utf-8', errors='replace')
+
+def process_shard(stage, input_file, start, end, output_file):
+    """Run a line stage over one byte range of input_file (process pool worker)"""
+    with open(input_file, 'rb', buffering=IO_BUFFER_SIZE) as f:
+        return write_records(output_file, stage(iter_range_lines(f, start, end)))
+
+def scan_shard(scanner, input_file, start, end, output_file, header=None):
+    """Run a bytes scanner over one byte range of a memory-mapped input_file"""
+    with open(input_file, 'rb') as f:
+        if end <= start:
+            # mmap cannot map an empty file
+            return write_blocks(output_file, (), header)
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            return write_blocks(output_file, scanner(buffer, start, end), header)
+
+def parallel_process(stage, input_file, output_file, workers, header=None, shard_worker=process_shard):
+    """Run a line stage over input_file on `workers` processes and merge in order"""
+    ranges = shard_ranges(input_file, workers)
+    shard_dir = tempfile.mkdtemp(prefix='weblog_shards_', dir=os.path.dirname(os.path.abspath(output_file)))
+    try:
+        shard_files = [os.path.join(shard_dir, f"shard_{i:04d}.txt") for i in range(len(ranges))]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(shard_worker, stage, input_file, start, end, shard_file)
+                       for (start, end), shard_file in zip(ranges, shard_files)]
+            count = sum(future.result() for future in futures)
+        
+        # Concatenate shard outputs in file order
+        with open_log(output_file, 'wt') as out:
+            if header:
+                out.write(header + '\n')
+            for shard_file in shard_files:
+                with open(shard_file, 'r') as shard:
+                    shutil.copyfileobj(shard, out, IO_BUFFER_SIZE)
+    finally:
+        shutil.rmtree(shard_dir, ignore_errors=True)
+    
+    logger.info(f"Processed {len(ranges)} shards of {input_file} on {workers} workers")
+    return count
+
+def process_gzip_shard(stage, input_file, start, end, output_file):
+    """Run a line stage over the complete lines in one member range of a gzip file
+
+    Returns (count, head, tail): the bytes before the first and after the
+    last newline of the range, which belong to lines shared with the
+    neighbouring ranges. head is None when the range has no newline at all.
+    """
+    head = None
+    tail = b''
+
+    def lines():
+        nonlocal head, tail
+        with open(input_file, 'rb') as f:
+            for chunk in iter_gzip_members(f, start, end):
+                data = tail + chunk
+                if head is None:
+                    index = data.find(b'\n')
+                    if index < 0:
+                        tail = data
+                        continue
+                    head, data = data[:index], data[index + 1:]
+                cut = data.rfind(b'\n')
+                tail = data[cut + 1:]
+                if cut >= 0:
+                    yield from data[:cut].decode('utf-8', errors='replace').split('\n')
+
+    count = write_records(output_file, stage(lines()))
+    return count, head, tail
+
+def parallel_gzip_process(stage, input_file, output_file, workers, header=None):
+    """Decompress and process a multi-member gzip file on `workers` processes
+
+    Returns None (nothing written) when the file cannot be split, so the
+    caller can fall back to a single stream.
+    """
+    ranges = gzip_member_ranges(input_file, workers)
+    if len(ranges) < 2:
+        logger.info(f"{input_file} has a single gzip member; decompressing serially")
+        return None
+    shard_dir = tempfile.mkdtemp(prefix='weblog_shards_', dir=os.path.dirname(os.path.abspath(output_file)))
+    try:
+        shard_files = [os.path.join(shard_dir, f"shard_{i:04d}.txt") for i in range(len(ranges))]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(process_gzip_shard, stage, input_file, start, end, shard_file)
+                       for (start, end), shard_file in zip(ranges, shard_files)]
+            try:
+                results = [future.result() for future in futures]
+            except ValueError as e:
+                logger.warning(f"Falling back to serial decompression: {e}")
+                return None
+
+        # Concatenate shard outputs in file order, processing the lines that
+        # span two ranges in between
+        count = 0
+        carry = b''
+        with open_log(output_file, 'wt') as out:
+            if header:
+                out.write(header + '\n')
+            for (shard_count, head, tail), shard_file in zip(results, shard_files):
+                if head is None:
+                    carry += tail
+                    continue
+                for record in stage([(carry + head).decode('utf-8', errors='replace')]):
+                    out.write(record + '\n')
+                    count += 1
+                with open(shard_file, 'r') as shard:
+                    shutil.copyfileobj(shard, out, IO_BUFFER_SIZE)
+                count += shard_count
+                carry = tail
+            if carry:
+                for record in stage([carry.decode('utf-8', errors='replace')]):
+                    out.write(record + '\n')
+                    count += 1
+    finally:
+        shutil.rmtree(shard_dir, ignore_errors=True)
+
+    logger.info(f"Processed {len(ranges)} gzip member ranges of {input_file} on {workers} workers")
+    return count
+
+def run_stage(stage, input_file, output_file, workers=1, header=None):
+    """Run a line stage over a file, sharded across processes when workers > 1
+
+    Compressed input is streamed through a decompressor; only multi-member
+    gzip files can be split across processes.
+    """
+    compression = compression_of(input_file)
+    if workers > 1:
+        if compression is None:
+            return parallel_process(stage, input_file, output_file, workers, header)
+        if compression == '.gz':
+            count = parallel_gzip_process(stage, input_file, output_file, workers, header)
+            if count is not None:
+                return count
+        else:
+            logger.info(f"{compression} input is decompressed serially")
+    with open_log(input_file, 'rt') as f:
+        return write_records(output_file, stage(f), header)
+
+def run_scan(scanner, input_file, output_file, workers=1, header=None):
+    """Run a bytes scanner over a memory-mapped file, sharded across processes when workers > 1"""
+    if workers > 1:
+        return parallel_process(scanner, input_file, output_file, workers, header, shard_worker=scan_shard)
+    return scan_shard(scanner, input_file, 0, os.path.getsize(input_file), output_file, header)
+
+def extract_web_log(input_file, output_file, workers=1, mmap_scan=False):
+    """Stream IP addresses and timestamps from an access log into output_file"""
+    if mmap_scan and compression_of(input_file) is None:
+        return run_scan(scan_extracted, input_file, output_file, workers)
+    return run_stage(iter_extracted, input_file, output_file, workers)
+
+def transform_web_log(input_file, output_file, workers=1, keep_offset=False):
+    """Stream extracted records into output_file with reformatted timestamps"""
+    return run_stage(partial(iter_transformed, keep_offset=keep_offset), input_file, output_file, workers)
+
+def load_web_log(input_file, output_file, append=False):
+    """Copy transformed records to the final output file under a CSV header
+
+    With append=True the records are added to an existing output file.
+    """
+    new_file = not append or not os.path.exists(output_file) or os.path.getsize(output_file) == 0
+    with open_log(input_file, 'rt') as source, open_log(output_file, 'at' if append else 'wt') as target:
+        if new_file:
+            target.write(PROCESSED_HEADER + '\n')
+        shutil.copyfileobj(source, target, IO_BUFFER_SIZE)
+
+def process_web_log_fused(input_file, output_file, workers=1, keep_offset=False, mmap_scan=False):
+    """Parse, transform and write the final CSV output in one streaming pass"""
+    if mmap_scan and compression_of(input_file) is None:
+        return run_scan(partial(scan_processed, keep_offset=keep_offset), input_file, output_file, workers,
+                        header=PROCESSED_HEADER)
+    return run_stage(partial(iter_processed, keep_offset=keep_offset), input_file, output_file, workers,
+                     header=PROCESSED_HEADER)
+
+def read_checkpoint(checkpoint_file):
+    """Return the saved ingestion checkpoint, or None if there is none"""
+    try:
+        with open(checkpoint_file) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def write_checkpoint(checkpoint_file, checkpoint):
+    """Atomically replace the ingestion checkpoint file"""
+    temp_file = checkpoint_file + '.tmp'
+    with open(temp_file, 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(temp_file, checkpoint_file)
+
+def line_hash(data):
+    return hashlib.sha1(data).hexdigest()
+
+def rfind_newline(f, start, end):
+    """Offset just past the last newline in [start, end), or None"""
+    position = end
+    while position > start:
+        block_start = max(start, position - 65536)
+        f.seek(block_start)
+        index = f.read(position - block_start).rfind(b'\n')
+        if index >= 0:
+            return block_start + index + 1
+        position = block_start
+    return None
+
+def last_complete_line(f, start, end):
+    """Return (line_start, line_end) of the last complete line ending in [start, end), or None"""
+    line_end = rfind_newline(f, start, end)
+    if line_end is None:
+        return None
+    return rfind_newline(f, 0, line_end - 1) or 0, line_end
+
+def checkpoint_matches(f, checkpoint):
+    """Check that the bytes before the checkpoint offset still end with the recorded line"""
+    start, end = checkpoint['last_line_start'], checkpoint['offset']
+    if end == 0:
+        return True
+    f.seek(start)
+    return line_hash(f.read(end - start)) == checkpoint['last_line_hash']
+
+def resume_offset(path, checkpoint):
+    """Byte offset to resume from in path, or None if the checkpoint is for another file"""
+    stat = os.stat(path)
+    if checkpoint is None:
+        return 0
+    if stat.st_ino != checkpoint['inode'] or stat.st_dev != checkpoint['device']:
+        return None
+    if stat.st_size < checkpoint['offset']:
+        # Truncated in place (copytruncate rotation): start over
+        return 0
+    with open(path, 'rb') as f:
+        return checkpoint['offset'] if checkpoint_matches(f, checkpoint) else 0
+
+def pending_segments(log_file, checkpoint, rotated_files=()):
+    """List (path, start, end) byte ranges that have not been ingested yet
+
+    When the log was rotated since the checkpoint, the unread tail of the
+    rotated file (found by inode among rotated_files) is ingested first and
+    the current log is read from the beginning.
+    """
+    segments = []
+    offset = resume_offset(log_file, checkpoint)
+    if offset is None:
+        for rotated_file in rotated_files:
+            if os.path.exists(rotated_file):
+                rotated_offset = resume_offset(rotated_file, checkpoint)
+                if rotated_offset is not None:
+                    segments.append((rotated_file, rotated_offset, os.path.getsize(rotated_file)))
+                    break
+        offset = 0
+    segments.append((log_file, offset, os.path.getsize(log_file)))
+    return segments
+
+def ingest_incremental(stage, log_file, output_file, checkpoint_file, rotated_files=(),
+                       header=None, append=False):
+    """Run a line stage over bytes appended to log_file since the last checkpoint
+
+    Only complete lines are consumed; a partially written last line is left
+    for the next run. The checkpoint is saved after the output is written.
+    """
+    if compression_of(log_file) is not None:
+        raise ValueError(f"Incremental ingestion needs an uncompressed log, got {log_file}")
+    log_path = os.path.abspath(log_file)
+    checkpoint = read_checkpoint(checkpoint_file)
+    if checkpoint is not None and checkpoint.get('path', log_path) != log_path:
+        logger.warning(f"Checkpoint {checkpoint_file} belongs to {checkpoint['path']}, "
+                       f"reading {log_file} from the start")
+        checkpoint = None
+    segments = pending_segments(log_file, checkpoint, rotated_files)
+
+    # A resumed segment keeps the old checkpoint until a new line is read;
+    # a rotated or truncated log starts from a checkpoint at offset 0
+    log_stat = os.stat(log_file)
+    new_checkpoint = checkpoint if segments[-1][1] > 0 else {
+        'path': log_path, 'inode': log_stat.st_ino, 'device': log_stat.st_dev, 'size': 0,
+        'offset': 0, 'last_line_start': 0, 'last_line_hash': None,
+    }
+    handles = []
+    ranges = []
+    try:
+        for path, start, end in segments:
+            f = open(path, 'rb', buffering=IO_BUFFER_SIZE)
+            handles.append(f)
+            last_line = last_complete_line(f, start, end)
+            if last_line is None:
+                continue
+            ranges.append((f, start, last_line[1]))
+            if path == log_file:
+                f.seek(last_line[0])
+                new_checkpoint = {
+                    'path': log_path,
+                    'inode': log_stat.st_ino,
+                    'device': log_stat.st_dev,
+                    'size': end,
+                    'offset': last_line[1],
+                    'last_line_start': last_line[0],
+                    'last_line_hash': line_hash(f.read(last_line[1] - last_line[0])),
+                }
+
+        lines = itertools.chain.from_iterable(iter_range_lines(f, start, end) for f, start, end in ranges)
+        count = write_records(output_file, stage(lines), header, append=append)
+    finally:
+        for f in handles:
+            f.close()
+
+    write_checkpoint(checkpoint_file, new_checkpoint)
+    read_bytes = sum(end - start for _, start, end in ranges)
+    logger.info(f"Ingested {read_bytes} new bytes from {len(ranges)} segment(s) of {log_file}")
+    return count
+
+def extract_web_log_incremental(input_file, output_file, checkpoint_file, rotated_files=()):
+    """Extract only the records appended to the access log since the last run"""
+    return ingest_incremental(iter_extracted, input_file, output_file, checkpoint_file, rotated_files)
+
+def process_web_log_fused_incremental(input_file, output_file, checkpoint_file, rotated_files=(),
+                                      keep_offset=False):
+    """Append newly logged records to the final CSV output in one streaming pass"""
+    return ingest_incremental(partial(iter_processed, keep_offset=keep_offset), input_file, output_file,
+                              checkpoint_file, rotated_files, header=PROCESSED_HEADER, append=True)
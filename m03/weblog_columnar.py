@@ -0,0 +1,166 @@
+# Columnar output for the processed web log.
+# The 'ip,yyyy-mm-dd HH:MM:SS' records are written as a date-partitioned
+# dataset (Hive style date=YYYY-MM-DD directories) in Parquet or Arrow IPC
+# format, with dictionary-encoded IP addresses and row groups small enough
+# for their min/max statistics to let time-range filters skip most of a day.
+# Readers then scan only the partitions and row groups a query needs.
+# This module requires pyarrow: python3 -m pip install pyarrow
+
+import os
+import uuid
+import shutil
+import logging
+from datetime import timedelta
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+    import pyarrow.dataset as ds
+except ImportError:  # CSV output in weblog.py still works
+    pa = None
+
+from compression import open_log
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Supported columnar formats and their pyarrow.dataset names
+DATASET_FORMATS = {'parquet': 'parquet', 'arrow': 'ipc'}
+
+# Rows per row group; a day of a busy log spans several groups, so the
+# timestamp statistics of each group are selective for hour-level ranges
+ROW_GROUP_SIZE = 128 * 1024
+
+# Bytes of CSV text parsed per record batch
+READ_BLOCK_SIZE = 8 * 1024 * 1024
+
+def require_pyarrow():
+    """Raise a helpful error when columnar output is used without pyarrow"""
+    if pa is None:
+        raise ImportError("Columnar web log output requires pyarrow: python3 -m pip install pyarrow")
+
+def weblog_schema():
+    return pa.schema([
+        ('ip_address', pa.dictionary(pa.int32(), pa.string())),
+        ('timestamp', pa.timestamp('s')),
+        ('date', pa.date32()),
+    ])
+
+def iter_csv_batches(input_file, header=False):
+    """Stream (ip_address, timestamp) string batches from a transformed or processed file"""
+    read_options = pa_csv.ReadOptions(column_names=['ip_address', 'timestamp'], block_size=READ_BLOCK_SIZE,
+                                      skip_rows=1 if header else 0)
+    convert_options = pa_csv.ConvertOptions(column_types={'ip_address': pa.string(), 'timestamp': pa.string()})
+    with open_log(input_file, 'rb') as f:
+        reader = pa_csv.open_csv(f, read_options=read_options, convert_options=convert_options)
+        for batch in reader:
+            yield batch
+
+def parse_timestamps(values):
+    """Parse 'yyyy-mm-dd HH:MM:SS' strings, or ones with a '+hh:mm' offset (normalized to UTC)
+
+    Anything else (e.g. a raw log timestamp kept by the transform) becomes
+    null; to_columnar_batch drops those rows.
+    """
+    parsed = pc.strptime(values, format='%Y-%m-%d %H:%M:%S', unit='s', error_is_null=True)
+    if parsed.null_count > values.null_count:
+        with_offset = pc.strptime(values, format='%Y-%m-%d %H:%M:%S%z', unit='s', error_is_null=True)
+        parsed = pc.coalesce(parsed, with_offset.cast(pa.timestamp('s')))
+    return parsed
+
+def to_columnar_batch(batch, dictionary=None):
+    """Convert a string batch to the columnar schema
+
+    With a dictionary (one array of every IP) all batches share the same
+    dictionary, which Arrow IPC files require; otherwise each batch is
+    dictionary-encoded on its own, which Parquet handles per row group.
+    Records whose timestamp cannot be parsed are dropped, as in the
+    warehouse load, so no row lands in a null date partition.
+    """
+    timestamps = parse_timestamps(batch.column('timestamp'))
+    if timestamps.null_count:
+        valid = pc.is_valid(timestamps)
+        batch = batch.filter(valid)
+        timestamps = timestamps.filter(valid)
+    ips = batch.column('ip_address')
+    if dictionary is None:
+        ips = pc.dictionary_encode(ips).cast(pa.dictionary(pa.int32(), pa.string()))
+    else:
+        ips = pa.DictionaryArray.from_arrays(pc.index_in(ips, value_set=dictionary).cast(pa.int32()), dictionary)
+    return pa.record_batch([ips, timestamps, timestamps.cast(pa.date32())], schema=weblog_schema())
+
+def collect_ip_dictionary(input_file, header=False):
+    """First pass for Arrow IPC output: every distinct IP address in the input"""
+    distinct = None
+    for batch in iter_csv_batches(input_file, header):
+        values = pc.unique(batch.column('ip_address'))
+        distinct = values if distinct is None else pc.unique(pa.concat_arrays([distinct, values]))
+    return distinct if distinct is not None else pa.array([], pa.string())
+
+def write_web_log_dataset(input_file, output_dir, file_format='parquet', header=False, append=False):
+    """Write processed web log records as a date-partitioned Parquet or Arrow IPC dataset
+
+    input_file holds 'ip,timestamp' lines (transformed_data.txt, or
+    weblog_processed.txt with header=True) and may be compressed. Without
+    append the dataset is replaced; with append new files are added next to
+    the existing ones. Records without a valid timestamp are skipped and
+    counted. Returns the number of rows written.
+    """
+    require_pyarrow()
+    if file_format not in DATASET_FORMATS:
+        raise ValueError(f"Unknown columnar format {file_format!r}; expected one of {sorted(DATASET_FORMATS)}")
+
+    dictionary = collect_ip_dictionary(input_file, header) if file_format == 'arrow' else None
+    rows = 0
+    skipped = 0
+
+    def batches():
+        nonlocal rows, skipped
+        for batch in iter_csv_batches(input_file, header):
+            columnar = to_columnar_batch(batch, dictionary)
+            rows += columnar.num_rows
+            skipped += batch.num_rows - columnar.num_rows
+            if columnar.num_rows:
+                yield columnar
+
+    dataset_format = ds.ParquetFileFormat() if file_format == 'parquet' else ds.IpcFileFormat()
+    if file_format == 'parquet':
+        write_options = dataset_format.make_write_options(compression='zstd', write_statistics=True)
+    else:
+        write_options = dataset_format.make_write_options(compression='zstd')
+
+    if not append and os.path.isdir(output_dir):
+        shutil.rmtree(output_dir)
+    extension = 'parquet' if file_format == 'parquet' else 'arrow'
+    ds.write_dataset(
+        batches(), output_dir, schema=weblog_schema(), format=dataset_format, file_options=write_options,
+        partitioning=ds.partitioning(pa.schema([('date', pa.date32())]), flavor='hive'),
+        basename_template=f"part-{uuid.uuid4().hex[:12]}-{{i}}.{extension}",
+        existing_data_behavior='overwrite_or_ignore',
+        max_rows_per_group=ROW_GROUP_SIZE, min_rows_per_group=ROW_GROUP_SIZE,
+    )
+    if skipped:
+        logger.warning(f"Skipped {skipped} web log records without a valid timestamp")
+    logger.info(f"Wrote {rows} web log records to {output_dir} as {file_format}")
+    return rows
+
+def open_web_log_dataset(dataset_dir, file_format='parquet'):
+    """Open a dataset written by write_web_log_dataset"""
+    require_pyarrow()
+    return ds.dataset(dataset_dir, format=DATASET_FORMATS[file_format],
+                      partitioning=ds.partitioning(pa.schema([('date', pa.date32())]), flavor='hive'))
+
+def read_web_log_range(dataset_dir, start, end, columns=None, file_format='parquet'):
+    """Return the records with start <= timestamp < end as a pyarrow Table
+
+    The date filter prunes partitions; within a partition, Parquet row
+    groups whose timestamp statistics fall outside the range are skipped.
+    """
+    dataset = open_web_log_dataset(dataset_dir, file_format)
+    last_day = (end - timedelta(seconds=1)).date()
+    expression = ((ds.field('date') >= start.date()) & (ds.field('date') <= last_day)
+                  & (ds.field('timestamp') >= pa.scalar(start, pa.timestamp('s')))
+                  & (ds.field('timestamp') < pa.scalar(end, pa.timestamp('s'))))
+    return dataset.to_table(columns=columns, filter=expression)
@@ -0,0 +1,160 @@
+# Warehouse load target for the processed web log.
+# Transformed 'ip,yyyy-mm-dd HH:MM:SS' records are streamed into the
+# FactWebLog table of the staging warehouse with COPY, keyed to DimDate like
+# FactSales. Every row carries the DAG ds that loaded it; a load first
+# deletes that ds in the same transaction, so re-running a DAG run replaces
+# its rows instead of duplicating them. The table can optionally be range
+# partitioned by month on timestamp, with partitions created as data arrives.
+
+import io
+import logging
+from datetime import datetime
+
+from compression import open_log
+from dimension_cache import DimensionCache
+from partitions import is_partitioned, ensure_month_partitions
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+WEBLOG_FACT_TABLE = 'FactWebLog'
+WEBLOG_FACT_COLUMNS = ('load_ds', 'ip_address', 'timestamp', 'date_key')
+
+# Rows per COPY statement
+WEBLOG_COPY_BATCH_SIZE = 50000
+
+CREATE_WEBLOG_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS FactWebLog (
+    load_ds DATE NOT NULL,
+    ip_address VARCHAR(45) NOT NULL,
+    timestamp TIMESTAMP NOT NULL,
+    date_key INTEGER REFERENCES DimDate(dateid)
+)
+"""
+
+CREATE_PARTITIONED_WEBLOG_TABLE_SQL = CREATE_WEBLOG_TABLE_SQL.rstrip() + " PARTITION BY RANGE (timestamp)\n"
+
+WEBLOG_INDEX_SQL = (
+    "CREATE INDEX IF NOT EXISTS factweblog_timestamp_idx ON FactWebLog (timestamp)",
+    "CREATE INDEX IF NOT EXISTS factweblog_load_ds_idx ON FactWebLog (load_ds)",
+    "CREATE INDEX IF NOT EXISTS factweblog_date_key_idx ON FactWebLog (date_key)",
+    "CREATE INDEX IF NOT EXISTS factweblog_ip_address_idx ON FactWebLog (ip_address)",
+)
+
+def create_web_log_table(postgres_cursor, partitioned=False):
+    """Create FactWebLog and its indexes if they do not exist yet
+
+    With partitioned=True the table is range partitioned by month on
+    timestamp; an existing table keeps whatever layout it was created with.
+    """
+    postgres_cursor.execute(CREATE_PARTITIONED_WEBLOG_TABLE_SQL if partitioned else CREATE_WEBLOG_TABLE_SQL)
+    for index_sql in WEBLOG_INDEX_SQL:
+        postgres_cursor.execute(index_sql)
+
+def warehouse_timestamp(timestamp):
+    """Return a transformed timestamp as 'yyyy-mm-dd HH:MM:SS' in UTC, or None if it is not one
+
+    Values with a '+hh:mm' offset (weblog_keep_offset) are normalized to UTC.
+    """
+    if len(timestamp) == 19 and timestamp[4] == '-' and timestamp[10] == ' ':
+        return timestamp
+    if len(timestamp) == 25 and timestamp[4] == '-' and timestamp[19] in '+-':
+        try:
+            local = datetime.fromisoformat(timestamp)
+        except ValueError:
+            return None
+        utc = local.replace(tzinfo=None) - local.utcoffset()
+        return utc.strftime('%Y-%m-%d %H:%M:%S')
+    return None
+
+def iter_warehouse_rows(input_file, date_keys, header=False):
+    """Yield (ip_address, timestamp, date_key) from transformed records
+
+    date_keys maps 'yyyy-mm-dd' to DimDate.dateid. Records whose timestamp
+    could not be converted by the transform are skipped and counted.
+    """
+    skipped = 0
+    with open_log(input_file, 'rt') as f:
+        if header:
+            next(f, None)
+        for line in f:
+            ip_address, _, timestamp = line.rstrip('\n').partition(',')
+            timestamp = warehouse_timestamp(timestamp)
+            if timestamp is None:
+                skipped += 1
+                continue
+            yield ip_address, timestamp, date_keys.get(timestamp[:10])
+    if skipped:
+        logger.warning(f"Skipped {skipped} web log records without a valid timestamp")
+
+def copy_web_log_rows(postgres_cursor, ds, rows, table=WEBLOG_FACT_TABLE):
+    """Stream one batch of (ip_address, timestamp, date_key) rows into the table with COPY"""
+    buffer = io.StringIO()
+    # IPs and timestamps never contain CSV metacharacters; an empty field is NULL
+    buffer.writelines(f"{ds},{ip_address},{timestamp},{'' if date_key is None else date_key}\n"
+                      for ip_address, timestamp, date_key in rows)
+    buffer.seek(0)
+    copy_sql = f"COPY {table} ({', '.join(WEBLOG_FACT_COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+    postgres_cursor.copy_expert(copy_sql, buffer)
+
+def load_batch(postgres_cursor, ds, batch, partitioned, known_months, table=WEBLOG_FACT_TABLE):
+    """COPY one batch, creating any monthly partitions it needs first
+
+    Returns the number of rows in the batch without a DimDate key.
+    """
+    if partitioned:
+        months = {(int(timestamp[:4]), int(timestamp[5:7])) for _, timestamp, _ in batch} - known_months
+        if months:
+            ensure_month_partitions(postgres_cursor, months, table)
+            known_months.update(months)
+    copy_web_log_rows(postgres_cursor, ds, batch, table)
+    return sum(1 for _, _, date_key in batch if date_key is None)
+
+def load_web_log_warehouse(postgres_conn, input_file, ds, header=False, partitioned=False,
+                           dimension_cache=None, batch_size=WEBLOG_COPY_BATCH_SIZE, table=WEBLOG_FACT_TABLE):
+    """Replace the FactWebLog rows of one DAG ds with the records in input_file
+
+    The delete and every COPY batch run in a single transaction, so a
+    failed or repeated load leaves exactly one copy of the ds. Returns the
+    number of rows loaded.
+    """
+    cursor = postgres_conn.cursor()
+    try:
+        create_web_log_table(cursor, partitioned)
+        partitioned = is_partitioned(cursor, table)
+        if dimension_cache is None:
+            dimension_cache = DimensionCache()
+            dimension_cache.load_from_warehouse(cursor)
+        date_keys = {day.isoformat(): dateid for day, dateid in dimension_cache.snapshot().date_keys.items()}
+
+        cursor.execute(f"DELETE FROM {table} WHERE load_ds = %s", (ds,))
+        if cursor.rowcount:
+            logger.info(f"Removed {cursor.rowcount} rows previously loaded for {ds}")
+
+        count = 0
+        missing_dates = 0
+        known_months = set()
+        batch = []
+        for row in iter_warehouse_rows(input_file, date_keys, header):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                missing_dates += load_batch(cursor, ds, batch, partitioned, known_months, table)
+                count += len(batch)
+                batch = []
+        if batch:
+            missing_dates += load_batch(cursor, ds, batch, partitioned, known_months, table)
+            count += len(batch)
+
+        postgres_conn.commit()
+        if missing_dates:
+            logger.warning(f"{missing_dates} web log records have dates not present in DimDate")
+        logger.info(f"Loaded {count} web log records into {table} for {ds}")
+        return count
+
+    except Exception as e:
+        postgres_conn.rollback()
+        logger.error(f"Error loading web log data into {table}: {e}")
+        raise
+    finally:
+        cursor.close()
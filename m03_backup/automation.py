@@ -87,7 +87,11 @@ print("New rows on staging datawarehouse = ", len(new_records))
 # Insert the additional records from MySQL into PostgreSQL data warehouse.
 # The function insert_records must insert all the records passed to it into the sales_data table in PostgreSQL database.
 
+# Rows inserted per transaction
+COMMIT_EVERY = 5000
+
 def insert_records(records):
+    inserted = 0
     try:
         if records:
             # Insert query for PostgreSQL
@@ -99,14 +103,18 @@ def insert_records(records):
             # Prepare data for insertion (add default price of 0.0)
             insert_data = [(record[0], record[1], record[2], record[3], 0.0) for record in records]
             
-            # Execute batch insert
-            postgres_cursor.executemany(insert_query, insert_data)
-            postgres_conn.commit()
-            print(f"Successfully inserted {len(records)} records")
+            # Execute batch inserts, committing every COMMIT_EVERY rows so a
+            # failure only rolls back the batch in progress
+            for start in range(0, len(insert_data), COMMIT_EVERY):
+                batch = insert_data[start:start + COMMIT_EVERY]
+                postgres_cursor.executemany(insert_query, batch)
+                postgres_conn.commit()
+                inserted += len(batch)
+            print(f"Successfully inserted {inserted} records")
         else:
             print("No records to insert")
     except Exception as e:
-        print(f"Error inserting records: {e}")
+        print(f"Error inserting records after {inserted} committed rows: {e}")
         postgres_conn.rollback()
 
 insert_records(new_records)